@@ -1,9 +1,11 @@
 import xbmcvfs
 import io
 import json
+import time
 import xbmcaddon
 import os
 import xbmc # For xbmc.log
+from contextlib import contextmanager
 
 # For maximum compatibility (all platforms)
 try:
@@ -11,139 +13,269 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
-PROFILE = translatePath(xbmcaddon.Addon().getAddonInfo('profile'))
-HISTORY_FILE = os.path.join(PROFILE, "history.json")
-SEARCH_HISTORY_FILE = os.path.join(PROFILE, "search_history.json") # New file for search history
-MAX_HISTORY = 100
-MAX_SEARCH_HISTORY = 50 # Can be different from playback history, e.g. 50
+# Cesty se skládají až při prvním použití (translatePath/Addon() zdržují start pluginu)
+HISTORY_DB = "history.db"
+# Původní JSON soubory – při prvním spuštění se převedou do HISTORY_DB
+HISTORY_FILE = "history.json"
+SEARCH_HISTORY_FILE = "search_history.json"
+MAX_HISTORY = 5000
+MAX_SEARCH_HISTORY = 200
+HISTORY_PAGE_SIZE = 50
+# Ořez na MAX_* se nedělá při každém zápisu, ale jen jednou za TRIM_EVERY vložení
+TRIM_EVERY = 50
+
+# Sloupce tabulky history; ostatní klíče položky se ukládají jako JSON do sloupce data
+HISTORY_COLUMNS = ('ident', 'name', 'type', 'timestamp', 'file_path', 'resume_time', 'finished')
+
+_schema_ready = False
+_profile = None
+
+def get_profile():
+    global _profile
+    if _profile is None:
+        _profile = translatePath(xbmcaddon.Addon().getAddonInfo('profile'))
+    return _profile
+
+def profile_path(name):
+    return os.path.join(get_profile(), name)
 
 def ensure_profile_dir():
     """Ensures the profile directory exists."""
-    if not xbmcvfs.exists(PROFILE):
-        xbmc.log(f"Kodicek History: Profile directory does not exist. Attempting to create: {PROFILE}", level=xbmc.LOGINFO)
-        if xbmcvfs.mkdirs(PROFILE):
-            xbmc.log(f"Kodicek History: Successfully created profile directory: {PROFILE}", level=xbmc.LOGINFO)
+    profile = get_profile()
+    if not xbmcvfs.exists(profile):
+        xbmc.log(f"Kodicek History: Profile directory does not exist. Attempting to create: {profile}", level=xbmc.LOGINFO)
+        if xbmcvfs.mkdirs(profile):
+            xbmc.log(f"Kodicek History: Successfully created profile directory: {profile}", level=xbmc.LOGINFO)
         else:
-            xbmc.log(f"Kodicek History: Failed to create profile directory: {PROFILE}", level=xbmc.LOGERROR)
+            xbmc.log(f"Kodicek History: Failed to create profile directory: {profile}", level=xbmc.LOGERROR)
             # If directory creation fails, subsequent operations will likely fail too.
 
-def load_history():
-    """Loads the playback history from the JSON file."""
+@contextmanager
+def _connect(write=True):
+    """Otevře transakci nad HISTORY_DB (WAL, busy timeout – bezpečné pro více zapisovatelů).
+
+    Zápis bere zámek hned (BEGIN IMMEDIATE); čtení (write=False) běží v odložené
+    transakci a pod WAL nečeká na zapisovatele, např. dávky CheckpointWriter služby.
+    """
+    global _schema_ready
+    import sqlite3
     ensure_profile_dir()
-    xbmc.log(f"Kodicek: Attempting to load playback history from {HISTORY_FILE}", level=xbmc.LOGINFO)
+    conn = sqlite3.connect(profile_path(HISTORY_DB), timeout=10, isolation_level=None)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not _schema_ready:
+            _create_schema(conn)
+            _schema_ready = True
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
 
-    if not xbmcvfs.exists(HISTORY_FILE):
-        xbmc.log(f"Kodicek History: Playback history file does not exist: {HISTORY_FILE}", level=xbmc.LOGINFO)
-        return []
+def _create_schema(conn):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS history (
+            ident TEXT PRIMARY KEY,
+            name TEXT,
+            type TEXT,
+            timestamp INTEGER NOT NULL DEFAULT 0,
+            file_path TEXT,
+            resume_time INTEGER,
+            finished INTEGER,
+            data TEXT
+        );
+        CREATE INDEX IF NOT EXISTS history_timestamp ON history(timestamp);
+        CREATE INDEX IF NOT EXISTS history_file_path ON history(file_path);
+        CREATE TABLE IF NOT EXISTS search_history (
+            query TEXT PRIMARY KEY,
+            timestamp INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS search_history_timestamp ON search_history(timestamp);
+        """
+    )
+    _migrate_json(conn)
+    # Starší verze ukládaly URL i s hlavičkami (User-Agent, cookie s tokenem) – z disku je odstraníme
+    conn.execute("UPDATE history SET file_path = substr(file_path, 1, instr(file_path, '|') - 1) WHERE instr(file_path, '|') > 0")
 
+def _load_json_file(path):
+    if not xbmcvfs.exists(path):
+        return []
     try:
-        with io.open(HISTORY_FILE, 'r', encoding='utf8') as f:
-            history_data = json.load(f)
-            xbmc.log(f"Kodicek: Loaded playback history: {len(history_data)} items", level=xbmc.LOGINFO)
-            return history_data
+        with io.open(path, 'r', encoding='utf8') as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
     except Exception as e:
-        xbmc.log(f"Kodicek History: Error loading playback history file {HISTORY_FILE}: {e}", level=xbmc.LOGERROR)
+        xbmc.log(f"Kodicek History: Error loading legacy history file {path}: {e}", level=xbmc.LOGERROR)
+        return []
+
+def _migrate_json(conn):
+    """Jednorázový převod history.json / search_history.json do SQLite."""
+    for name, table in ((HISTORY_FILE, 'history'), (SEARCH_HISTORY_FILE, 'search_history')):
+        path = profile_path(name)
+        if not xbmcvfs.exists(path):
+            continue
+        items = _load_json_file(path)
+        xbmc.log(f"Kodicek History: Migrating {len(items)} items from {path} to {HISTORY_DB}", level=xbmc.LOGINFO)
+        conn.execute("BEGIN IMMEDIATE")
+        # JSON je seřazený od nejnovějších – vkládáme pozpátku, ať novější přepíšou starší duplicity
+        for item in reversed(items):
+            if not isinstance(item, dict):
+                continue
+            if table == 'history' and item.get('ident'):
+                _upsert_history(conn, item)
+            elif table == 'search_history' and item.get('query'):
+                conn.execute("INSERT OR REPLACE INTO search_history (query, timestamp) VALUES (?, ?)", (item['query'], int(item.get('timestamp') or 0)))
+        conn.execute("COMMIT")
         try:
-            if xbmcvfs.delete(HISTORY_FILE):
-                xbmc.log(f"Kodicek History: Deleted corrupted playback history file {HISTORY_FILE}", level=xbmc.LOGWARNING)
-            else:
-                xbmc.log(f"Kodicek History: Failed to delete corrupted playback history file {HISTORY_FILE}", level=xbmc.LOGERROR)
-        except Exception as delete_e:
-            xbmc.log(f"Kodicek History: Error during attempt to delete corrupted playback history file {HISTORY_FILE}: {delete_e}", level=xbmc.LOGERROR)
+            os.replace(path, path + ".migrated")
+        except OSError as e:
+            xbmc.log(f"Kodicek History: Failed to rename migrated file {path}: {e}", level=xbmc.LOGWARNING)
+
+def _upsert_history(conn, item):
+    extra = {k: v for k, v in item.items() if k not in HISTORY_COLUMNS}
+    finished = item.get('finished')
+    cursor = conn.execute(
+        "INSERT OR REPLACE INTO history (ident, name, type, timestamp, file_path, resume_time, finished, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (item['ident'], item.get('name'), item.get('type'), int(item.get('timestamp') or 0), item.get('file_path'),
+         item.get('resume_time'), None if finished is None else int(bool(finished)),
+         json.dumps(extra, ensure_ascii=False) if extra else None),
+    )
+    return cursor.lastrowid
+
+def _row_to_item(row):
+    item = json.loads(row['data']) if row['data'] else {}
+    for column in HISTORY_COLUMNS:
+        value = row[column]
+        if value is not None:
+            item[column] = bool(value) if column == 'finished' else value
+    return item
+
+def load_history(limit=None, offset=0):
+    """Loads the playback history (newest first); optionally one page of it."""
+    try:
+        with _connect(write=False) as conn:
+            rows = conn.execute(
+                "SELECT * FROM history ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                (limit if limit is not None else -1, offset),
+            ).fetchall()
+        xbmc.log(f"Kodicek: Loaded playback history: {len(rows)} items (offset {offset})", level=xbmc.LOGDEBUG)
+        return [_row_to_item(row) for row in rows]
+    except Exception as e:
+        xbmc.log(f"Kodicek History: Error loading playback history from {HISTORY_DB}: {e}", level=xbmc.LOGERROR)
         return []
 
-def save_history(history):
-    """Saves the playback history to the JSON file, limiting to MAX_HISTORY items."""
-    ensure_profile_dir()
-    xbmc.log(f"Kodicek: Saving playback history to {HISTORY_FILE}", level=xbmc.LOGINFO)
+def count_history():
+    try:
+        with _connect(write=False) as conn:
+            return conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+    except Exception as e:
+        xbmc.log(f"Kodicek History: Error counting playback history in {HISTORY_DB}: {e}", level=xbmc.LOGERROR)
+        return 0
 
+def get_history_item(ident):
+    """Vrátí položku historie podle ident (nebo None)."""
     try:
-        with io.open(HISTORY_FILE, 'w', encoding='utf8') as f:
-            json.dump(history[:MAX_HISTORY], f, ensure_ascii=False, indent=2)
-        xbmc.log(f"Kodicek History: Successfully saved playback history to {HISTORY_FILE}", level=xbmc.LOGINFO)
+        with _connect(write=False) as conn:
+            row = conn.execute("SELECT * FROM history WHERE ident = ?", (ident,)).fetchone()
+        return _row_to_item(row) if row else None
     except Exception as e:
-        xbmc.log(f"Kodicek History: Error saving playback history file {HISTORY_FILE}: {e}", level=xbmc.LOGERROR)
+        xbmc.log(f"Kodicek History: Error reading history item {ident}: {e}", level=xbmc.LOGERROR)
+        return None
 
 def add_to_history(item):
     """Adds an item to the playback history, ensuring no duplicates based on 'ident'."""
-    history = load_history()
-    item_ident = item.get('ident')
-    if item_ident is not None:
-        history = [h for h in history if h.get('ident') != item_ident]
-    else:
+    if item.get('ident') is None:
         xbmc.log(f"Kodicek History: Item added to playback history is missing 'ident': {item.get('name', 'Unknown item')}", level=xbmc.LOGWARNING)
+        return
+    try:
+        with _connect() as conn:
+            rowid = _upsert_history(conn, item)
+            if rowid and rowid % TRIM_EVERY == 0:
+                _trim(conn, 'history', MAX_HISTORY)
+    except Exception as e:
+        xbmc.log(f"Kodicek History: Error saving playback history item to {HISTORY_DB}: {e}", level=xbmc.LOGERROR)
 
-    history.insert(0, item)
-    save_history(history)
-
-# --- Search History Functions ---
+def update_resume(ident=None, file_path=None, resume_time=None, finished=False):
+    """Uloží pozici přehrávání (nebo příznak dokončení) k položce podle ident, případně file_path.
 
-def load_search_history():
-    """Loads the search history from the JSON file."""
-    ensure_profile_dir()
-    xbmc.log(f"Kodicek: Attempting to load search history from {SEARCH_HISTORY_FILE}", level=xbmc.LOGINFO)
+    Vrací True, pokud byla nějaká položka aktualizována.
+    """
+    if ident:
+        return update_resume_many([(ident, resume_time, finished)]) > 0
+    if not file_path:
+        return False
+    try:
+        with _connect() as conn:
+            return _apply_resume(conn, "file_path = ?", file_path, resume_time, finished) > 0
+    except Exception as e:
+        xbmc.log(f"Kodicek History: Error saving resume position for {file_path}: {e}", level=xbmc.LOGERROR)
+        return False
 
-    if not xbmcvfs.exists(SEARCH_HISTORY_FILE):
-        xbmc.log(f"Kodicek History: Search history file does not exist: {SEARCH_HISTORY_FILE}", level=xbmc.LOGINFO)
-        return []
+def update_resume_many(updates):
+    """Dávkový zápis pozic [(ident, resume_time, finished), ...] v jedné transakci.
 
+    Vrací počet aktualizovaných položek.
+    """
+    if not updates:
+        return 0
     try:
-        with io.open(SEARCH_HISTORY_FILE, 'r', encoding='utf8') as f:
-            search_history_data = json.load(f)
-            xbmc.log(f"Kodicek: Loaded search history: {len(search_history_data)} items", level=xbmc.LOGINFO)
-            return search_history_data
+        with _connect() as conn:
+            return sum(_apply_resume(conn, "ident = ?", ident, resume_time, finished) for ident, resume_time, finished in updates)
     except Exception as e:
-        xbmc.log(f"Kodicek History: Error loading search history file {SEARCH_HISTORY_FILE}: {e}", level=xbmc.LOGERROR)
-        try:
-            if xbmcvfs.delete(SEARCH_HISTORY_FILE):
-                xbmc.log(f"Kodicek History: Deleted corrupted search history file {SEARCH_HISTORY_FILE}", level=xbmc.LOGWARNING)
-            else:
-                xbmc.log(f"Kodicek History: Failed to delete corrupted search history file {SEARCH_HISTORY_FILE}", level=xbmc.LOGERROR)
-        except Exception as delete_e:
-            xbmc.log(f"Kodicek History: Error during attempt to delete corrupted search history file {SEARCH_HISTORY_FILE}: {delete_e}", level=xbmc.LOGERROR)
-        return []
+        xbmc.log(f"Kodicek History: Error saving {len(updates)} resume positions: {e}", level=xbmc.LOGERROR)
+        return 0
 
-def save_search_history(search_history):
-    """Saves the search history to the JSON file, limiting to MAX_SEARCH_HISTORY items."""
-    ensure_profile_dir()
-    xbmc.log(f"Kodicek: Saving search history to {SEARCH_HISTORY_FILE}", level=xbmc.LOGINFO)
+def _apply_resume(conn, where, key, resume_time, finished):
+    if finished:
+        cursor = conn.execute(f"UPDATE history SET resume_time = NULL, finished = 1 WHERE {where}", (key,))
+    else:
+        cursor = conn.execute(f"UPDATE history SET resume_time = ?, finished = NULL WHERE {where}", (int(resume_time or 0), key))
+    return cursor.rowcount
+
+def _trim(conn, table, keep):
+    conn.execute(
+        f"DELETE FROM {table} WHERE timestamp < (SELECT timestamp FROM {table} ORDER BY timestamp DESC LIMIT 1 OFFSET ?)",
+        (keep - 1,),
+    )
+
+# --- Search History Functions ---
 
+def load_search_history(limit=MAX_SEARCH_HISTORY, offset=0):
+    """Loads the search history (newest first)."""
     try:
-        with io.open(SEARCH_HISTORY_FILE, 'w', encoding='utf8') as f:
-            json.dump(search_history[:MAX_SEARCH_HISTORY], f, ensure_ascii=False, indent=2)
-        xbmc.log(f"Kodicek History: Successfully saved search history to {SEARCH_HISTORY_FILE}", level=xbmc.LOGINFO)
+        with _connect(write=False) as conn:
+            rows = conn.execute(
+                "SELECT query, timestamp FROM search_history ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [{"query": row['query'], "timestamp": row['timestamp']} for row in rows]
     except Exception as e:
-        xbmc.log(f"Kodicek History: Error saving search history file {SEARCH_HISTORY_FILE}: {e}", level=xbmc.LOGERROR)
+        xbmc.log(f"Kodicek History: Error loading search history from {HISTORY_DB}: {e}", level=xbmc.LOGERROR)
+        return []
 
 def add_to_search_history(item):
     """Adds a search query item to the search history.
     Item is expected to be a dict, e.g., {"query": "search term", "timestamp": 123}
     Ensures no duplicate queries.
     """
-    search_history = load_search_history()
-    
     current_query = item.get('query')
-    if current_query is not None:
-        # Remove previous occurrences of the same query
-        search_history = [h for h in search_history if h.get('query') != current_query]
-    else:
+    if current_query is None:
         xbmc.log(f"Kodicek History: Item added to search history is missing 'query': {item}", level=xbmc.LOGWARNING)
-        # Optionally, don't add items without a query, or handle as an error
-        return 
-
-    search_history.insert(0, item)
-    save_search_history(search_history)
-
-# Example test call (can be removed or commented out for production)
-# if __name__ == '__main__':
-#     # This block is for local testing if you run this script directly (not in Kodi)
-#     # It requires mocking xbmc, xbmcaddon, xbmcvfs, translatePath
-#     print("Simulating history operations (requires mocks for Kodi environment)")
-#     # Mocking example (very basic)
-#     class MockAddon:
-#         def getAddonInfo(self, info_id):
-#             if info_id == 'profile':
-#                 return "mock_profile_path"
-#             return "mock_addon"
-#     xbmcaddon.Addon = MockAddon
-#     # Further mocks needed for xbmcvfs, xbmc.log, translatePath
+        return
+    try:
+        with _connect() as conn:
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO search_history (query, timestamp) VALUES (?, ?)",
+                (current_query, int(item.get('timestamp') or time.time())),
+            )
+            if cursor.lastrowid and cursor.lastrowid % TRIM_EVERY == 0:
+                _trim(conn, 'search_history', MAX_SEARCH_HISTORY)
+    except Exception as e:
+        xbmc.log(f"Kodicek History: Error saving search history item to {HISTORY_DB}: {e}", level=xbmc.LOGERROR)
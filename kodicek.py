@@ -6,14 +6,23 @@ import xbmc
 import xbmcplugin
 import xbmcgui
 import xbmcaddon
-import requests
-import hashlib
 import time # Added for history timestamp
 import json # Added for TMDb JSON parsing
 import re # For strip_year
-from xml.etree import ElementTree as ET
-from history import add_to_history, load_history, add_to_search_history, load_search_history # Updated imports
+import threading
+# Těžké moduly (requests, ElementTree, sqlite3, concurrent.futures) se importují až v akcích,
+# které je potřebují – hlavní menu se tak vykreslí bez nich.
+from history import add_to_history, load_history, count_history, add_to_search_history, load_search_history, profile_path, ensure_profile_dir, HISTORY_PAGE_SIZE # Updated imports
 from resources.lib.tmdb import search_tmdb as new_search_tmdb # New TMDB search
+from resume_helper import set_playing_item, EPISODE_KEYS
+from resources.lib.ladder import resolve_ladder, DEFAULT_MAX_WORKERS
+from resources.lib.worker import WorkerSession
+from resources.lib.release import normalize_text, release_info
+from resources.lib.settings import load_settings
+from resources.lib.season_index import season_queries, bucket_files, episode_files
+from resources.lib.entities import EntityStore, project, find_episode
+from resources.lib.artwork import ArtworkCache, ARTWORK_DIR, image_url, load_policy
+from resources.lib import metrics, listing, hosters
 
 addon = xbmcaddon.Addon()
 addon_handle = int(sys.argv[1])
@@ -24,52 +33,200 @@ WEBSHARE_API_BASE_URL = "https://webshare.cz/api/"
 TMDB_API_BASE_URL = "https://api.themoviedb.org/3/"
 UI_LANG = "cs-CZ" # Default language for UI elements and TMDB season/episode info
 
-_session = requests.Session()
+# HTTP jde přes teplý worker ve službě (service.py); když neběží, WorkerSession volá sama
+_session = WorkerSession()
 _session.headers.update({'User-Agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36"})
 
-HOSTERS = [
-    ...
-]
-
 YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
 
+CACHE_FILE = "cache.db"
+# TTL (v sekundách) pro jednotlivé TMDb endpointy; první shoda vyhrává.
+TMDB_CACHE_TTLS = [
+    (re.compile(r"^search/"), 6 * 3600),
+    (re.compile(r"^tv/\d+/season/\d+/episode/\d+$"), 7 * 86400),
+    (re.compile(r"^tv/\d+/season/\d+$"), 86400),
+    (re.compile(r"^tv/\d+$"), 86400),
+    (re.compile(r"^movie/\d+$"), 7 * 86400),
+]
+TMDB_CACHE_DEFAULT_TTL = 86400
+# Webshare vyhledávání: po WS_SEARCH_FRESH_TTL se výsledek ještě vrací, ale na pozadí
+# se obnoví (stale-while-revalidate); po WS_SEARCH_STALE_TTL záznam úplně vyprší.
+# Prázdné výsledky se cachují také (negativní cache), jen s kratší čerstvostí.
+WS_SEARCH_FRESH_TTL = 30 * 60
+WS_SEARCH_NEGATIVE_TTL = 10 * 60
+WS_SEARCH_STALE_TTL = 24 * 3600
+WS_SEARCH_PAGE_SIZE = 100
+# Zdroje epizody nalezené žebříčkem (i přednačtené pro další epizodu během přehrávání)
+WS_EPISODE_SOURCES_TTL = 6 * 3600
+# Index dostupnosti epizod sezóny: po FRESH se na pozadí doplní novými soubory, po STALE vyprší.
+WS_SEASON_INDEX_FRESH_TTL = 6 * 3600
+WS_SEASON_INDEX_STALE_TTL = 7 * 86400
+WS_SEASON_INDEX_MAX_PAGES = 2
+# Jak dlouho výpis epizod po odpovědi TMDb ještě čeká na index; nestihne-li se, vykreslí se bez počtů
+SEASON_INDEX_WAIT = 0.3
+# Přímé odkazy z /api/file_link/ jsou časově omezené; držíme je v cache s rezervou.
+WS_LINK_TTL = 60 * 60
+WS_LINK_VARIANTS = ['video_stream', 'file_download', '']
+# Čtecí volání Webshare API (POST, ale bez vedlejších účinků) – HTTP vrstva je smí opakovat
+WS_IDEMPOTENT_ENDPOINTS = ('salt', 'search', 'file_info', 'file_link')
+# Výsledky vedlejších hosterů (Sdilej.cz); ukládají se i ty, které do výpisu nestihly dorazit
+HOSTER_SEARCH_TTL = 30 * 60
+SDILEJ_TOKEN_FILE = "sdilej_token.json"
+# Kolik obrázků nejvýš přednačíst pro jeden výpis a pro kolik nejlepších výsledků hledání
+ART_PREWARM_MAX = 30
+ART_PREWARM_SEARCH_RESULTS = 5
+_response_cache = None
+_entity_store = None
+_artwork_cache = None
+_art_policy = None
+_secondary_hosters = None
+_unavailable_notified = set()
+_settings = None
+_refreshing_keys = set()
+_refreshing_lock = threading.Lock()
+
 def strip_year(title: str) -> str:
     if not title:
         return ""
     cleaned = YEAR_RE.sub("", title)
     return " ".join(cleaned.split())
 
-def get_credentials():
-    username = addon.getSetting("ws_username")
-    password = addon.getSetting("ws_password")
+def get_settings():
+    """Snímek nastavení pro toto spuštění (načte se jednou, při prvním použití)."""
+    global _settings
+    if _settings is None:
+        _settings = load_settings(addon)
+    return _settings
+
+def log_verbose(message):
+    """Podrobný průběh akcí: s nastavením verbose_logging jako INFO, jinak jen v debug logu Kodi."""
+    xbmc.log(f"Kodíček: {message}", level=xbmc.LOGINFO if get_settings().verbose_logging else xbmc.LOGDEBUG)
+
+def get_credentials(notify_errors=True):
+    username = get_settings().ws_username
+    password = get_settings().ws_password
     if not username or not password:
-        xbmcgui.Dialog().notification(plugin_name, addon.getLocalizedString(30101), xbmcgui.NOTIFICATION_ERROR)
-        addon.openSettings()
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, addon.getLocalizedString(30101), xbmcgui.NOTIFICATION_ERROR)
+            addon.openSettings()
         return None, None
     return username, password
 
+def get_search_workers():
+    workers = get_settings().ws_search_workers
+    return max(1, workers) if workers is not None else DEFAULT_MAX_WORKERS
+
 def get_tmdb_api_key():
-    tmdb_key = addon.getSetting("tmdb_api_key")
+    tmdb_key = get_settings().tmdb_api_key
     if not tmdb_key:
         xbmcgui.Dialog().notification(plugin_name, "Chybí TMDb API klíč v nastavení!", xbmcgui.NOTIFICATION_ERROR)
         return None
     return tmdb_key
 
-def api_call(endpoint, data=None, method='post', base_url=WEBSHARE_API_BASE_URL):
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        from resources.lib.cache import ResponseCache, DEFAULT_MAX_BYTES
+        max_bytes = DEFAULT_MAX_BYTES
+        if get_settings().cache_size_mb is not None:
+            max_bytes = get_settings().cache_size_mb * 1024 * 1024
+        ensure_profile_dir()
+        _response_cache = ResponseCache(profile_path(CACHE_FILE), max_bytes=max_bytes)
+    return _response_cache
+
+def http_error():
+    """requests.exceptions.RequestException pro except – requests se importuje až při chybě."""
+    import requests
+    return requests.exceptions.RequestException
+
+def get_entity_store():
+    global _entity_store
+    if _entity_store is None:
+        _entity_store = EntityStore(get_response_cache())
+    return _entity_store
+
+def get_art_policy():
+    global _art_policy
+    if _art_policy is None:
+        _art_policy = load_policy(get_settings())
+    return _art_policy
+
+def get_artwork_cache():
+    global _artwork_cache
+    if _artwork_cache is None:
+        _artwork_cache = ArtworkCache(profile_path(ARTWORK_DIR))
+    return _artwork_cache
+
+def art_source_url(path, kind):
+    """URL obrázku z TMDb ve velikosti podle politiky pro daný druh ('thumb', 'fanart', 'still')."""
+    return image_url(path, getattr(get_art_policy(), kind))
+
+def art_url(path, kind):
+    """Jako art_source_url, ale přednačtený obrázek vrátí jako lokální soubor."""
+    return get_artwork_cache().resolve(art_source_url(path, kind))
+
+def prewarm_artwork_async(urls):
+    """Na pozadí stáhne obrázky pro pravděpodobný další výpis do lokální cache."""
+    if not get_settings().art_prewarm:
+        return
+    urls = [url for url in urls if url][:ART_PREWARM_MAX]
+    if urls:
+        threading.Thread(target=get_artwork_cache().prewarm, args=(_session, urls), name="kodicek-art-prewarm").start()
+
+def prewarm_season_stills_async(api_key, tmdb_id, seasons):
+    """Po výpisu sezón připraví entity a obrázky epizod sezón, které se nejspíš otevřou."""
+    if not get_settings().art_prewarm or not seasons:
+        return
+
+    def worker():
+        urls = []
+        for season in seasons:
+            details = get_tmdb_entity(api_key, 'season', tmdb_id, season=season)
+            urls.extend(art_source_url(e.get('still_path'), 'still') for e in (details or {}).get('episodes', []))
+        get_artwork_cache().prewarm(_session, [url for url in urls if url][:ART_PREWARM_MAX])
+
+    threading.Thread(target=worker, name="kodicek-art-prewarm").start()
+
+def api_call(endpoint, data=None, method='post', base_url=WEBSHARE_API_BASE_URL, notify_errors=True, stream=False):
+    """Vrací tělo odpovědi (bytes); se stream=True otevřenou odpověď pro postupné čtení (volající ji zavře)."""
     url = base_url + endpoint
     if base_url == WEBSHARE_API_BASE_URL and not endpoint.endswith('/'):
         url += "/"
         
+    # Timeouty, opakování a jistič řeší HTTP vrstva podle hostu (resources/lib/http_client.py)
+    idempotent = method != 'post' or endpoint.strip('/') in WS_IDEMPOTENT_ENDPOINTS
+    http_span = metrics.span('http', f"{urllib.parse.urlsplit(base_url).hostname}/{metrics.endpoint_name(endpoint)}")
     try:
         if method == 'post':
-            response = _session.post(url, data=data, timeout=10)
+            response = _session.post(url, data=data, stream=stream, idempotent=idempotent)
         else: # get
-            response = _session.get(url, params=data, timeout=10)
-        response.raise_for_status()
+            response = _session.get(url, params=data, stream=stream)
+        # U proudového čtení měří span jen čekání na hlavičky, velikost se nezná
+        http_span.end(status=response.status_code, bytes=None if stream else len(response.content))
+        try:
+            response.raise_for_status()
+        except http_error():
+            # Otevřenou (proudovou) odpověď zavřeme, jinak se spojení nevrátí do poolu
+            response.close()
+            raise
+        if stream:
+            response.raw.decode_content = True
+            return response
         return response.content
-    except requests.exceptions.RequestException as e:
+    except http_error() as e:
+        if getattr(e, 'response', None) is None:
+            http_span.end(error=type(e).__name__)
+        from resources.lib.http_client import CircuitOpenError
+        if isinstance(e, CircuitOpenError):
+            # Host je dočasně vyřazený: jedno upozornění za spuštění místo dialogu u každého volání
+            xbmc.log(f"Kodíček: API call to {url} skipped: {e}", level=xbmc.LOGWARNING)
+            if notify_errors and base_url not in _unavailable_notified:
+                _unavailable_notified.add(base_url)
+                xbmcgui.Dialog().notification(plugin_name, "Služba je dočasně nedostupná, zkuste to za chvíli.", xbmcgui.NOTIFICATION_WARNING)
+            return None
         xbmc.log(f"Kodíček: API call to {url} failed: {e}", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, f"API Error: {e}", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, f"API Error: {e}", xbmcgui.NOTIFICATION_ERROR)
         return None
 
 def is_xml_ok(xml_root):
@@ -83,8 +240,10 @@ def is_xml_ok(xml_root):
     xbmc.log(f"Kodíček: API call not OK. Message: {error_message}", level=xbmc.LOGERROR)
     return False
 
-def login_webshare(username, password):
-    salt_response_content = api_call('salt', {'username_or_email': username}, base_url=WEBSHARE_API_BASE_URL)
+def login_webshare(username, password, notify_errors=True):
+    import hashlib
+    from xml.etree import ElementTree as ET
+    salt_response_content = api_call('salt', {'username_or_email': username}, base_url=WEBSHARE_API_BASE_URL, notify_errors=notify_errors)
     if not salt_response_content:
         return None
     
@@ -92,17 +251,20 @@ def login_webshare(username, password):
         salt_xml = ET.fromstring(salt_response_content)
     except ET.ParseError as e:
         xbmc.log(f"Kodíček: Failed to parse salt XML: {e}. Response: {salt_response_content}", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Invalid salt response.", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Invalid salt response.", xbmcgui.NOTIFICATION_ERROR)
         return None
 
     if not is_xml_ok(salt_xml):
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Could not get salt.", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Could not get salt.", xbmcgui.NOTIFICATION_ERROR)
         return None
     
     salt_node = salt_xml.find('salt')
     if salt_node is None or not salt_node.text:
         xbmc.log("Kodíček: Salt not found in XML response.", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Salt missing.", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Salt missing.", xbmcgui.NOTIFICATION_ERROR)
         return None
     # salt = salt_node.text # Salt is not used in the new double MD5 method
 
@@ -119,7 +281,8 @@ def login_webshare(username, password):
         
     except Exception as e:
         xbmc.log(f"Kodíček: Error during password encryption (hashlib): {e}", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Encryption failed (hashlib).", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Encryption failed (hashlib).", xbmcgui.NOTIFICATION_ERROR)
         return None
 
     login_data = {
@@ -129,7 +292,7 @@ def login_webshare(username, password):
         'keep_logged_in': '1'
     }
     
-    login_response_content = api_call('login', login_data, base_url=WEBSHARE_API_BASE_URL)
+    login_response_content = api_call('login', login_data, base_url=WEBSHARE_API_BASE_URL, notify_errors=notify_errors)
     if not login_response_content:
         return None
 
@@ -137,7 +300,8 @@ def login_webshare(username, password):
         login_xml = ET.fromstring(login_response_content)
     except ET.ParseError as e:
         xbmc.log(f"Kodíček: Failed to parse login XML: {e}. Response: {login_response_content}", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Invalid server response.", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Invalid server response.", xbmcgui.NOTIFICATION_ERROR)
         return None
 
     if not is_xml_ok(login_xml):
@@ -145,7 +309,8 @@ def login_webshare(username, password):
         msg_node = login_xml.find('message')
         if msg_node is not None and msg_node.text:
             message = msg_node.text
-        xbmcgui.Dialog().notification(plugin_name, message, xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, message, xbmcgui.NOTIFICATION_ERROR)
         return None
         
     token_node = login_xml.find('token')
@@ -154,58 +319,428 @@ def login_webshare(username, password):
         return token_node.text
     else:
         xbmc.log("Kodíček: Token not found in login response.", level=xbmc.LOGERROR)
-        xbmcgui.Dialog().notification(plugin_name, "Login error: Token missing.", xbmcgui.NOTIFICATION_ERROR)
+        if notify_errors:
+            xbmcgui.Dialog().notification(plugin_name, "Login error: Token missing.", xbmcgui.NOTIFICATION_ERROR)
         return None
 
-def search_webshare(token, query):
+# Kódy/zprávy Webshare API, které znamenají neplatný nebo prošlý token
+WS_AUTH_ERROR_MARKERS = ('login', 'logged', 'token', 'přihl', 'prihl')
+
+def is_auth_error(xml_root):
+    if xml_root is None:
+        return False
+    status_node = xml_root.find('status')
+    if status_node is not None and status_node.text == 'OK':
+        return False
+    return is_auth_error_message(xml_root.findtext('code', ''), xml_root.findtext('message', ''))
+
+def is_auth_error_message(code, message):
+    text = f"{code or ''} {message or ''}".lower()
+    return any(marker in text for marker in WS_AUTH_ERROR_MARKERS)
+
+class WebshareSession(object):
+    """Líné přihlášení k Webshare.
+
+    Token se načte (případně se provede login) až při prvním skutečném volání
+    Webshare API, takže menu, historie a procházení TMDb běží bez síťového I/O.
+    Odpověď hlásící neplatný token vede k novému přihlášení a jednomu opakování
+    volání. Všechna vlákna sdílejí jeden token a přihlašuje se jen jednou;
+    neúspěšné přihlášení platí pro celé spuštění (do invalidate()).
+    """
+
+    def __init__(self):
+        self._token = None
+        self._login_failed = False
+        self._lock = threading.Lock()
+
+    def get_token(self, notify_errors=True):
+        with self._lock:
+            if not self._token and not self._login_failed:
+                self._token = addon.getSetting('token') or self._login(notify_errors)
+                self._login_failed = not self._token
+            return self._token
+
+    def _login(self, notify_errors=True):
+        username, password = get_credentials(notify_errors)
+        if not username or not password:
+            return None
+        xbmc.log("Kodíček: No valid token, attempting login.", level=xbmc.LOGINFO)
+        token = login_webshare(username, password, notify_errors)
+        if token:
+            addon.setSetting('token', token)
+        else:
+            xbmc.log("Kodíček: Login failed, cannot proceed.", level=xbmc.LOGERROR)
+        return token
+
+    def invalidate(self, bad_token):
+        with self._lock:
+            # Jiné vlákno už mohlo token obnovit – zahodíme jen ten, který selhal
+            if self._token == bad_token:
+                self._token = None
+                self._login_failed = False
+                if addon.getSetting('token') == bad_token:
+                    addon.setSetting('token', '')
+
+    def request(self, endpoint, data=None, notify_errors=True):
+        """POST na Webshare API s tokenem; vrací kořen XML odpovědi nebo None."""
+        from xml.etree import ElementTree as ET
+        for attempt in (1, 2):
+            token = self.get_token(notify_errors)
+            if not token:
+                return None
+            payload = dict(data or {})
+            payload['wst'] = token
+            response_content = api_call(endpoint, payload, method='post', base_url=WEBSHARE_API_BASE_URL, notify_errors=notify_errors)
+            if not response_content:
+                return None
+            try:
+                with metrics.span('parse', f"webshare/{endpoint}", bytes=len(response_content)):
+                    xml_root = ET.fromstring(response_content)
+            except ET.ParseError as e:
+                xbmc.log(f"Kodíček: Failed to parse {endpoint} XML: {e}. Response: {response_content}", level=xbmc.LOGERROR)
+                return None
+            if attempt == 1 and is_auth_error(xml_root):
+                xbmc.log(f"Kodíček: Webshare rejected the token on '{endpoint}', logging in again.", level=xbmc.LOGWARNING)
+                self.invalidate(token)
+                continue
+            return xml_root
+        return None
+
+    def request_files(self, endpoint, data=None, notify_errors=True, max_files=None):
+        """Jako request(), ale <file> záznamy čte proudově (bez stavění celého stromu).
+
+        Vrací (seznam souborů, total) – souborů nejvýš max_files, pak se čtení
+        odpovědi ukončí – nebo (None, None) při chybě.
+        """
+        from xml.etree import ElementTree as ET
+        from resources.lib.webshare_xml import WebshareFileStream
+        for attempt in (1, 2):
+            token = self.get_token(notify_errors)
+            if not token:
+                return None, None
+            payload = dict(data or {})
+            payload['wst'] = token
+            response = api_call(endpoint, payload, method='post', base_url=WEBSHARE_API_BASE_URL, notify_errors=notify_errors, stream=True)
+            if response is None:
+                return None, None
+            parsed = WebshareFileStream(response.raw)
+            files = []
+            # Proudové parsování zahrnuje i čtení těla odpovědi ze sítě
+            parse_span = metrics.span('parse', f"webshare/{endpoint}")
+            try:
+                for file_data in parsed:
+                    files.append(file_data)
+                    if max_files and len(files) >= max_files:
+                        break
+            except (ET.ParseError, http_error()) as e:
+                xbmc.log(f"Kodíček: Failed to read {endpoint} response: {e}", level=xbmc.LOGERROR)
+                return None, None
+            finally:
+                response.close()
+                parse_span.end(files=len(files))
+            if parsed.ok:
+                return files, parsed.total
+            if attempt == 1 and is_auth_error_message(parsed.code, parsed.message):
+                xbmc.log(f"Kodíček: Webshare rejected the token on '{endpoint}', logging in again.", level=xbmc.LOGWARNING)
+                self.invalidate(token)
+                continue
+            xbmc.log(f"Kodíček: API call not OK. Message: {parsed.message or 'Unknown API error'}", level=xbmc.LOGERROR)
+            return None, None
+        return None, None
+
+def ws_search_cache_key(query, offset=0):
+    key = "ws_search:" + " ".join(query.lower().split())
+    return f"{key}@{offset}" if offset else key
+
+def fetch_webshare_search(ws, query, offset=0, notify_errors=True, max_files=None):
+    """Jedna stránka /api/search/. Vrací {'files', 'total', 'offset'}, nebo None při chybě (ta se necachuje)."""
     search_params = {
-        'wst': token,
         'what': query,
         'category': 'video',
-        'limit': 100, # Increased limit as per suggestion
+        'limit': WS_SEARCH_PAGE_SIZE,
+        'offset': offset,
         'sort': 'rating'
     }
-    search_response_content = api_call('search', search_params, method='post', base_url=WEBSHARE_API_BASE_URL)
-    
-    if not search_response_content:
-        return []
+    files, total = ws.request_files('search', search_params, notify_errors=notify_errors, max_files=max_files)
+    if files is None:
+        return None
+    return {'files': files, 'total': total, 'offset': offset}
+
+def has_next_page(page):
+    shown = page['offset'] + len(page['files'])
+    if page.get('total') is not None:
+        return shown < page['total']
+    return len(page['files']) >= WS_SEARCH_PAGE_SIZE
+
+def store_webshare_search(query, page):
     try:
-        search_xml = ET.fromstring(search_response_content)
-    except ET.ParseError as e:
-        xbmc.log(f"Kodíček: Failed to parse search XML: {e}. Response: {search_response_content}", level=xbmc.LOGERROR)
-        return []
-    if not is_xml_ok(search_xml):
-        return []
-    files_list = []
-    for file_elem in search_xml.iter('file'):
-        file_data = {
-            'ident': file_elem.findtext('ident'),
-            'name': file_elem.findtext('name'),
-            'size': int(file_elem.findtext('size', '0')),
-        }
-        if file_data['ident'] and file_data['name']:
-            files_list.append(file_data)
-    return files_list
-
-def get_stream_link(token, ident):
-    possible_params = [
-        {'wst': token, 'ident': ident, 'download_type': 'video_stream'},
-        {'wst': token, 'ident': ident, 'download_type': 'file_download'},
-        {'wst': token, 'ident': ident}
-    ]
-    for link_params in possible_params:
-        link_response_content = api_call('file_link', link_params, method='post', base_url=WEBSHARE_API_BASE_URL)
-        if not link_response_content: continue
+        get_response_cache().put(ws_search_cache_key(query, page['offset']), page, WS_SEARCH_STALE_TTL, namespace='webshare')
+    except Exception as e:
+        xbmc.log(f"Kodíček: Webshare cache write failed for '{query}': {e}", level=xbmc.LOGWARNING)
+
+def refresh_webshare_search_async(ws, query, offset=0):
+    """Stáhne stránku výsledků na pozadí a uloží ji do cache (obnova prošlé stránky i prefetch další)."""
+    key = ws_search_cache_key(query, offset)
+    with _refreshing_lock:
+        if key in _refreshing_keys:
+            return
+        _refreshing_keys.add(key)
+
+    def worker():
+        try:
+            page = fetch_webshare_search(ws, query, offset, notify_errors=False)
+            if page is not None:
+                store_webshare_search(query, page)
+                xbmc.log(f"Kodíček: Background fetch of Webshare query '{query}' (offset {offset}) stored {len(page['files'])} results.", level=xbmc.LOGDEBUG)
+        finally:
+            with _refreshing_lock:
+                _refreshing_keys.discard(key)
+
+    threading.Thread(target=worker, name="kodicek-ws-refresh").start()
+
+def search_webshare_page(ws, query, offset=0, notify_errors=True):
+    cache = get_response_cache()
+    cached = None
+    try:
+        cached = cache.get(ws_search_cache_key(query, offset))
+    except Exception as e:
+        xbmc.log(f"Kodíček: Webshare cache read failed for '{query}': {e}", level=xbmc.LOGWARNING)
+    if cached is not None and cached.fresh and isinstance(cached.value, dict):
+        cache.record('webshare', 'hit')
+        fresh_for = WS_SEARCH_FRESH_TTL if cached.value['files'] else WS_SEARCH_NEGATIVE_TTL
+        if cached.age >= fresh_for:
+            refresh_webshare_search_async(ws, query, offset)
+        return cached.value
+
+    cache.record('webshare', 'miss')
+    page = fetch_webshare_search(ws, query, offset, notify_errors=notify_errors)
+    if page is None:
+        return {'files': [], 'total': None, 'offset': offset}
+    store_webshare_search(query, page)
+    return page
+
+def search_webshare(ws, query, notify_errors=True):
+    return search_webshare_page(ws, query, notify_errors=notify_errors)['files']
+
+def prefetch_next_page_async(ws, query, page):
+    if has_next_page(page):
+        next_offset = page['offset'] + len(page['files'])
+        try:
+            cached = get_response_cache().get(ws_search_cache_key(query, next_offset))
+            if cached is not None and cached.fresh:
+                return
+        except Exception:
+            pass
+        refresh_webshare_search_async(ws, query, next_offset)
+
+def season_index_cache_key(tmdb_id, season):
+    return f"ws_season:{tmdb_id}:{season}"
+
+def build_season_index(ws, show_title, season, index=None, notify_errors=True):
+    """Pošle široké dotazy na celou sezónu a roztřídí výsledky podle epizod.
+
+    Existující index se jen doplní (inkrementální obnova). Vrací None, pokud
+    selhaly všechny dotazy.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    queries = season_queries(show_title, season)
+
+    def collect(query):
+        files, offset = [], 0
+        for _ in range(WS_SEASON_INDEX_MAX_PAGES):
+            page = fetch_webshare_search(ws, query, offset, notify_errors=notify_errors)
+            if page is None:
+                return None if offset == 0 else files
+            files.extend(page['files'])
+            if not has_next_page(page):
+                break
+            offset += len(page['files'])
+        return files
+
+    with ThreadPoolExecutor(max_workers=min(len(queries), get_search_workers()), thread_name_prefix="kodicek-season") as executor:
+        results = list(executor.map(collect, queries))
+    if all(files is None for files in results):
+        return None
+    for files in results:
+        index = bucket_files(files or [], show_title, season, index)
+    log_verbose(f"Season index for '{show_title}' S{season:02d}: {len(index['episodes'])} episodes available.")
+    return index
+
+def store_season_index(tmdb_id, season, index):
+    try:
+        get_response_cache().put(season_index_cache_key(tmdb_id, season), index, WS_SEASON_INDEX_STALE_TTL, namespace='webshare')
+    except Exception as e:
+        xbmc.log(f"Kodíček: Season index cache write failed for {tmdb_id} S{season}: {e}", level=xbmc.LOGWARNING)
+
+def refresh_season_index_async(ws, tmdb_id, show_title, season, index):
+    key = season_index_cache_key(tmdb_id, season)
+    with _refreshing_lock:
+        if key in _refreshing_keys:
+            return
+        _refreshing_keys.add(key)
+
+    def worker():
         try:
-            link_xml = ET.fromstring(link_response_content)
-        except ET.ParseError: continue
+            refreshed = build_season_index(ws, show_title, season, index=index, notify_errors=False)
+            if refreshed is not None:
+                store_season_index(tmdb_id, season, refreshed)
+        finally:
+            with _refreshing_lock:
+                _refreshing_keys.discard(key)
+
+    threading.Thread(target=worker, name="kodicek-season-refresh").start()
+
+def get_season_index(ws, tmdb_id, show_title, season, notify_errors=True):
+    """Index dostupnosti epizod sezóny z cache (prošlý se obnoví na pozadí), jinak ho postaví."""
+    cache = get_response_cache()
+    key = season_index_cache_key(tmdb_id, season)
+    try:
+        cached = cache.get(key)
+    except Exception as e:
+        xbmc.log(f"Kodíček: Season index cache read failed for {key}: {e}", level=xbmc.LOGWARNING)
+        cached = None
+    if cached is not None and cached.fresh and isinstance(cached.value, dict):
+        cache.record('webshare', 'season_index_hit')
+        if cached.age >= WS_SEASON_INDEX_FRESH_TTL:
+            refresh_season_index_async(ws, tmdb_id, show_title, season, cached.value)
+        return cached.value
+    cache.record('webshare', 'season_index_miss')
+    index = build_season_index(ws, show_title, season, notify_errors=notify_errors)
+    if index is None:
+        return None
+    store_season_index(tmdb_id, season, index)
+    return index
+
+def get_link_variants():
+    """Varianty download_type pro file_link; naposledy úspěšná (naučená) jde první."""
+    preferred = addon.getSetting('ws_link_variant')
+    if preferred == 'none': preferred = ''
+    if preferred in WS_LINK_VARIANTS:
+        return [preferred] + [v for v in WS_LINK_VARIANTS if v != preferred]
+    return list(WS_LINK_VARIANTS)
+
+def remember_link_variant(variant):
+    stored = addon.getSetting('ws_link_variant')
+    value = variant or 'none'
+    if stored != value:
+        xbmc.log(f"Kodíček: Learned file_link download_type preference: '{value}'", level=xbmc.LOGINFO)
+        addon.setSetting('ws_link_variant', value)
+
+def resolve_stream_link(ws, ident, notify_errors=True):
+    """Zeptá se Webshare na přímý odkaz (bez cache). Vrací odkaz nebo None."""
+    for variant in get_link_variants():
+        link_params = {'ident': ident}
+        if variant:
+            link_params['download_type'] = variant
+        link_xml = ws.request('file_link', link_params, notify_errors=notify_errors)
         if not is_xml_ok(link_xml): continue
         link_node = link_xml.find('link')
         if link_node is not None and link_node.text:
+            remember_link_variant(variant)
+            try:
+                get_response_cache().put(f"ws_link:{ident}", link_node.text, WS_LINK_TTL, namespace='links')
+            except Exception as e:
+                xbmc.log(f"Kodíček: Link cache write failed for {ident}: {e}", level=xbmc.LOGWARNING)
             return link_node.text
-    xbmcgui.Dialog().notification(plugin_name, "Nepodařilo se získat stream link!", xbmcgui.NOTIFICATION_ERROR, 7000)
     return None
 
+def get_stream_link(ws, ident):
+    cache = get_response_cache()
+    try:
+        cached = cache.get(f"ws_link:{ident}")
+    except Exception as e:
+        xbmc.log(f"Kodíček: Link cache read failed for {ident}: {e}", level=xbmc.LOGWARNING)
+        cached = None
+    if cached is not None and cached.fresh and cached.value:
+        cache.record('links', 'hit')
+        return cached.value
+    cache.record('links', 'miss')
+    # Neúspěch hlásí jednou akce play (společně pro všechny hostery)
+    return resolve_stream_link(ws, ident)
+
+def prefetch_stream_link_async(ws, ident):
+    """Na pozadí připraví odkaz pro nejlépe hodnocený zdroj, zatímco uživatel vybírá."""
+    if not get_settings().ws_prefetch_links:
+        return
+    try:
+        cached = get_response_cache().get(f"ws_link:{ident}")
+        if cached is not None and cached.fresh:
+            return
+    except Exception:
+        pass
+    threading.Thread(target=resolve_stream_link, args=(ws, ident, False), name="kodicek-link-prefetch").start()
+
+class WebshareHoster(hosters.BaseHoster):
+    """Webshare jako primární hoster; hledání i odkazy jdou přes cache a WebshareSession."""
+
+    name = "webshare"
+    label = "Webshare"
+    primary = True
+
+    def __init__(self, ws):
+        self.ws = ws
+
+    def search(self, query):
+        return search_webshare(self.ws, query)
+
+    def get_stream(self, ident, wait=None):
+        return get_stream_link(self.ws, ident)
+
+    def stream_headers(self):
+        return {'User-Agent': _session.headers.get('User-Agent', 'Mozilla/5.0'), 'Cookie': f'wst={self.ws.get_token()}'}
+
+def get_secondary_hosters():
+    """Zapnuté hostery kromě Webshare; Sdilej.cz se importuje až tady, jen když je zapnutý."""
+    global _secondary_hosters
+    if _secondary_hosters is None:
+        _secondary_hosters = []
+        settings = get_settings()
+        if settings.sdilej_enabled:
+            from resources.lib.sdilej import SdilejHoster
+            try:
+                # Tickety a odkazy v cache přežijí do akce play, která běží v dalším spuštění pluginu
+                # Token se přihlášením získá až při prvním požadavku a pak se bere z profilu
+                # HTTP jde přes sdílenou session (worker, jistič, pool) jako u Webshare a TMDb
+                _secondary_hosters.append(SdilejHoster(settings.sdilej_username or None, settings.sdilej_password or None, session=_session,
+                                                       cache=get_response_cache(), token_path=profile_path(SDILEJ_TOKEN_FILE)))
+            except Exception as e:
+                xbmc.log(f"Kodíček: Sdilej.cz is unavailable: {e}", level=xbmc.LOGWARNING)
+    return _secondary_hosters
+
+def get_hoster(name, ws):
+    if name == WebshareHoster.name:
+        return WebshareHoster(ws)
+    for hoster in get_secondary_hosters():
+        if hoster.name == name:
+            return hoster
+    return None
+
+def search_hoster(hoster, query, keep=None):
+    """Hledání na vedlejším hosteru přes cache; keep(sources) vybere relevantní záznamy."""
+    cache = get_response_cache()
+    cache_key = f"hoster_search:{hoster.name}:{normalize_text(query)}"
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        xbmc.log(f"Kodíček: {hoster.label} cache read failed for '{query}': {e}", level=xbmc.LOGWARNING)
+        cached = None
+    if cached is not None and cached.fresh:
+        cache.record(hoster.name, 'hit')
+        sources = cached.value
+    else:
+        cache.record(hoster.name, 'miss')
+        sources = hoster.search(query)
+        try:
+            cache.put(cache_key, sources, HOSTER_SEARCH_TTL, namespace=hoster.name)
+        except Exception as e:
+            xbmc.log(f"Kodíček: {hoster.label} cache write failed for '{query}': {e}", level=xbmc.LOGWARNING)
+    log_verbose(f"{hoster.label} query '{query}' returned {len(sources)} results.")
+    return keep(sources) if keep else sources
+
+def start_hoster_search(query, keep=None):
+    """Spustí hledání na vedlejších hosterech na pozadí (souběžně s Webshare); bez nich nic nestartuje."""
+    return hosters.FederatedSearch([(hoster, lambda hoster=hoster: search_hoster(hoster, query, keep)) for hoster in get_secondary_hosters()])
+
 def get_mimetype(filename):
     if '.' in filename:
         ext = filename.rsplit('.', 1)[1].lower()
@@ -215,95 +750,239 @@ def get_mimetype(filename):
         elif ext == 'ts': return 'video/mp2t'
     return 'application/octet-stream'
 
-def normalize_text(text):
-    if not text: return ""
-    text = text.lower()
-    replacements = {
-        'á': 'a', 'č': 'c', 'ď': 'd', 'é': 'e', 'ě': 'e', 'í': 'i', 'ň': 'n',
-        'ó': 'o', 'ř': 'r', 'š': 's', 'ť': 't', 'ú': 'u', 'ů': 'u', 'ý': 'y',
-        'ž': 'z', 'ľ': 'l', 'ĺ': 'l', 'ŕ': 'r', 'ä': 'a', 'ô': 'o'
-    }
-    for char_from, char_to in replacements.items():
-        text = text.replace(char_from, char_to)
-    text = text.replace(' ', '.').replace('_', '.').replace('-', '.')
-    text = re.sub(r'[^\w.]', '', text) # Keep alphanumeric, underscore, and dot
-    text = re.sub(r'\.+', '.', text)   # Replace multiple dots with a single dot
-    return text.strip('.')
-
 # --- TMDb Functions ---
-def tmdb_api_request(api_key, endpoint, params=None, method='get'):
+def tmdb_cache_ttl(endpoint):
+    for pattern, ttl in TMDB_CACHE_TTLS:
+        if pattern.match(endpoint):
+            return ttl
+    return TMDB_CACHE_DEFAULT_TTL
+
+def tmdb_cache_key(endpoint, params):
+    # api_key do klíče nepatří – změna klíče nemění obsah odpovědi
+    query = urllib.parse.urlencode(sorted((k, str(v)) for k, v in (params or {}).items() if k != 'api_key'))
+    return f"tmdb:{endpoint}?{query}"
+
+def tmdb_api_request(api_key, endpoint, params=None, method='get', cache_response=True):
+    """GET na TMDb s cache odpovědí; odpovědi entity-endpointů se navíc uloží do úložiště entit.
+
+    cache_response=False přeskočí cache celých odpovědí – používá get_tmdb_entity,
+    které si čerstvost hlídá samo nad kompaktními entitami.
+    """
     if not api_key:
         xbmc.log("Kodíček: TMDb API key is missing for request.", level=xbmc.LOGERROR)
         return None
-    url = f"{TMDB_API_BASE_URL}{endpoint.lstrip('/')}"
+    if method != 'get':
+        xbmc.log(f"Kodíček: Unsupported TMDb API method: {method}", level=xbmc.LOGERROR)
+        return None
+    endpoint = endpoint.lstrip('/')
+    url = f"{TMDB_API_BASE_URL}{endpoint}"
     all_params = {'api_key': api_key}
     if params:
         all_params.update(params)
+
+    cache = get_response_cache()
+    cache_key = tmdb_cache_key(endpoint, all_params)
+    ttl = tmdb_cache_ttl(endpoint)
+    cached = None
     try:
-        if method == 'get':
-            response = _session.get(url, params=all_params, timeout=10)
-        else:
-            xbmc.log(f"Kodíček: Unsupported TMDb API method: {method}", level=xbmc.LOGERROR)
-            return None
+        if cache_response:
+            cached = cache.get(cache_key)
+    except Exception as e:
+        xbmc.log(f"Kodíček: TMDb cache read failed for {endpoint}: {e}", level=xbmc.LOGWARNING)
+    if cached is not None and cached.fresh:
+        cache.record('tmdb', 'hit')
+        return cached.value
+
+    headers = {}
+    if cached is not None:
+        if cached.etag: headers['If-None-Match'] = cached.etag
+        if cached.last_modified: headers['If-Modified-Since'] = cached.last_modified
+    http_span = metrics.span('http', f"{urllib.parse.urlsplit(TMDB_API_BASE_URL).hostname}/{metrics.endpoint_name(endpoint)}")
+    try:
+        response = _session.get(url, params=all_params, headers=headers)
+        http_span.end(status=response.status_code, bytes=len(response.content))
+        if response.status_code == 304 and cached is not None:
+            cache.refresh(cache_key, ttl)
+            cache.record('tmdb', 'revalidated')
+            cache.record('tmdb', 'hit')
+            return cached.value
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        with metrics.span('parse', f"tmdb/{metrics.endpoint_name(endpoint)}"):
+            data = response.json()
+    except http_error() as e:
+        if getattr(e, 'response', None) is None:
+            http_span.end(error=type(e).__name__)
         xbmc.log(f"Kodíček: TMDb API call to {url} (params: {all_params}) failed: {e}", level=xbmc.LOGERROR)
+        if cached is not None:
+            xbmc.log(f"Kodíček: Serving stale TMDb cache entry for {endpoint}.", level=xbmc.LOGWARNING)
+            return cached.value
         return None
     except json.JSONDecodeError as e:
         xbmc.log(f"Kodíček: Failed to parse TMDb JSON response from {url}: {e}. Response text: {response.text[:500]}", level=xbmc.LOGERROR)
         return None
 
+    cache.record('tmdb', 'miss')
+    try:
+        if cache_response:
+            cache.put(cache_key, data, ttl, namespace='tmdb', etag=response.headers.get('ETag'), last_modified=response.headers.get('Last-Modified'))
+        get_entity_store().ingest(endpoint, all_params.get('language'), data, ttl)
+    except Exception as e:
+        xbmc.log(f"Kodíček: TMDb cache write failed for {endpoint}: {e}", level=xbmc.LOGWARNING)
+    return data
+
+TMDB_ENTITY_ENDPOINTS = {
+    'movie': "/movie/{tmdb_id}",
+    'show': "/tv/{tmdb_id}",
+    'season': "/tv/{tmdb_id}/season/{season}",
+}
+
+def get_tmdb_entity(api_key, kind, tmdb_id, language=UI_LANG, season=None):
+    """Film ('movie'), seriál ('show') nebo sezóna ('season') z úložiště entit.
+
+    Z TMDb se stahuje jen chybějící nebo prošlá entita; při chybě sítě se vrátí
+    i prošlá.
+    """
+    store = get_entity_store()
+    entry = None
+    try:
+        entry = store.get(kind, tmdb_id, language, season)
+    except Exception as e:
+        xbmc.log(f"Kodíček: Entity store read failed for {kind} {tmdb_id}: {e}", level=xbmc.LOGWARNING)
+    if entry is not None and entry.value.get('partial'):
+        entry = None
+    if entry is not None and entry.fresh:
+        store.cache.record('entities', 'hit')
+        return entry.value
+    store.cache.record('entities', 'miss')
+    endpoint = TMDB_ENTITY_ENDPOINTS[kind].format(tmdb_id=tmdb_id, season=season)
+    data = tmdb_api_request(api_key, endpoint, {'language': language}, cache_response=False)
+    if data:
+        return project(kind, data)
+    if entry is not None:
+        xbmc.log(f"Kodíček: Serving stale TMDb entity {kind} {tmdb_id} ({language}).", level=xbmc.LOGWARNING)
+        return entry.value
+    return None
+
+def get_tmdb_episode(api_key, tmdb_id, season, episode, language=UI_LANG):
+    """Epizoda z entity sezóny; chybí-li, stáhne se celá sezóna (poslouží i dalším epizodám)."""
+    try:
+        entry = get_entity_store().get('season', tmdb_id, language, season)
+    except Exception:
+        entry = None
+    if entry is not None and entry.fresh:
+        found = find_episode(entry.value, episode)
+        if found:
+            return found
+    return find_episode(get_tmdb_entity(api_key, 'season', tmdb_id, language, season), episode)
+
 def _tmdb_get_for_search_module(endpoint, params):
     api_key = get_tmdb_api_key()
     if not api_key:
         return {"results": []} 
     return tmdb_api_request(api_key, endpoint, params)
 
-def get_banner_image_url(tmdb_item, size="w500"):
+def get_banner_image_url(tmdb_item, kind="fanart"):
     if not tmdb_item: return None
-    backdrop_path = tmdb_item.get('backdrop_path')
-    if backdrop_path: return f"https://image.tmdb.org/t/p/{size}{backdrop_path}"
-    poster_path = tmdb_item.get('poster_path')
-    if poster_path: return f"https://image.tmdb.org/t/p/{size}{poster_path}"
-    return None
+    return art_url(tmdb_item.get('backdrop_path') or tmdb_item.get('poster_path'), kind)
 
 def get_tmdb_details(api_key, tmdb_id, media_type='movie', language='cs-CZ'):
     if not tmdb_id:
         xbmc.log("Kodíček: TMDb ID is missing for get_tmdb_details.", level=xbmc.LOGERROR)
         return None
-    request_params = {'language': language, 'append_to_response': 'credits,images,videos,external_ids'}
-    xbmc.log(f"Kodíček: Fetching TMDb details ({media_type}) for ID: {tmdb_id}, Lang='{language}' using tmdb_api_request", level=xbmc.LOGINFO)
-    data = tmdb_api_request(api_key, f"/{media_type}/{tmdb_id}", request_params)
+    log_verbose(f"Fetching TMDb details ({media_type}) for ID: {tmdb_id}, Lang='{language}' from the entity store")
+    data = get_tmdb_entity(api_key, 'show' if media_type == 'tv' else 'movie', tmdb_id, language)
     if data:
-        xbmc.log(f"Kodíček: TMDb details fetched successfully for ID: {tmdb_id}", level=xbmc.LOGINFO)
+        log_verbose(f"TMDb details fetched successfully for ID: {tmdb_id}")
     else:
         xbmc.log(f"Kodíček: Failed to fetch TMDb details for ID: {tmdb_id}", level=xbmc.LOGWARNING)
     return data
 # --- End TMDb Functions ---
 
+def plugin_url(action, **params):
+    return listing.build_url(BASE_URL_PLUGIN, dict(action=action, **params))
+
+def source_item(file_item, label=None, info=None, art=None, plot=None, **url_params):
+    """Položka výpisu pro zdroj z kteréhokoli hosteru; přehraje se přes akci play (url_params jdou do URL)."""
+    if info is None:
+        size_bytes = file_item.get("size", 0)
+        info = {"title": file_item["name"], "size": size_bytes, "plot": plot or f"Velikost: {listing.format_size(size_bytes)}"}
+    label = label or file_item["name"]
+    hoster = hosters.hoster_of(file_item)
+    if hoster == hosters.DEFAULT_HOSTER:
+        hoster = None
+    else:
+        label = f"[{hoster}] {label}"
+    url = plugin_url("play", ident=file_item['ident'], name=file_item['name'], hoster=hoster, **url_params)
+    return listing.Item(label, url, folder=False, info=info, art=art, playable=True)
+
+def prefetch_best_source_async(ws, sources):
+    """Na pozadí připraví odkaz pro nejlepší zdroj Webshare a rozběhne čekání na nejlepším zdroji ostatních hosterů."""
+    if not sources or not get_settings().ws_prefetch_links:
+        return
+    if hosters.hoster_of(sources[0]) == hosters.DEFAULT_HOSTER:
+        prefetch_stream_link_async(ws, sources[0]['ident'])
+    prepared = set()
+    for source in sources:
+        name = hosters.hoster_of(source)
+        if name == hosters.DEFAULT_HOSTER or name in prepared:
+            continue
+        # Free účet má jediný slot – ticket se bere jen pro nejlépe hodnocený zdroj hosteru
+        prepared.add(name)
+        hoster = get_hoster(name, ws)
+        if hoster:
+            # Vlákno musí doběhnout (ticket se uloží do cache), proces pluginu ale drží nejvýš PREPARE_TIMEOUT
+            threading.Thread(target=prepare_hoster_source, args=(hoster, source['ident']), name="kodicek-ticket").start()
+
+def prepare_hoster_source(hoster, ident):
+    try:
+        hoster.prepare(ident, timeout=hosters.PREPARE_TIMEOUT)
+    except Exception as e:
+        xbmc.log(f"Kodíček: {hoster.label} could not prepare {ident}: {e}", level=xbmc.LOGWARNING)
+
+def wait_with_progress(hoster, seconds):
+    """Zbytek čekací doby hosteru (free ticket) s dialogem, který jde zrušit; False = zrušeno."""
+    dialog = xbmcgui.DialogProgress()
+    dialog.create(plugin_name, f"{hoster.label}: čekání na uvolnění stahování…")
+    monitor = xbmc.Monitor()
+    end = time.monotonic() + seconds
+    try:
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return True
+            if dialog.iscanceled():
+                return False
+            dialog.update(int(100 * (1 - remaining / seconds)), f"{hoster.label}: čekání na uvolnění stahování, zbývá {int(remaining) + 1} s")
+            if monitor.waitForAbort(min(0.5, remaining)):
+                return False
+    finally:
+        dialog.close()
+
 def router(paramstring):
     params = dict(urllib.parse.parse_qsl(paramstring))
     action = params.get("action")
 
-    username, password = get_credentials()
-    if not username or not password:
-        if action: xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
+    # Akce z nastavení – nepotřebují Webshare přihlášení
+    if action == "cache_stats":
+        show_cache_stats()
+        return
+    elif action == "clear_cache":
+        get_response_cache().clear()
+        xbmcgui.Dialog().notification(plugin_name, "Cache byla vymazána.", xbmcgui.NOTIFICATION_INFO)
+        return
+    elif action == "metrics_stats":
+        xbmcgui.Dialog().textviewer(f"{plugin_name} – Měření výkonu", metrics.format_summary(metrics.load(profile_path(metrics.METRICS_FILE))))
+        return
+    elif action == "clear_metrics":
+        metrics.clear(profile_path(metrics.METRICS_FILE))
+        xbmcgui.Dialog().notification(plugin_name, "Měření byla vymazána.", xbmcgui.NOTIFICATION_INFO)
         return
 
-    token = addon.getSetting('token')
-    if not token:
-        xbmc.log("Kodíček: No token found, attempting login.", level=xbmc.LOGINFO)
-        token = login_webshare(username, password)
-        if token:
-            addon.setSetting('token', token)
-        else:
-            xbmc.log("Kodíček: Login failed, cannot proceed.", level=xbmc.LOGERROR)
-            if action: xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
-            return
+    # Přihlášení k Webshare proběhne až při prvním volání jeho API
+    ws = WebshareSession()
 
     if action == "search":
-        xbmc.log(f"Kodíček: Action 'search' entered. Params: {params}", level=xbmc.LOGINFO)
+        log_verbose(f"Action 'search' entered. Params: {params}")
         what_to_search = params.get("what") 
         ask_for_input = params.get("ask") == "1"
 
@@ -321,14 +1000,13 @@ def router(paramstring):
 
             if tmdb_api_key:
                 query_text_for_tmdb = strip_year(what_to_search)
-                xbmc.log(f"Kodíček: Preparing TMDb multi-search - Query: '{query_text_for_tmdb}'", level=xbmc.LOGINFO)
+                log_verbose(f"Preparing TMDb multi-search - Query: '{query_text_for_tmdb}'")
                 tmdb_search_results = new_search_tmdb(query_text_for_tmdb, _tmdb_get_for_search_module)
                 if tmdb_search_results:
                     tmdb_results_to_display.extend(tmdb_search_results)
             
             if tmdb_results_to_display:
-                xbmcplugin.setPluginCategory(addon_handle, f"TMDb Výsledky pro: {what_to_search}")
-                xbmcplugin.setContent(addon_handle, 'videos')
+                items = []
                 for item in tmdb_results_to_display:
                     media_type = item.get('media_type')
                     if not media_type or media_type not in ['movie', 'tv']:
@@ -341,61 +1019,40 @@ def router(paramstring):
                     display_title = f"{title} ({year})" if year else title
                     display_title = f"[{media_type.upper()}] {display_title}"
                     
-                    li = xbmcgui.ListItem(label=display_title)
                     info_labels = {'title': title, 'plot': overview, 'mediatype': media_type}
                     if year: info_labels['year'] = int(year)
                     
                     art_data = {}
-                    thumb_url = get_banner_image_url(item, "w500") 
-                    if thumb_url: art_data['thumb'] = art_data['poster'] = art_data['fanart'] = thumb_url
-                    
-                    li.setArt(art_data)
-                    li.setInfo('video', info_labels)
-                    li.setProperty('IsPlayable', 'false')
+                    thumb_url = get_banner_image_url(item, "thumb")
+                    if thumb_url: art_data['thumb'] = art_data['poster'] = thumb_url
+                    fanart_url = get_banner_image_url(item, "fanart")
+                    if fanart_url: art_data['fanart'] = fanart_url
 
-                    action_url = ""
                     if media_type == 'movie':
-                        action_url = f"{BASE_URL_PLUGIN}?action=process_tmdb_selection&tmdb_id={tmdb_id}&media_type=movie&title={urllib.parse.quote(title, encoding='utf-8')}&year={year}"
-                    elif media_type == 'tv':
-                        action_url = f"{BASE_URL_PLUGIN}?action=show_seasons&tmdb_id={tmdb_id}&show_title={urllib.parse.quote(title, encoding='utf-8')}"
-                    
-                    if action_url:
-                        xbmcplugin.addDirectoryItem(handle=addon_handle, url=action_url, listitem=li, isFolder=True)
-                xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+                        action_url = plugin_url("process_tmdb_selection", tmdb_id=tmdb_id, media_type="movie", title=title, year=year)
+                    else:
+                        action_url = plugin_url("show_seasons", tmdb_id=tmdb_id, show_title=title)
+                    items.append(listing.Item(display_title, action_url, info=info_labels, art=art_data))
+                listing.render(addon_handle, items, category=f"TMDb Výsledky pro: {what_to_search}", content='videos', sort="titles", name='search')
+                # Další výpis bude nejspíš jeden z prvních výsledků – jeho plakát a fanart
+                prewarm_urls = []
+                for item in tmdb_results_to_display[:ART_PREWARM_SEARCH_RESULTS]:
+                    prewarm_urls.append(art_source_url(item.get('poster_path'), 'thumb'))
+                    prewarm_urls.append(art_source_url(item.get('backdrop_path') or item.get('poster_path'), 'fanart'))
+                prewarm_artwork_async(prewarm_urls)
                 return
             else: 
-                xbmc.log("Kodíček: No results from TMDb or no API key, proceeding with Webshare search.", level=xbmc.LOGINFO)
-                query_for_webshare = strip_year(what_to_search)
-                files = search_webshare(token, query_for_webshare)
-                if not files:
-                    xbmcgui.Dialog().notification(plugin_name, "Nic nebylo nalezeno na Webshare.", xbmcgui.NOTIFICATION_INFO)
-                else:
-                    xbmcplugin.setPluginCategory(addon_handle, f"Výsledky pro: {what_to_search}")
-                    xbmcplugin.setContent(addon_handle, 'videos')
-                    for file_item in files:
-                        li = xbmcgui.ListItem(label=file_item["name"])
-                        size_bytes = file_item.get("size", 0)
-                        size_str = f"{size_bytes/(1024*1024*1024):.2f} GB" if size_bytes > 1024*1024*1024 else f"{size_bytes/(1024*1024):.2f} MB" if size_bytes > 1024*1024 else f"{size_bytes/1024:.0f} KB" if size_bytes > 1024 else f"{size_bytes} B"
-                        li.setInfo("video", {"title": file_item["name"], "size": size_bytes, "plot": f"Velikost: {size_str}"})
-                        li.setProperty('IsPlayable', 'true')
-                        url = f"{BASE_URL_PLUGIN}?action=play&ident={file_item['ident']}&name={urllib.parse.quote(file_item['name'], encoding='utf-8')}"
-                        xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-                xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+                log_verbose("No results from TMDb or no API key, proceeding with Webshare search.")
+                display_webshare_results(ws, strip_year(what_to_search), category=f"Výsledky pro: {what_to_search}")
 
         else: 
-            xbmcplugin.setPluginCategory(addon_handle, "Vyhledávání")
-            li_new_search = xbmcgui.ListItem(label="Nové vyhledávání...")
-            li_new_search.setArt({'icon': 'DefaultAddonsSearch.png'})
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=search&ask=1", listitem=li_new_search, isFolder=True)
-            search_history_items = load_search_history()
-            if search_history_items:
-                for item in search_history_items:
-                    query_text = item.get("query")
-                    if query_text:
-                        timestamp_str = time.strftime('%d.%m.%y %H:%M', time.localtime(item['timestamp']))
-                        li = xbmcgui.ListItem(label=f"Hledáno: {query_text} ({timestamp_str})")
-                        xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=search&what={urllib.parse.quote(query_text, encoding='utf-8')}", listitem=li, isFolder=True)
-            xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+            items = [listing.Item("Nové vyhledávání...", plugin_url("search", ask=1), art={'icon': 'DefaultAddonsSearch.png'})]
+            for item in load_search_history() or []:
+                query_text = item.get("query")
+                if query_text:
+                    timestamp_str = time.strftime('%d.%m.%y %H:%M', time.localtime(item['timestamp']))
+                    items.append(listing.Item(f"Hledáno: {query_text} ({timestamp_str})", plugin_url("search", what=query_text)))
+            listing.render(addon_handle, items, category="Vyhledávání", name='search_history')
 
     elif action == "play":
         ident = params.get("ident")
@@ -404,43 +1061,52 @@ def router(paramstring):
             xbmcgui.Dialog().notification(plugin_name, "Chybí ident souboru.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.setResolvedUrl(addon_handle, False, xbmcgui.ListItem())
             return
-        stream_url = get_stream_link(token, ident)
+        # Odkaz vydává hoster, který zdroj našel (starší položky historie jsou z Webshare)
+        hoster = get_hoster(params.get("hoster") or hosters.DEFAULT_HOSTER, ws)
+        try:
+            stream_url = hoster.get_stream(ident, wait=lambda seconds: wait_with_progress(hoster, seconds)) if hoster else None
+        except Exception as e:
+            xbmc.log(f"Kodíček: {hoster.label} failed to resolve {ident}: {e}", level=xbmc.LOGERROR)
+            stream_url = None
         if not stream_url:
             xbmcgui.Dialog().notification(plugin_name, "Nepodařilo se získat odkaz.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.setResolvedUrl(addon_handle, False, xbmcgui.ListItem())
             return
-        headers_str = urllib.parse.urlencode({'User-Agent': _session.headers.get('User-Agent', 'Mozilla/5.0'), 'Cookie': f'wst={token}'})
-        path_with_headers = f"{stream_url}|{headers_str}"
+        headers_str = urllib.parse.urlencode(hoster.stream_headers())
+        path_with_headers = f"{stream_url}|{headers_str}" if headers_str else stream_url
         li = xbmcgui.ListItem(path=path_with_headers)
         li.setInfo("video", {"title": file_name_for_playback})
         li.setProperty('IsPlayable', 'true')
         li.setMimeType(get_mimetype(file_name_for_playback))
-        add_to_history({"ident": ident, "name": file_name_for_playback, "timestamp": int(time.time()), "type": "video"})
+        # Do historie jen holé URL – hlavičky nesou přihlašovací cookie, která nemá skončit na disku
+        history_item = {"ident": ident, "name": file_name_for_playback, "timestamp": int(time.time()), "type": "video", "file_path": stream_url}
+        if not hoster.primary:
+            history_item["hoster"] = hoster.name
+        # U epizod si pamatujeme i seriál a číslo epizody – služba podle toho přednačte další
+        for key in EPISODE_KEYS:
+            if params.get(key):
+                history_item[key] = int(params[key]) if key in ("season", "episode") else params[key]
+        add_to_history(history_item)
+        # Služba (service.py) podle toho průběžně ukládá pozici k této položce historie
+        set_playing_item(history_item)
         xbmcplugin.setResolvedUrl(addon_handle, True, li)
 
     elif action == "history":
-        history_items = load_history()
+        offset = int(params.get("offset", 0)) if params.get("offset", "0").isdigit() else 0
+        history_items = load_history(limit=HISTORY_PAGE_SIZE, offset=offset)
         if not history_items:
             xbmcgui.Dialog().notification(plugin_name, "Historie přehrávání je prázdná.", xbmcgui.NOTIFICATION_INFO)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
             return
-        xbmcplugin.setPluginCategory(addon_handle, "Historie přehrávání")
-        xbmcplugin.setContent(addon_handle, 'videos')
-        for item in history_items:
-            if not item.get("ident") or not item.get("name") or item.get("type") != "video": continue
-            li = xbmcgui.ListItem(label=item["name"])
-            timestamp_str = time.strftime('%d.%m.%Y %H:%M', time.localtime(item['timestamp']))
-            li.setInfo("video", {"title": item["name"], "plot": f"Naposledy přehráno: {timestamp_str}"})
-            li.setProperty('IsPlayable', 'true')
-            url = f"{BASE_URL_PLUGIN}?action=play&ident={item['ident']}&name={urllib.parse.quote(item['name'], encoding='utf-8')}"
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-        xbmcplugin.endOfDirectory(addon_handle)
+        items = history_list_items(history_items) + history_next_page(offset, len(history_items), "history")
+        listing.render(addon_handle, items, category="Historie přehrávání", content='videos', sort="history", name='history')
 
     elif action == "show_combined_history":
-        display_combined_history()
+        offset = int(params.get("offset", 0)) if params.get("offset", "0").isdigit() else 0
+        display_combined_history(offset)
     
     elif action == "process_tmdb_selection":
-        process_tmdb_selection(params, token)
+        process_tmdb_selection(params, ws)
 
     elif action == "show_seasons":
         tmdb_id = params.get("tmdb_id")
@@ -450,42 +1116,35 @@ def router(paramstring):
             xbmcgui.Dialog().notification(plugin_name, "Chyba: Chybí API klíč nebo ID seriálu.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
             return
-        tv_details = tmdb_api_request(api_key, f"/tv/{tmdb_id}", {'language': UI_LANG, 'append_to_response': 'images'})
+        tv_details = get_tmdb_entity(api_key, 'show', tmdb_id)
         if not tv_details or not tv_details.get("seasons"):
             xbmcgui.Dialog().notification(plugin_name, "Nepodařilo se načíst informace o sezónách.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
             return
-        xbmcplugin.setPluginCategory(addon_handle, f"{show_title} - Sezóny")
-        xbmcplugin.setContent(addon_handle, 'tvshows')
+        skip_specials = get_settings().tmdb_skip_specials
+        fanart_url = get_banner_image_url(tv_details)
+        items = []
         for season in tv_details.get("seasons", []):
             season_number = season.get("season_number")
-            
-            skip_specials = True 
-            try:
-                skip_specials = addon.getSettingBool("tmdb_skip_specials")
-            except TypeError:
-                xbmc.log("Kodíček: 'tmdb_skip_specials' setting missing or invalid type, defaulting to True.", level=xbmc.LOGWARNING)
 
             if season_number == 0 and skip_specials: 
                  continue
             season_name = season.get("name") or f"Sezóna {season_number}"
             episode_count = season.get("episode_count", 0)
             display_label = f"{season_name} ({episode_count} epizod)"
-            li = xbmcgui.ListItem(label=display_label)
             art_data = {}
             poster_path = season.get('poster_path') or tv_details.get('poster_path')
-            if poster_path: art_data['thumb'] = art_data['poster'] = f"https://image.tmdb.org/t/p/w500{poster_path}"
-            fanart_url = get_banner_image_url(tv_details)
+            if poster_path: art_data['thumb'] = art_data['poster'] = art_url(poster_path, 'thumb')
             if fanart_url: art_data['fanart'] = fanart_url
             if not art_data.get('thumb') and fanart_url: art_data['thumb'] = fanart_url
-            li.setArt(art_data)
             info = {'title': season_name, 'plot': season.get('overview', ''), 'tvshowtitle': show_title, 'season': season_number, 'episode': episode_count, 'mediatype': 'season'}
             if season.get('air_date'): info['premiered'] = season.get('air_date')
-            li.setInfo('video', info)
-            li.setProperty('IsPlayable', 'false')
-            url = f"{BASE_URL_PLUGIN}?action=show_episodes&tmdb_id={tmdb_id}&season_number={season_number}&show_title={urllib.parse.quote(show_title, encoding='utf-8')}&show_year={tv_details.get('first_air_date', '')[:4]}"
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=True)
-        xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+            url = plugin_url("show_episodes", tmdb_id=tmdb_id, season_number=season_number, show_title=show_title, show_year=(tv_details.get('first_air_date') or '')[:4])
+            items.append(listing.Item(display_label, url, info=info, art=art_data))
+        listing.render(addon_handle, items, category=f"{show_title} - Sezóny", content='tvshows', sort="seasons", name='show_seasons')
+        # Nejčastěji se otevírá první nebo poslední sezóna
+        regular_seasons = [s.get("season_number") for s in tv_details.get("seasons", []) if s.get("season_number")]
+        prewarm_season_stills_async(api_key, tmdb_id, list(dict.fromkeys(regular_seasons[:1] + regular_seasons[-1:])))
 
     elif action == "show_episodes":
         tmdb_id = params.get("tmdb_id")
@@ -497,32 +1156,48 @@ def router(paramstring):
             xbmcgui.Dialog().notification(plugin_name, "Chyba: Chybí API klíč, ID seriálu nebo číslo sezóny.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
             return
-        season_details = tmdb_api_request(api_key, f"/tv/{tmdb_id}/season/{season_number}", {'language': UI_LANG, 'append_to_response': 'images'})
+        from concurrent.futures import ThreadPoolExecutor, TimeoutError
+        # Index dostupnosti na Webshare se staví souběžně s dotazem na TMDb, jen s vyplněným
+        # účtem (procházení TMDb se na přihlášení neptá) a bez chybových notifikací
+        index_future = None
+        if get_settings().ws_username and get_settings().ws_password:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kodicek-season")
+            index_future = executor.submit(get_season_index, ws, tmdb_id, show_title, int(season_number), notify_errors=False)
+            # Nestihne-li se index, doběhne na pozadí a uloží se do cache pro příští výpis
+            executor.shutdown(wait=False)
+        season_details = get_tmdb_entity(api_key, 'season', tmdb_id, season=int(season_number))
+        season_index = None
+        if index_future is not None:
+            try:
+                season_index = index_future.result(timeout=SEASON_INDEX_WAIT)
+            except TimeoutError:
+                log_verbose(f"Season index for '{show_title}' S{int(season_number):02d} not ready, listing episodes without source counts.")
+            except Exception as e:
+                xbmc.log(f"Kodíček: Season index for {tmdb_id} S{season_number} failed: {e}", level=xbmc.LOGWARNING)
         if not season_details or not season_details.get("episodes"):
             xbmcgui.Dialog().notification(plugin_name, "Nepodařilo se načíst informace o epizodách.", xbmcgui.NOTIFICATION_ERROR)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
             return
-        xbmcplugin.setPluginCategory(addon_handle, f"{show_title} - Sezóna {season_number} - Epizody")
-        xbmcplugin.setContent(addon_handle, 'episodes')
+        items = []
         for episode in season_details.get("episodes", []):
             episode_number = episode.get("episode_number")
             episode_name = episode.get("name") or f"Epizoda {episode_number}"
             display_label = f"E{episode_number:02d}: {episode_name}"
-            li = xbmcgui.ListItem(label=display_label)
+            source_count = len(episode_files(season_index, episode_number))
+            if season_index is not None:
+                # Počet zdrojů z indexu sezóny; epizody, které širší dotazy nenašly, jsou šedě
+                display_label = f"{display_label}  [COLOR lightgreen]{source_count}×[/COLOR]" if source_count else f"[COLOR gray]{display_label}[/COLOR]"
             art_data = {}
             still_path = episode.get('still_path')
-            if still_path: art_data['thumb'] = art_data['icon'] = f"https://image.tmdb.org/t/p/w300{still_path}"
+            if still_path: art_data['thumb'] = art_data['icon'] = art_url(still_path, 'still')
             else: 
                 season_poster = season_details.get('poster_path')
-                if season_poster: art_data['thumb'] = f"https://image.tmdb.org/t/p/w500{season_poster}"
-            li.setArt(art_data)
+                if season_poster: art_data['thumb'] = art_url(season_poster, 'thumb')
             info = {'title': episode_name, 'plot': episode.get('overview', ''), 'tvshowtitle': show_title, 'season': int(season_number), 'episode': episode_number, 'mediatype': 'episode', 'premiered': episode.get('air_date','')}
             if episode.get('vote_average'): info['rating'] = episode.get('vote_average')
-            li.setInfo('video', info)
-            li.setProperty('IsPlayable', 'false')
-            url = f"{BASE_URL_PLUGIN}?action=play_episode&tmdb_id={tmdb_id}&season_number={season_number}&episode_number={episode_number}&show_title={urllib.parse.quote(show_title, encoding='utf-8')}&episode_name_cs={urllib.parse.quote(episode.get('name', ''), encoding='utf-8')}&show_year={show_year}"
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=True)
-        xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+            url = plugin_url("play_episode", tmdb_id=tmdb_id, season_number=season_number, episode_number=episode_number, show_title=show_title, episode_name_cs=episode.get('name') or '', show_year=show_year)
+            items.append(listing.Item(display_label, url, info=info, art=art_data))
+        listing.render(addon_handle, items, category=f"{show_title} - Sezóna {season_number} - Epizody", content='episodes', sort="episodes", name='show_episodes')
 
     elif action == "play_episode":
         tmdb_id = params.get("tmdb_id")
@@ -543,69 +1218,62 @@ def router(paramstring):
             xbmcplugin.endOfDirectory(addon_handle, succeeded=False)
             return
         
-        episode_name_en = ""
-        api_key = get_tmdb_api_key()
-        if api_key:
-            ep_details_en = tmdb_api_request(api_key, f"/tv/{tmdb_id}/season/{season_num_int}/episode/{episode_num_int}", {'language': 'en-US'})
-            if ep_details_en and ep_details_en.get('name'):
-                episode_name_en = ep_details_en.get('name')
-        
-        episode_name_for_search = episode_name_cs if episode_name_cs else episode_name_en
-        
-        queries_to_try = build_episode_queries(show_title, season_num_int, episode_num_int, episode_name_for_search, show_year)
-        
-        webshare_files = []
-        for query in queries_to_try:
-            xbmc.log(f"Kodíček: Searching Webshare for episode with query: '{query}'", level=xbmc.LOGINFO)
-            current_results = search_webshare(token, query) 
-            filtered_results = filter_episode_results(current_results, show_title, season_num_int, episode_num_int)
-            xbmc.log(f"Kodíček: Webshare query '{query}' returned {len(current_results)} results, {len(filtered_results)} relevant.", level=xbmc.LOGINFO)
-            if filtered_results:
-                webshare_files = filtered_results
-                break 
+        webshare_files = resolve_episode_sources(ws, tmdb_id, show_title, season_num_int, episode_num_int, episode_name_cs, show_year)
         
         if not webshare_files:
             xbmcgui.Dialog().notification(plugin_name, f"Pro '{show_title} S{season_num_int:02d}E{episode_num_int:02d}' nebyly na Webshare nalezeny žádné relevantní soubory.", xbmcgui.NOTIFICATION_INFO)
             xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
             return
         
-        xbmcplugin.setPluginCategory(addon_handle, f"Webshare zdroje pro: {show_title} S{season_num_int:02d}E{episode_num_int:02d}")
-        xbmcplugin.setContent(addon_handle, 'videos')
-        for file_item in webshare_files:
-            li = xbmcgui.ListItem(label=file_item["name"])
-            size_bytes = file_item.get("size", 0)
-            size_str = f"{size_bytes/(1024*1024*1024):.2f} GB" if size_bytes > 1024*1024*1024 else f"{size_bytes/(1024*1024):.2f} MB" if size_bytes > 1024*1024 else f"{size_bytes/1024:.0f} KB" if size_bytes > 1024 else f"{size_bytes} B"
-            li.setInfo("video", {"title": file_item["name"], "size": size_bytes, "plot": f"Velikost: {size_str}"})
-            li.setProperty('IsPlayable', 'true')
-            url = f"{BASE_URL_PLUGIN}?action=play&ident={file_item['ident']}&name={urllib.parse.quote(file_item['name'], encoding='utf-8')}"
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-        xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+        # Epizodní klíče (EPISODE_KEYS) jdou do URL akce play, aby je historie znala
+        episode_params = {'tmdb_id': tmdb_id, 'season': season_num_int, 'episode': episode_num_int, 'show_title': show_title, 'show_year': show_year}
+        items = [source_item(file_item, **episode_params) for file_item in webshare_files]
+        listing.render(addon_handle, items, category=f"Webshare zdroje pro: {show_title} S{season_num_int:02d}E{episode_num_int:02d}", content='videos', sort="files", name='play_episode')
+        prefetch_best_source_async(ws, webshare_files)
+
+    elif action == "prefetch_next_episode":
+        # Spouští služba (RunPlugin) během přehrávání epizody – nic nevykresluje
+        prefetch_next_episode(ws, params)
 
     elif action == 'movies':
         movies(params)
     elif action == 'series':
         series(params)
     elif action == "search_test":
-        xbmc.log(f"Kodíček: Action 'search_test' entered. Params: {params}", level=xbmc.LOGINFO)
+        log_verbose(f"Action 'search_test' entered. Params: {params}")
         xbmcgui.Dialog().notification(plugin_name, "Testovací vyhledávání spuštěno!", xbmcgui.NOTIFICATION_INFO, 3000)
         search_term = xbmcgui.Dialog().input(f"{plugin_name} – Testovací vyhledávání", type=xbmcgui.INPUT_ALPHANUM)
         if search_term:
-            files = search_webshare(token, search_term)
-            if not files:
-                xbmcgui.Dialog().notification(plugin_name, f"Test: Nic pro '{search_term}'", xbmcgui.NOTIFICATION_INFO)
-            else:
-                xbmcplugin.setPluginCategory(addon_handle, f"Testovací výsledky pro: {search_term}")
-                xbmcplugin.setContent(addon_handle, 'videos')
-                for file_item in files:
-                    li = xbmcgui.ListItem(label=f"[TEST] {file_item['name']}")
-                    li.setInfo("video", {"title": file_item["name"]})
-                    li.setProperty('IsPlayable', 'true')
-                    url = f"{BASE_URL_PLUGIN}?action=play&ident={file_item['ident']}&name={urllib.parse.quote(file_item['name'], encoding='utf-8')}"
-                    xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-        xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+            display_webshare_results(ws, search_term, category=f"Testovací výsledky pro: {search_term}", label_prefix="[TEST] ")
+        else:
+            xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+    elif action == "ws_search":
+        query = params.get("what", "")
+        try:
+            offset = int(params.get("offset", 0))
+        except ValueError:
+            offset = 0
+        display_webshare_results(ws, query, offset=offset, category=f"Výsledky pro: {query}")
     else: # No action or unknown action - show main menu
         display_main_menu()
 
+def display_webshare_results(ws, query, offset=0, category=None, label_prefix=""):
+    """Vypíše jednu stránku výsledků z Webshare, na konci položku "Další strana" a další stránku přednačte."""
+    page = search_webshare_page(ws, query, offset)
+    files = page['files']
+    if not files:
+        xbmcgui.Dialog().notification(plugin_name, "Nic nebylo nalezeno na Webshare.", xbmcgui.NOTIFICATION_INFO)
+        xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+        return
+    items = [source_item(file_item, label=f"{label_prefix}{file_item['name']}") for file_item in files]
+    if has_next_page(page):
+        next_offset = offset + len(files)
+        page_number = next_offset // WS_SEARCH_PAGE_SIZE + 1
+        items.append(listing.next_page_item(f"Další strana ({page_number}) >>", plugin_url("ws_search", what=query, offset=next_offset)))
+    listing.render(addon_handle, items, category=category or f"Výsledky pro: {query}", content='videos', sort="files", name='webshare_results')
+    # Zatímco uživatel prochází tuto stránku, další se stáhne do cache
+    prefetch_next_page_async(ws, query, page)
+
 def build_episode_queries(show_title, season, episode, ep_title=None, year=None):
     """
     Vrátí seznam dotazů od nejpřísnějšího po nejvolnější pro vyhledávání epizod,
@@ -669,138 +1337,301 @@ def build_episode_queries(show_title, season, episode, ep_title=None, year=None)
     return final_queries
 
 def filter_episode_results(files, show_title, season, episode):
+    """Ponechá soubory s normalizovaným názvem seriálu a kódem epizody (S01E01, S1E1, 01x01, 1x1, S01.E01)."""
     norm_show = normalize_text(show_title)
-    # Patterns for SxxExx and xxXxx, with and without leading zeros
-    patterns = [
-        f"s{season:02d}e{episode:02d}", # s01e01
-        f"{season:02d}x{episode:02d}",   # 01x01
-        f"s{season}e{episode}",          # s1e1
-        f"{season}x{episode}",           # 1x1
-    ]
-    # Regex to match various season/episode patterns more flexibly
-    # This regex looks for S<season>E<episode> or <season>x<episode> with optional leading zeros
-    # It also allows for a space or dot or no separator between S/E and numbers
-    # Example: S01E01, S1E1, 01x01, 1x1, S01.E01, S01 E01
-    # The (?:...) is a non-capturing group.
-    # The \b ensures word boundaries to avoid partial matches like S1E10 matching S1E1.
-    regex_patterns = [
-        r'\bs0?%s\s?[e\.]0?%s\b' % (season, episode), # S01E01, S1E1, S01 E01, S01.E01
-        r'\b0?%s\s?x\s?0?%s\b' % (season, episode)    # 01x01, 1x1, 01 x 01
-    ]
-    combined_regex = re.compile('|'.join(regex_patterns), re.IGNORECASE)
-
     out = []
     for f_item in files:
-        fname_normalized = normalize_text(f_item['name'])
-        # Check for normalized show title
-        if norm_show not in fname_normalized:
-            continue
-        # Check for any of the episode code patterns using direct string search or regex
-        # Using regex for more flexibility with separators and optional leading zeros
-        if combined_regex.search(fname_normalized):
+        info = release_info(f_item)
+        if norm_show in info.normalized and info.has_episode(season, episode):
             out.append(f_item)
-            
     return out
 
-def process_tmdb_selection(params, token):
+def episode_sources_cache_key(tmdb_id, season, episode):
+    return f"ws_episode:{tmdb_id}:{season}:{episode}"
+
+def resolve_episode_sources(ws, tmdb_id, show_title, season, episode, episode_name_cs="", show_year="", notify_errors=True):
+    """Projde žebříček dotazů z build_episode_queries souběžně a vrátí relevantní soubory.
+
+    Pokud chybí český název epizody, anglický se dotahuje z TMDb souběžně s prvními
+    dotazy bez názvu epizody (ty jsou v žebříčku platné v každém případě).
+    Nalezené zdroje se pamatují v cache, takže přednačtená epizoda se už nehledá.
+    """
+    cache = get_response_cache()
+    cache_key = episode_sources_cache_key(tmdb_id, season, episode)
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        xbmc.log(f"Kodíček: Episode sources cache read failed for {cache_key}: {e}", level=xbmc.LOGWARNING)
+        cached = None
+    # Vedlejší hostery dostanou jeden dotaz "Seriál SxxEyy" a hledají souběžně s Webshare
+    hoster_search = start_hoster_search(f"{show_title} S{season:02d}E{episode:02d}", lambda files: filter_episode_results(files, show_title, season, episode))
+    if cached is not None and cached.fresh and cached.value:
+        cache.record('webshare', 'episode_hit')
+        return merge_episode_sources(cached.value, hoster_search)
+
+    # Index sezóny z pár širokých dotazů – když epizodu obsahuje, žebříček se vůbec nespouští
+    indexed_files = episode_files(get_season_index(ws, tmdb_id, show_title, season, notify_errors=notify_errors), episode)
+    if indexed_files:
+        log_verbose(f"{len(indexed_files)} sources for S{season:02d}E{episode:02d} found in the season index.")
+        return merge_episode_sources(indexed_files, hoster_search)
+
+    webshare_files = _resolve_episode_ladder(ws, tmdb_id, show_title, season, episode, episode_name_cs, show_year, notify_errors)
+    if webshare_files:
+        # V cache jsou jen soubory z Webshare; vedlejší hostery mají vlastní cache hledání
+        try:
+            cache.put(cache_key, webshare_files, WS_EPISODE_SOURCES_TTL, namespace='webshare')
+        except Exception as e:
+            xbmc.log(f"Kodíček: Episode sources cache write failed for {cache_key}: {e}", level=xbmc.LOGWARNING)
+    return merge_episode_sources(webshare_files, hoster_search)
+
+def merge_episode_sources(webshare_files, hoster_search):
+    """Zdroje epizody ze všech hosterů; když přispěl víc než jeden, seřadí se podle kvality vydání."""
+    return hosters.merge_sources([webshare_files] + hoster_search.collect(bool(webshare_files)), key=lambda f: release_quality(release_info(f)))
+
+def _resolve_episode_ladder(ws, tmdb_id, show_title, season, episode, episode_name_cs, show_year, notify_errors):
+    from concurrent.futures import ThreadPoolExecutor
+    max_workers = get_search_workers()
+
+    def run_query(query):
+        current_results = search_webshare(ws, query, notify_errors=notify_errors)
+        filtered_results = filter_episode_results(current_results, show_title, season, episode)
+        log_verbose(f"Webshare query '{query}' returned {len(current_results)} results, {len(filtered_results)} relevant.")
+        return filtered_results
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kodicek-episode")
+    try:
+        prestarted = {}
+        episode_name_for_search = episode_name_cs
+        api_key = get_tmdb_api_key() if not episode_name_cs else None
+        if api_key:
+            en_future = executor.submit(get_tmdb_episode, api_key, tmdb_id, season, episode, 'en-US')
+            for query in build_episode_queries(show_title, season, episode, None, show_year)[:max(1, max_workers - 1)]:
+                prestarted[query] = executor.submit(run_query, query)
+            ep_details_en = en_future.result()
+            if ep_details_en and ep_details_en.get('name'):
+                episode_name_for_search = ep_details_en.get('name')
+
+        queries_to_try = build_episode_queries(show_title, season, episode, episode_name_for_search, show_year)
+        index, webshare_files = resolve_ladder(queries_to_try, run_query, max_workers=max_workers, executor=executor, prestarted=prestarted)
+        if index is not None:
+            log_verbose(f"Episode sources found by query #{index + 1}/{len(queries_to_try)}: '{queries_to_try[index]}'")
+        return webshare_files or []
+    finally:
+        executor.shutdown(wait=False)
+
+def find_next_episode(api_key, tmdb_id, season, episode):
+    """Vrátí (sezóna, epizoda, název) epizody následující po season/episode, nebo None.
+
+    Po poslední epizodě sezóny přejde na první epizodu další sezóny; epizody,
+    které ještě nebyly odvysílány, se nepočítají.
+    """
+    today = time.strftime('%Y-%m-%d')
+    # Entity sdílené s show_episodes/show_seasons – po jejich procházení už bez sítě
+    season_details = get_tmdb_entity(api_key, 'season', tmdb_id, season=season)
+    candidates = [(season, ep) for ep in (season_details or {}).get('episodes', []) if (ep.get('episode_number') or 0) > episode]
+    if not candidates:
+        tv_details = get_tmdb_entity(api_key, 'show', tmdb_id)
+        later_seasons = sorted(s.get('season_number') for s in (tv_details or {}).get('seasons', [])
+                               if (s.get('season_number') or 0) > season and s.get('episode_count'))
+        if not later_seasons:
+            return None
+        next_season = later_seasons[0]
+        season_details = get_tmdb_entity(api_key, 'season', tmdb_id, season=next_season)
+        candidates = [(next_season, ep) for ep in (season_details or {}).get('episodes', [])]
+    if not candidates:
+        return None
+    next_season, next_ep = min(candidates, key=lambda c: c[1].get('episode_number') or 0)
+    air_date = next_ep.get('air_date')
+    if air_date and air_date > today:
+        return None
+    return next_season, next_ep.get('episode_number'), next_ep.get('name', '')
+
+def prefetch_next_episode(ws, params):
+    """Připraví zdroje a odkaz pro další epizodu, aby se spustila bez čekání na hledání."""
+    if not get_settings().ws_prefetch_next_episode:
+        return
+    api_key = get_settings().tmdb_api_key
+    tmdb_id = params.get('tmdb_id')
+    try:
+        season, episode = int(params.get('season')), int(params.get('episode'))
+    except (TypeError, ValueError):
+        return
+    if not api_key or not tmdb_id:
+        return
+    show_title = params.get('show_title', '')
+    next_episode = find_next_episode(api_key, tmdb_id, season, episode)
+    if not next_episode:
+        log_verbose(f"No aired episode after S{season:02d}E{episode:02d} of {tmdb_id}, nothing to prefetch.")
+        return
+    next_season, next_episode_number, next_name = next_episode
+    files = resolve_episode_sources(ws, tmdb_id, show_title, next_season, next_episode_number, next_name, params.get('show_year', ''), notify_errors=False)
+    log_verbose(f"Prefetched {len(files)} sources for {show_title} S{next_season:02d}E{next_episode_number:02d}.")
+    if not files:
+        return
+    best = files[0]
+    name = hosters.hoster_of(best)
+    if name != hosters.DEFAULT_HOSTER:
+        # Zdroj jiného hosteru (sloučené výsledky) se připraví přes něj, jako v prefetch_best_source_async
+        hoster = get_hoster(name, ws)
+        if hoster:
+            prepare_hoster_source(hoster, best['ident'])
+        return
+    try:
+        cached = get_response_cache().get(f"ws_link:{best['ident']}")
+    except Exception:
+        cached = None
+    if cached is None or not cached.fresh:
+        resolve_stream_link(ws, best['ident'], notify_errors=False)
+
+MIN_SCORE_THRESHOLD = 3.0
+LANGUAGE_SCORES = {'cz': 2.0, 'sk': 1.5, 'en': 0.5}
+RESOLUTION_SCORES = {'2160p': 2.0, '1080p': 1.5, '720p': 1.0}
+
+def release_quality(info):
+    """Část skóre podle jazyka, rozlišení a zdroje vydání (společná pro filmy i řazení zdrojů epizod)."""
+    score = LANGUAGE_SCORES.get(info.language, 0.0) + RESOLUTION_SCORES.get(info.resolution, 0.0)
+    if info.bad_source: score -= 3.0
+    return score
+
+def process_tmdb_selection(params, ws):
     tmdb_id = params.get('tmdb_id')
     media_type = params.get('media_type', 'movie') 
     title = params.get('title', '') 
     year = params.get('year', '')
-    xbmc.log(f"Kodíček: Processing TMDb MOVIE selection: ID={tmdb_id}, Title='{title}', Year='{year}'", level=xbmc.LOGINFO)
+    log_verbose(f"Processing TMDb MOVIE selection: ID={tmdb_id}, Title='{title}', Year='{year}'")
 
+    from concurrent.futures import ThreadPoolExecutor
     tmdb_api_key = get_tmdb_api_key()
-    detailed_tmdb_item = None
-    if tmdb_api_key and tmdb_id:
-        detailed_tmdb_item = get_tmdb_details(tmdb_api_key, tmdb_id, 'movie') 
-        if detailed_tmdb_item:
-            title = detailed_tmdb_item.get('title', title)
-            release_date = detailed_tmdb_item.get('release_date')
-            if release_date and len(release_date) >= 4: year = release_date[:4]
-    
-    tmdb_title_cleaned = strip_year(title)
-    normalized_tmdb_title = normalize_text(tmdb_title_cleaned)
-    tmdb_year_str = str(year) if year else ""
-    original_title_cleaned = strip_year(detailed_tmdb_item.get('original_title', '')) if detailed_tmdb_item else ''
+    merge_variants = get_settings().ws_merge_movie_variants
+
+    executor = ThreadPoolExecutor(max_workers=get_search_workers(), thread_name_prefix="kodicek-movie") if merge_variants else None
+    search_futures = {}
+    # Vedlejší hostery hledají název z výsledků TMDb souběžně s celým hledáním na Webshare
+    hoster_search = start_hoster_search(strip_year(title))
 
-    webshare_files = []
-    queries_tried = []
-    
     def try_ws_search(query):
-        if query in queries_tried: return [] 
-        queries_tried.append(query)
-        xbmc.log(f"Kodíček: Webshare Search for movie: Query='{query}'", level=xbmc.LOGINFO)
-        return search_webshare(token, query)
-
-    webshare_files = try_ws_search(tmdb_title_cleaned)
-    if not webshare_files and tmdb_year_str:
-        webshare_files = try_ws_search(f"{tmdb_title_cleaned} {tmdb_year_str}")
-    if not webshare_files and original_title_cleaned and original_title_cleaned.lower() != tmdb_title_cleaned.lower():
-        webshare_files = try_ws_search(original_title_cleaned)
-    if not webshare_files and original_title_cleaned and original_title_cleaned.lower() != tmdb_title_cleaned.lower() and tmdb_year_str:
-        webshare_files = try_ws_search(f"{original_title_cleaned} {tmdb_year_str}")
+        log_verbose(f"Webshare Search for movie: Query='{query}'")
+        return search_webshare(ws, query)
+
+    def submit_ws_search(query):
+        if query and query not in search_futures:
+            search_futures[query] = executor.submit(try_ws_search, query)
+
+    try:
+        detailed_tmdb_item = None
+        if tmdb_api_key and tmdb_id:
+            if merge_variants:
+                # Detaily z TMDb se stahují souběžně s prvním dotazem na Webshare (název z výsledků hledání)
+                details_future = executor.submit(get_tmdb_details, tmdb_api_key, tmdb_id, 'movie')
+                submit_ws_search(strip_year(title))
+                detailed_tmdb_item = details_future.result()
+            else:
+                detailed_tmdb_item = get_tmdb_details(tmdb_api_key, tmdb_id, 'movie') 
+            if detailed_tmdb_item:
+                title = detailed_tmdb_item.get('title', title)
+                release_date = detailed_tmdb_item.get('release_date')
+                if release_date and len(release_date) >= 4: year = release_date[:4]
+        
+        tmdb_title_cleaned = strip_year(title)
+        normalized_tmdb_title = normalize_text(tmdb_title_cleaned)
+        tmdb_year_str = str(year) if year else ""
+        original_title_cleaned = strip_year(detailed_tmdb_item.get('original_title', '')) if detailed_tmdb_item else ''
+
+        query_variants = [tmdb_title_cleaned]
+        if tmdb_year_str:
+            query_variants.append(f"{tmdb_title_cleaned} {tmdb_year_str}")
+        if original_title_cleaned and original_title_cleaned.lower() != tmdb_title_cleaned.lower():
+            query_variants.append(original_title_cleaned)
+            if tmdb_year_str:
+                query_variants.append(f"{original_title_cleaned} {tmdb_year_str}")
 
+        webshare_files = []
+        if merge_variants:
+            # Všechny varianty souběžně, výsledky se sloučí (bez duplicit podle ident) ještě před skórováním
+            for query in query_variants:
+                submit_ws_search(query)
+            seen_idents = set()
+            for query in query_variants:
+                for ws_file in search_futures[query].result():
+                    if ws_file['ident'] not in seen_idents:
+                        seen_idents.add(ws_file['ident'])
+                        webshare_files.append(ws_file)
+            log_verbose(f"Merged {len(webshare_files)} unique Webshare files from {len(query_variants)} query variants.")
+        else:
+            for query in query_variants:
+                webshare_files = try_ws_search(query)
+                if webshare_files:
+                    break
+    finally:
+        if executor:
+            for future in search_futures.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    # Skórování seřadí sloučené zdroje; při shodě skóre zůstává Webshare napřed
+    webshare_files = hosters.merge_sources([webshare_files] + hoster_search.collect(bool(webshare_files)))
     if not webshare_files:
         xbmcgui.Dialog().notification(plugin_name, f"Pro '{title}' nebyly na Webshare nalezeny žádné soubory.", xbmcgui.NOTIFICATION_INFO)
         xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
         return
 
     scored_files = []
-    MIN_SCORE_THRESHOLD = 3.0
+    tmdb_year_int = int(tmdb_year_str) if tmdb_year_str.isdigit() else None
+    score_span = metrics.span('score', 'movie_sources', files=len(webshare_files))
     for ws_file in webshare_files:
-        fname_normalized = normalize_text(ws_file.get('name', ''))
+        info = release_info(ws_file)
         score = 0.0
-        if normalized_tmdb_title not in fname_normalized:
+        if normalized_tmdb_title not in info.normalized:
             score = -100
         else:
             score += 3.0
         if score > -10:
-            if tmdb_year_str:
-                match = re.search(r'(19|20)\d{2}', fname_normalized)
-                if match and abs(int(match.group()) - int(tmdb_year_str)) <= 1: score += 2.0
+            if tmdb_year_int:
+                if info.year and abs(info.year - tmdb_year_int) <= 1: score += 2.0
                 else: score -= 1.0
-            if any(tag in fname_normalized for tag in ['.cz', '.cze', '.cesky']): score += 2.0
-            elif any(tag in fname_normalized for tag in ['.sk', '.svk', '.slovensky']): score += 1.5
-            elif any(tag in fname_normalized for tag in ['.en', '.eng', '.english']): score += 0.5
-            if '2160p' in fname_normalized or '4k' in fname_normalized: score += 2.0
-            elif '1080p' in fname_normalized: score += 1.5
-            elif '720p' in fname_normalized: score += 1.0
-            if any(bad in fname_normalized for bad in ['.cam.', '.ts.', '.tc.']): score -= 3.0
-        if not any(ws_file.get('name', '').lower().endswith(ext) for ext in ['.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.ts']):
+            score += release_quality(info)
+        if not info.is_video:
             score = -200
         if score >= MIN_SCORE_THRESHOLD:
-            scored_files.append({'file': ws_file, 'score': score, 'normalized_name': fname_normalized})
+            scored_files.append({'file': ws_file, 'score': score, 'normalized_name': info.normalized})
 
     scored_files.sort(key=lambda x: x['score'], reverse=True)
+    score_span.end(relevant=len(scored_files))
     if not scored_files:
         xbmcgui.Dialog().notification(plugin_name, f"Pro '{title} ({year})': žádné relevantní soubory na Webshare.", xbmcgui.NOTIFICATION_INFO)
         xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
         return
 
-    xbmcplugin.setPluginCategory(addon_handle, f"Webshare zdroje pro: {title} ({year})")
-    xbmcplugin.setContent(addon_handle, 'videos')
+    art_data = None
+    if detailed_tmdb_item:
+        # Plakát, fanart i žánry jsou pro všechny zdroje stejné
+        art_data = {}
+        poster = detailed_tmdb_item.get('poster_path')
+        fanart = detailed_tmdb_item.get('backdrop_path')
+        if poster: art_data['thumb'] = art_data['poster'] = art_url(poster, 'thumb')
+        if fanart: art_data['fanart'] = art_url(fanart, 'fanart')
+        genres = ", ".join([g['name'] for g in detailed_tmdb_item.get('genres', [])])
+    items = []
     for scored_item in scored_files:
         file_item = scored_item['file']
         display_label = f"[S: {scored_item['score']:.1f}] {file_item['name']}"
-        li = xbmcgui.ListItem(label=display_label)
         size_bytes = file_item.get("size", 0)
-        size_str = f"{size_bytes/(1024*1024*1024):.2f} GB" if size_bytes > 1024*1024*1024 else f"{size_bytes/(1024*1024):.2f} MB" if size_bytes > 1024*1024 else f"{size_bytes/1024:.0f} KB" if size_bytes > 1024 else f"{size_bytes} B"
-        plot_info = f"Velikost: {size_str}\nNormalizovaný název: {scored_item['normalized_name']}"
-        art_data = {}
+        plot_info = f"Velikost: {listing.format_size(size_bytes)}\nNormalizovaný název: {scored_item['normalized_name']}"
+        info_labels = None
         if detailed_tmdb_item:
-            info_labels = {'title': detailed_tmdb_item.get('title', file_item['name']), 'plot': detailed_tmdb_item.get('overview', plot_info), 'year': int(year) if year and year.isdigit() else None, 'genre': ", ".join([g['name'] for g in detailed_tmdb_item.get('genres', [])]), 'rating': detailed_tmdb_item.get('vote_average'), 'mediatype': 'movie', 'size': size_bytes}
-            poster = detailed_tmdb_item.get('poster_path')
-            fanart = detailed_tmdb_item.get('backdrop_path')
-            if poster: art_data['thumb'] = art_data['poster'] = f"https://image.tmdb.org/t/p/w500{poster}"
-            if fanart: art_data['fanart'] = f"https://image.tmdb.org/t/p/original{fanart}"
-            li.setArt(art_data)
-            li.setInfo('video', info_labels)
-        else:
-            li.setInfo("video", {"title": file_item["name"], "size": size_bytes, "plot": plot_info})
-        li.setProperty('IsPlayable', 'true')
-        url = f"{BASE_URL_PLUGIN}?action=play&ident={file_item['ident']}&name={urllib.parse.quote(file_item['name'], encoding='utf-8')}"
-        xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-    xbmcplugin.endOfDirectory(addon_handle, succeeded=True)
+            info_labels = {'title': detailed_tmdb_item.get('title', file_item['name']), 'plot': detailed_tmdb_item.get('overview', plot_info), 'year': int(year) if year and year.isdigit() else None, 'genre': genres, 'rating': detailed_tmdb_item.get('vote_average'), 'mediatype': 'movie', 'size': size_bytes}
+        items.append(source_item(file_item, label=display_label, info=info_labels, art=art_data, plot=plot_info))
+    listing.render(addon_handle, items, category=f"Webshare zdroje pro: {title} ({year})", content='videos', sort="files", name='movie_sources')
+    prefetch_best_source_async(ws, [scored_item['file'] for scored_item in scored_files])
+
+def show_cache_stats():
+    from resources.lib.cache import format_stats
+    try:
+        text = format_stats(get_response_cache().stats())
+    except Exception as e:
+        xbmc.log(f"Kodíček: Failed to read cache stats: {e}", level=xbmc.LOGERROR)
+        text = f"Statistiky cache nejsou dostupné: {e}"
+    xbmcgui.Dialog().textviewer(f"{plugin_name} – Statistiky cache", text)
 
 def movies(params):
     xbmcgui.Dialog().notification(plugin_name, "Zde bude seznam filmů.", xbmcgui.NOTIFICATION_INFO, 2500)
@@ -810,60 +1641,54 @@ def series(params):
     xbmcgui.Dialog().notification(plugin_name, "Zde bude seznam seriálů.", xbmcgui.NOTIFICATION_INFO, 2500)
     xbmcplugin.endOfDirectory(addon_handle)
 
-def display_combined_history():
-    xbmcplugin.setPluginCategory(addon_handle, "Historie")
-    li_search_history_folder = xbmcgui.ListItem(label="Historie vyhledávání")
-    li_search_history_folder.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=search", listitem=li_search_history_folder, isFolder=True)
-    history_items = load_history()
+def history_list_items(history_items):
+    items = []
+    for item in history_items:
+        if not item.get("ident") or not item.get("name") or item.get("type") != "video": continue
+        timestamp_str = time.strftime('%d.%m.%Y %H:%M', time.localtime(item['timestamp']))
+        items.append(source_item(item, info={"title": item["name"], "plot": f"Naposledy přehráno: {timestamp_str}"}))
+    return items
+
+def history_next_page(offset, page_len, action):
+    next_offset = offset + page_len
+    if page_len >= HISTORY_PAGE_SIZE and next_offset < count_history():
+        return [listing.next_page_item(f"Další strana ({next_offset // HISTORY_PAGE_SIZE + 1}) >>", plugin_url(action, offset=next_offset))]
+    return []
+
+def display_combined_history(offset=0):
+    items = []
+    if not offset:
+        items.append(listing.Item("Historie vyhledávání", plugin_url("search"), art={'icon': 'DefaultAddonsSearch.png'}))
+    history_items = load_history(limit=HISTORY_PAGE_SIZE, offset=offset)
     if history_items:
-        for item in history_items:
-            if not item.get("ident") or not item.get("name") or item.get("type") != "video": continue
-            li = xbmcgui.ListItem(label=item["name"])
-            timestamp_str = time.strftime('%d.%m.%Y %H:%M', time.localtime(item['timestamp']))
-            li.setInfo("video", {"title": item["name"], "plot": f"Naposledy přehráno: {timestamp_str}"})
-            li.setProperty('IsPlayable', 'true')
-            url = f"{BASE_URL_PLUGIN}?action=play&ident={item['ident']}&name={urllib.parse.quote(item['name'], encoding='utf-8')}"
-            xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=False)
-    xbmcplugin.endOfDirectory(addon_handle)
+        items += history_list_items(history_items) + history_next_page(offset, len(history_items), "show_combined_history")
+    listing.render(addon_handle, items, category="Historie", sort="history", name='combined_history')
 
-def display_main_menu():
-    li_new_search = xbmcgui.ListItem(label="Vyhledat film/seriál")
-    li_new_search.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=search&ask=1", listitem=li_new_search, isFolder=True)
-    
-    listitem_movies = xbmcgui.ListItem(label="Filmy")
-    listitem_movies.setArt({'icon': 'DefaultMovies.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=movies", listitem=listitem_movies, isFolder=True)
+MAIN_MENU = (
+    ("Vyhledat film/seriál", {'action': 'search', 'ask': 1}, 'DefaultAddonsSearch.png'),
+    ("Filmy", {'action': 'movies'}, 'DefaultMovies.png'),
+    ("Seriály", {'action': 'series'}, 'DefaultTVShows.png'),
+    ("Historie", {'action': 'show_combined_history'}, 'DefaultFolder.png'),
+    ("Vyhledávání - test", {'action': 'search_test'}, 'DefaultAddonsSearch.png'),
+)
 
-    listitem_series = xbmcgui.ListItem(label="Seriály")
-    listitem_series.setArt({'icon': 'DefaultTVShows.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=series", listitem=listitem_series, isFolder=True)
-
-    li_history_folder = xbmcgui.ListItem(label="Historie")
-    li_history_folder.setArt({'icon': 'DefaultFolder.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=show_combined_history", listitem=li_history_folder, isFolder=True)
-
-    li_search_test = xbmcgui.ListItem(label="Vyhledávání - test")
-    li_search_test.setArt({'icon': 'DefaultAddonsSearch.png'})
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=f"{BASE_URL_PLUGIN}?action=search_test", listitem=li_search_test, isFolder=True)
-    
-    xbmcplugin.endOfDirectory(addon_handle)
+def display_main_menu():
+    items = [listing.Item(label, plugin_url(**params), art={'icon': icon}) for label, params, icon in MAIN_MENU]
+    listing.render(addon_handle, items, name='main_menu')
 
-def add_dir(label, url, is_folder, icon=None, fanart=None, info=None, properties=None):
-    li = xbmcgui.ListItem(label=label)
-    art = {}
-    if icon: art['icon'] = art['thumb'] = icon
-    if fanart: art['fanart'] = fanart
-    if art: li.setArt(art)
-    if info: li.setInfo('video', info) # Assumes video info
-    if properties:
-        for key, value in properties.items():
-            li.setProperty(key, value)
-    xbmcplugin.addDirectoryItem(handle=addon_handle, url=url, listitem=li, isFolder=is_folder)
+def run(args):
+    """Spustí akci routeru a změří ji; spany se na konci zapíšou do metrics.jsonl v profilu."""
+    action = dict(urllib.parse.parse_qsl(args)).get('action') or 'main_menu'
+    try:
+        with metrics.span('action', action):
+            router(args)
+    finally:
+        if get_settings().metrics_enabled:
+            ensure_profile_dir()
+            metrics.flush(profile_path(metrics.METRICS_FILE))
 
 if __name__ == "__main__":
     args = sys.argv[2]
     if args.startswith('?'):
         args = args[1:]
-    router(args)
+    run(args)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Velikosti obrázků z TMDb a lokální cache pro přednačtené obrázky.
+
+Výpisy dřív braly plakáty ve `w500` a fanart v `original` (několik MB na
+položku). Na pomalé lince pak skin při každém řádku čekal na obrázek.
+Velikost se proto volí podle místa použití (`ArtPolicy`): náhledy ve
+výpisu, fanart, fotky epizod. Výchozí hodnoty odpovídají tomu, co skin
+(Estuary, 1080p) opravdu zobrazí.
+
+`ArtworkCache` stáhne obrázky pro pravděpodobné další výpisy na pozadí do
+složky `artwork` v profilu doplňku. Výpis pak pro již stažený obrázek
+předá Kodi lokální cestu místo URL.
+"""
+import os
+from collections import namedtuple
+
+import xbmc
+
+TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/"
+
+THUMB_SIZES = ("w185", "w342", "w500", "original")
+FANART_SIZES = ("w780", "w1280", "original")
+STILL_SIZES = ("w185", "w300", "original")
+
+ArtPolicy = namedtuple("ArtPolicy", ("thumb", "fanart", "still"))
+DEFAULT_POLICY = ArtPolicy(thumb="w342", fanart="w1280", still="w300")
+
+ARTWORK_DIR = "artwork"
+ARTWORK_MAX_FILES = 400
+PREWARM_TIMEOUT = 15
+
+
+def load_policy(settings):
+    """Politika velikostí z nastavení; neznámé hodnoty nahradí výchozí."""
+    def pick(value, allowed, default):
+        return value if value in allowed else default
+    return ArtPolicy(
+        thumb=pick(settings.art_thumb_size, THUMB_SIZES, DEFAULT_POLICY.thumb),
+        fanart=pick(settings.art_fanart_size, FANART_SIZES, DEFAULT_POLICY.fanart),
+        still=pick(settings.art_still_size, STILL_SIZES, DEFAULT_POLICY.still),
+    )
+
+
+def image_url(path, size):
+    if not path:
+        return None
+    return f"{TMDB_IMAGE_BASE_URL}{size}{path}"
+
+
+class ArtworkCache(object):
+    """Obrázky uložené v profilu pod hashem URL (adresář se zakládá až při zápisu)."""
+
+    def __init__(self, directory, max_files=ARTWORK_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def local_path(self, url):
+        import hashlib
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        ext = os.path.splitext(url)[1].lower()
+        return os.path.join(self.directory, name + (ext if ext in (".jpg", ".png") else ".jpg"))
+
+    def resolve(self, url):
+        """Lokální cesta, pokud je obrázek přednačtený, jinak původní URL."""
+        if not url:
+            return url
+        path = self.local_path(url)
+        return path if os.path.exists(path) else url
+
+    def prewarm(self, session, urls):
+        """Stáhne chybějící obrázky (postupně, aby nezahltil linku); vrací počet stažených."""
+        fetched = 0
+        for url in dict.fromkeys(u for u in urls if u):
+            path = self.local_path(url)
+            if os.path.exists(path):
+                continue
+            try:
+                response = session.get(url, timeout=PREWARM_TIMEOUT)
+                response.raise_for_status()
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(response.content)
+                os.replace(tmp_path, path)
+                fetched += 1
+            except Exception as e:
+                xbmc.log(f"Kodíček: Artwork prewarm failed for {url}: {e}", level=xbmc.LOGDEBUG)
+        if fetched:
+            self.prune()
+        return fetched
+
+    def prune(self):
+        """Drží nejvýš max_files nejnovějších obrázků."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file()]
+        except OSError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
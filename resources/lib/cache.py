@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""Perzistentní cache odpovědí pro Kodíček.
+
+Kodi spouští plugin pro každou navigaci znovu, takže paměťová cache nepřežije
+ani krok zpět. Tato cache proto drží odpovědi v SQLite databázi v profilu
+doplňku:
+
+    * každý záznam má vlastní TTL (expires_at),
+    * při překročení bajtového limitu se mažou nejdéle nepoužité záznamy (LRU);
+      čas posledního použití se kvůli tomu zapisuje s přesností ACCESS_RESOLUTION
+      a velikost cache se průběžně odhaduje, přesně se sčítá až nad limitem,
+    * u prošlých záznamů se uchovává ETag / Last-Modified, aby volající mohl
+      provést podmíněnou revalidaci (304 Not Modified),
+    * počítají se hity a missy pro zobrazení statistik v nastavení.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from resources.lib import metrics
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+# Čtení obnoví accessed_at, jen je-li starší – LRU nepotřebuje přesnost na sekundy
+ACCESS_RESOLUTION = 60
+
+
+class CacheEntry(object):
+    __slots__ = ("value", "stored_at", "expires_at", "etag", "last_modified")
+
+    def __init__(self, value, stored_at, expires_at, etag=None, last_modified=None):
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    @property
+    def age(self):
+        return time.time() - self.stored_at
+
+
+class ResponseCache(object):
+    """Key-value cache nad SQLite s TTL, LRU a statistikami."""
+
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._budget_lock = threading.Lock()
+        # Odhad velikosti záznamů (přepsání klíče se započte znovu, odhad tedy spíš přestřelí)
+        self._estimated_bytes = None
+
+    # ------------------------------------------------------------------
+    # Připojení
+    # ------------------------------------------------------------------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL DEFAULT '',
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT
+                );
+                CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed_at);
+                CREATE INDEX IF NOT EXISTS entries_namespace ON entries(namespace);
+                CREATE TABLE IF NOT EXISTS stats (
+                    namespace TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    value INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (namespace, name)
+                );
+                """
+            )
+            self._schema_ready = True
+
+    # ------------------------------------------------------------------
+    # Veřejné rozhraní
+    # ------------------------------------------------------------------
+    def get(self, key):
+        """Vrátí CacheEntry (i prošlý – rozhoduje volající) nebo None."""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT body, stored_at, expires_at, etag, last_modified, accessed_at FROM entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            value = json.loads(row[0])
+        except ValueError:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        now = time.time()
+        if now - row[5] >= ACCESS_RESOLUTION:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return CacheEntry(value, row[1], row[2], row[3], row[4])
+
+    def put(self, key, value, ttl, namespace="", etag=None, last_modified=None):
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, namespace, body, size, stored_at, expires_at, accessed_at, etag, last_modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, namespace, body, len(body), now, now + ttl, now, etag, last_modified),
+        )
+        with self._budget_lock:
+            if self._estimated_bytes is None:
+                self._estimated_bytes = self.total_bytes()
+            else:
+                self._estimated_bytes += len(body)
+            if self._estimated_bytes > self.max_bytes:
+                self._enforce_budget(conn)
+
+    def refresh(self, key, ttl):
+        """Prodlouží platnost záznamu po úspěšné revalidaci (HTTP 304)."""
+        now = time.time()
+        self._conn().execute(
+            "UPDATE entries SET expires_at = ?, accessed_at = ? WHERE key = ?",
+            (now + ttl, now, key),
+        )
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def clear(self, namespace=None):
+        conn = self._conn()
+        if namespace is None:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
+            with self._budget_lock:
+                self._estimated_bytes = 0
+        else:
+            conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            conn.execute("DELETE FROM stats WHERE namespace = ?", (namespace,))
+        conn.execute("VACUUM")
+
+    def record(self, namespace, name, amount=1):
+        """Zvýší čítač statistiky (hit, miss, revalidated, …).
+
+        Statistiky jsou jen informativní, chyba zápisu se proto ignoruje.
+        """
+        metrics.incr(f"cache.{namespace}.{name}", amount)
+        try:
+            self._conn().execute(
+                "INSERT INTO stats (namespace, name, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(namespace, name) DO UPDATE SET value = value + excluded.value",
+                (namespace, name, amount),
+            )
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """Vrátí {namespace: {'entries', 'bytes', 'hit', 'miss', ...}}."""
+        conn = self._conn()
+        result = {}
+        for namespace, count, size in conn.execute(
+            "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+        ):
+            result.setdefault(namespace, {}).update({"entries": count, "bytes": size})
+        for namespace, name, value in conn.execute("SELECT namespace, name, value FROM stats"):
+            result.setdefault(namespace, {})[name] = value
+        return result
+
+    def total_bytes(self):
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Interní
+    # ------------------------------------------------------------------
+    def _enforce_budget(self, conn):
+        """Přesně sečte velikost a uvolní místo; volá se pod _budget_lock, až když odhad přesáhne limit."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._estimated_bytes = total
+        if total <= self.max_bytes:
+            return
+        # Uvolníme o něco víc než je nutné, ať se úklid nespouští po každém zápisu.
+        target = int(self.max_bytes * 0.9)
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+        self._estimated_bytes = total
+
+
+def format_stats(stats):
+    """Převede výstup ResponseCache.stats() na čitelný text pro dialog."""
+    lines = []
+    total_bytes = 0
+    for namespace in sorted(stats):
+        data = stats[namespace]
+        hits = data.get("hit", 0)
+        misses = data.get("miss", 0)
+        requests_total = hits + misses
+        hit_rate = (100.0 * hits / requests_total) if requests_total else 0.0
+        size = data.get("bytes", 0)
+        total_bytes += size
+        line = f"[B]{namespace or 'ostatní'}[/B]: {data.get('entries', 0)} záznamů, {size / 1024.0:.0f} KB, úspěšnost {hit_rate:.0f} % ({hits}/{requests_total})"
+        if data.get("revalidated"):
+            line += f", revalidováno {data['revalidated']}"
+        lines.append(line)
+    lines.append(f"Celkem: {total_bytes / (1024.0 * 1024.0):.2f} MB")
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Kompaktní úložiště TMDb entit (filmy, seriály, sezóny, epizody).
+
+Stejný seriál se dřív stahoval pořád znovu v různých tvarech: `/tv/{id}`
+pro výpis sezón, `/tv/{id}/season/{n}` pro epizody, `/tv/.../episode/{m}`
+v angličtině pro hledání na Webshare. Každá odpověď se navíc cachovala
+celá, i s obsazením, štáby a obrázky, které plugin nepoužívá.
+
+Tady se z každé odpovědi entity-endpointu ponechají jen pole, která výpisy
+opravdu čtou, a uloží se pod klíčem (druh, tmdb_id, [sezóna], jazyk) do
+stejné `cache.db` (jmenný prostor `entities`). Plní se z jakéhokoli
+požadavku na TMDb a čtou z něj všechny výpisy. Epizody jsou uložené uvnitř
+entity sezóny – jedna sezóna v angličtině tak obslouží všechny její epizody.
+"""
+import re
+import time
+
+MOVIE_FIELDS = ("id", "title", "original_title", "overview", "release_date", "poster_path", "backdrop_path", "vote_average")
+SHOW_FIELDS = ("id", "name", "original_name", "overview", "first_air_date", "poster_path", "backdrop_path", "vote_average")
+SHOW_SEASON_FIELDS = ("season_number", "name", "overview", "episode_count", "poster_path", "air_date")
+SEASON_FIELDS = ("id", "season_number", "name", "overview", "poster_path", "air_date")
+EPISODE_FIELDS = ("episode_number", "name", "overview", "still_path", "air_date", "vote_average")
+
+ENTITY_ENDPOINTS = (
+    (re.compile(r"^movie/(\d+)$"), "movie"),
+    (re.compile(r"^tv/(\d+)$"), "show"),
+    (re.compile(r"^tv/(\d+)/season/(\d+)$"), "season"),
+    (re.compile(r"^tv/(\d+)/season/(\d+)/episode/(\d+)$"), "episode"),
+)
+
+
+def _pick(data, fields):
+    return {field: data[field] for field in fields if data.get(field) not in (None, "")}
+
+
+def project(kind, data):
+    """Zmenší odpověď TMDb na pole, která plugin používá."""
+    if kind == "movie":
+        entity = _pick(data, MOVIE_FIELDS)
+        entity["genres"] = [{"name": g["name"]} for g in data.get("genres") or [] if g.get("name")]
+    elif kind == "show":
+        entity = _pick(data, SHOW_FIELDS)
+        entity["seasons"] = [_pick(s, SHOW_SEASON_FIELDS) for s in data.get("seasons") or []]
+    elif kind == "season":
+        entity = _pick(data, SEASON_FIELDS)
+        entity["episodes"] = [_pick(e, EPISODE_FIELDS) for e in data.get("episodes") or []]
+    else:
+        entity = _pick(data, EPISODE_FIELDS)
+    return entity
+
+
+def parse_endpoint(endpoint):
+    """Vrátí (druh, (id, ...)) pro entity-endpoint, jinak (None, None)."""
+    endpoint = endpoint.lstrip("/")
+    for pattern, kind in ENTITY_ENDPOINTS:
+        match = pattern.match(endpoint)
+        if match:
+            return kind, match.groups()
+    return None, None
+
+
+def find_episode(season_entity, episode):
+    for item in (season_entity or {}).get("episodes", []):
+        if item.get("episode_number") == episode:
+            return item
+    return None
+
+
+class EntityStore(object):
+    """Entity nad ResponseCache; hodnota záznamu je kompaktní slovník entity."""
+
+    NAMESPACE = "entities"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    @staticmethod
+    def key(kind, tmdb_id, language, season=None):
+        if season is None:
+            return f"entity:{kind}:{tmdb_id}:{language}"
+        return f"entity:{kind}:{tmdb_id}:{season}:{language}"
+
+    def get(self, kind, tmdb_id, language, season=None):
+        return self.cache.get(self.key(kind, tmdb_id, language, season))
+
+    def put(self, kind, tmdb_id, language, entity, ttl, season=None):
+        self.cache.put(self.key(kind, tmdb_id, language, season), entity, ttl, namespace=self.NAMESPACE)
+
+    def ingest(self, endpoint, language, data, ttl):
+        """Uloží kompaktní podobu odpovědi; jiné než entity-endpointy ignoruje."""
+        kind, ids = parse_endpoint(endpoint)
+        if kind is None or not isinstance(data, dict):
+            return None
+        entity = project(kind, data)
+        if kind == "episode":
+            self._merge_episode(ids, language, entity, ttl)
+        else:
+            self.put(kind, ids[0], language, entity, ttl, season=ids[1] if kind == "season" else None)
+        return entity
+
+    def _merge_episode(self, ids, language, entity, ttl):
+        # Samostatná epizoda se doplní do entity sezóny; neúplná sezóna je označená "partial"
+        tmdb_id, season, _ = ids
+        entry = self.get("season", tmdb_id, language, season)
+        if entry is not None:
+            season_entity = dict(entry.value)
+            # Sezóně neprodlužujeme čerstvost jen kvůli jedné epizodě
+            ttl = max(0, entry.expires_at - time.time())
+        else:
+            season_entity = {"season_number": int(season), "episodes": [], "partial": True}
+        episodes = [e for e in season_entity.get("episodes", []) if e.get("episode_number") != entity.get("episode_number")]
+        episodes.append(entity)
+        episodes.sort(key=lambda e: e.get("episode_number") or 0)
+        season_entity["episodes"] = episodes
+        self.put("season", tmdb_id, language, season_entity, ttl, season=season)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Hostery souborů a federované hledání napříč nimi.
+
+Hoster (Webshare, Sdilej.cz) má dvě operace: `search(query)` vrací
+nalezené soubory jako jednotné záznamy zdrojů a `get_stream(ident)` vrací
+přímé URL pro přehrání. Hoster s čekací dobou (free tickety) ji může
+rozběhnout dopředu v `prepare(ident)`. Záznam zdroje je slovník ve tvaru výsledků
+Webshare – `ident`, `name`, `size` – doplněný o `hoster`; záznamy bez
+klíče `hoster` (Webshare z cache, starší historie) patří Webshare.
+
+Webshare je primární hoster: jeho hledání (žebříček dotazů, index
+sezóny) běží v plugin vlákně jako dřív. Vedlejší hostery hledají
+souběžně na pozadí (`FederatedSearch`), každý nejdéle do svého
+`deadline`. Jakmile má primární hoster výsledky, na vedlejší se čeká
+nanejvýš `FEDERATED_GRACE` sekund – pomalý hoster tak výpis nezdrží.
+Co nestihne, doběhne na pozadí a uloží se do cache pro příští výpis.
+"""
+import time
+
+import xbmc
+
+from resources.lib import metrics
+
+DEFAULT_HOSTER = "webshare"
+# Jak dlouho se po nalezení zdrojů na primárním hosteru ještě čeká na vedlejší
+FEDERATED_GRACE = 0.25
+HOSTER_DEADLINE = 6.0
+# Timeout (spojení, čtení) pro prepare() na pozadí – vlákno nesmí držet proces pluginu dlouho
+PREPARE_TIMEOUT = (3.05, 5)
+
+
+def make_source(hoster, ident, name, size=0, url=None):
+    """Jednotný záznam zdroje (stejné klíče jako soubor z Webshare + hoster)."""
+    source = {"hoster": hoster, "ident": str(ident), "name": name, "size": int(size or 0)}
+    if url:
+        source["url"] = url
+    return source
+
+
+def hoster_of(source):
+    return source.get("hoster") or DEFAULT_HOSTER
+
+
+class BaseHoster(object):
+    """Společné rozhraní hosterů; `name` se ukládá do záznamů zdrojů a do URL akce play."""
+
+    name = None
+    label = None
+    primary = False
+    deadline = HOSTER_DEADLINE
+
+    def search(self, query):
+        """Seznam záznamů zdrojů (make_source) pro dotaz."""
+        raise NotImplementedError
+
+    def get_stream(self, ident, wait=None):
+        """Přímé URL k souboru, nebo None; wait(sekundy) -> bool obslouží případné čekání (False = zrušeno)."""
+        raise NotImplementedError
+
+    def prepare(self, ident, timeout=None):
+        """Volitelně připraví odkaz dopředu (např. vyzvedne ticket), zatímco uživatel vybírá; timeout jako u requests."""
+        return None
+
+    def stream_headers(self):
+        """Hlavičky, které má Kodi poslat při přehrávání (připojí se za URL přes '|')."""
+        return {}
+
+
+class FederatedSearch(object):
+    """Hledání na vedlejších hosterech spuštěné na pozadí; výsledky vyzvedne `collect()`.
+
+    jobs -- [(hoster, funkce bez argumentů vracející záznamy zdrojů)]
+    """
+
+    def __init__(self, jobs, grace=FEDERATED_GRACE):
+        self.grace = grace
+        self.started = time.monotonic()
+        self._futures = []
+        jobs = list(jobs)
+        if jobs:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="kodicek-hoster")
+            self._futures = [(hoster, executor.submit(self._run, hoster, job)) for hoster, job in jobs]
+            # Rozběhnuté úlohy doběhnou i po vrácení výpisu; jen se už nečeká na jejich výsledek
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _run(hoster, job):
+        with metrics.span("hoster", hoster.name) as span:
+            sources = job() or []
+            span.attrs["results"] = len(sources)
+        return sources
+
+    def collect(self, primary_found=True):
+        """Seznamy zdrojů po hosterech (v pořadí úloh); opožděné a chybující hostery vrací []."""
+        from concurrent.futures import TimeoutError
+        results = []
+        grace_until = time.monotonic() + self.grace
+        for hoster, future in self._futures:
+            until = self.started + hoster.deadline
+            if primary_found:
+                until = min(until, grace_until)
+            try:
+                results.append(future.result(timeout=max(0.0, until - time.monotonic())))
+            except TimeoutError:
+                xbmc.log(f"Kodíček: {hoster.label} did not answer in time, listing without it (results will be cached).", level=xbmc.LOGINFO)
+                results.append([])
+            except Exception as e:
+                xbmc.log(f"Kodíček: {hoster.label} search failed: {e}", level=xbmc.LOGWARNING)
+                results.append([])
+        return results
+
+
+def merge_sources(source_lists, key=None):
+    """Sloučí výsledky hosterů do jednoho seznamu bez duplicit (hoster, ident).
+
+    S `key` se výsledek seřadí sestupně, ale jen když přispěl víc než jeden
+    hoster; při shodě zůstává pořadí hosterů (primární napřed) i pořadí
+    uvnitř hosteru.
+    """
+    merged, seen = [], set()
+    for sources in source_lists:
+        for source in sources:
+            source_key = (hoster_of(source), source["ident"])
+            if source_key not in seen:
+                seen.add(source_key)
+                merged.append(source)
+    if key is not None and sum(1 for sources in source_lists if sources) > 1:
+        merged.sort(key=key, reverse=True)
+    return merged
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Sdílená HTTP vrstva pro Webshare, TMDb i hostery.
+
+`HttpClient` má stejné rozhraní jako `requests.Session` (get/post/request,
+headers, close) a k tomu pro každý host podle `HOST_POLICIES`:
+
+* vlastní velikost poolu spojení,
+* zvlášť timeout na navázání spojení a na čtení,
+* opakování idempotentních volání s náhodně rozptýleným čekáním
+  (full jitter), aby se po výpadku všechna vlákna nevrátila naráz,
+* zajištěné (hedged) čtení – první požadavek jde ve vlákně volajícího;
+  když neodpoví do `hedge_after` sekund, pošle se z vlastního poolu
+  souběžně druhý, a selže-li první (timeout, chyba spojení, 5xx), použije
+  se odpověď druhého bez dalšího kola opakování,
+* jistič (circuit breaker): po několika selháních za sebou host na chvíli
+  odmítá požadavky hned (`CircuitOpenError`) místo čekání na timeouty.
+
+Ve službě běží jeden `HttpClient` za workerem (resources/lib/worker.py),
+takže stav jističů i teplá spojení přežívají mezi spuštěními pluginu.
+Když worker neběží, `WorkerSession` použije vlastní `HttpClient`.
+"""
+import random
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+
+import requests
+import xbmc
+from requests.adapters import HTTPAdapter
+
+HostPolicy = namedtuple("HostPolicy", ("pool_size", "connect_timeout", "read_timeout", "retries", "hedge_after"))
+
+HOST_POLICIES = {
+    "webshare.cz": HostPolicy(pool_size=8, connect_timeout=3.05, read_timeout=10, retries=2, hedge_after=None),
+    "api.themoviedb.org": HostPolicy(pool_size=8, connect_timeout=3.05, read_timeout=8, retries=2, hedge_after=1.5),
+    "image.tmdb.org": HostPolicy(pool_size=4, connect_timeout=3.05, read_timeout=15, retries=1, hedge_after=None),
+    "www.sdilej.cz": HostPolicy(pool_size=4, connect_timeout=3.05, read_timeout=15, retries=2, hedge_after=None),
+}
+DEFAULT_HOST_POLICY = HostPolicy(pool_size=4, connect_timeout=3.05, read_timeout=10, retries=1, hedge_after=None)
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+# Odpovědi, po kterých má smysl zkusit to znovu
+RETRY_STATUSES = (429, 502, 503, 504)
+BACKOFF_BASE = 0.3
+BACKOFF_MAX = 4.0
+# Jistič: po BREAKER_THRESHOLD selháních za sebou je host BREAKER_RESET_TIMEOUT sekund "otevřený"
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+# Pool jen pro zajišťovací požadavky (primární běží ve vlákně volajícího a nic neomezuje)
+HEDGE_WORKERS = 4
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Host je po sérii selhání dočasně vyřazený – požadavek se vůbec neposlal."""
+
+
+def backoff_delay(attempt):
+    """Čekání před dalším pokusem: full jitter nad exponenciální řadou."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _close_quietly(future):
+    try:
+        future.result().close()
+    except Exception:
+        pass
+
+
+class CircuitBreaker(object):
+    """Jistič jednoho hostu: zavřený → (selhání) otevřený → (po čase) jeden zkušební požadavek."""
+
+    def __init__(self, host, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.host = host
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            # Polootevřený stav: pustíme jediný zkušební požadavek (zaseknutý se po čase nahradí)
+            if self._trial_at is not None and now - self._trial_at < self.reset_timeout:
+                return False
+            self._trial_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                xbmc.log(f"Kodíček HTTP: {self.host} is back, closing circuit.", level=xbmc.LOGINFO)
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_at = None
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    xbmc.log(f"Kodíček HTTP: {self.host} failed {self.failures}x in a row, opening circuit for {self.reset_timeout} s.", level=xbmc.LOGWARNING)
+                self.opened_at = time.monotonic()
+
+
+class HttpClient(object):
+    """requests.Session s politikou podle hostu (pool, timeouty, opakování, hedging, jistič)."""
+
+    def __init__(self, policies=None, headers=None):
+        self.policies = dict(HOST_POLICIES)
+        self.policies.update(policies or {})
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        self.headers = self.session.headers
+        for host, policy in self.policies.items():
+            # Opakování řešíme sami (jen u idempotentních volání), adapter nic neopakuje
+            self.session.mount(f"https://{host}/", HTTPAdapter(pool_maxsize=policy.pool_size, max_retries=0))
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def policy_for(self, host):
+        return self.policies.get(host, DEFAULT_HOST_POLICY)
+
+    def breaker_for(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host)
+            return breaker
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, idempotent=None, **kwargs):
+        """Jako requests.Session.request; idempotent=True povolí opakování i u POST (čtecí API)."""
+        host = urllib.parse.urlsplit(url).hostname or ""
+        policy = self.policy_for(host)
+        breaker = self.breaker_for(host)
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (policy.connect_timeout, policy.read_timeout)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempts = policy.retries + 1 if idempotent else 1
+        hedge = idempotent and policy.hedge_after and not kwargs.get("stream")
+        for attempt in range(attempts):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} is temporarily unavailable (circuit open)")
+            last = attempt == attempts - 1
+            try:
+                if hedge:
+                    response = self._hedged(method, url, policy.hedge_after, kwargs)
+                else:
+                    response = self._send(method, url, kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                breaker.record_failure()
+                if last:
+                    raise
+                xbmc.log(f"Kodíček HTTP: {method} {host} failed ({e}), retry {attempt + 1}/{attempts - 1}.", level=xbmc.LOGDEBUG)
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                # 429 znamená přetížení, ne výpadek – jistič kvůli němu neotevíráme
+                if response.status_code != 429:
+                    breaker.record_failure()
+                if last:
+                    return response
+                xbmc.log(f"Kodíček HTTP: {method} {host} returned {response.status_code}, retry {attempt + 1}/{attempts - 1}.", level=xbmc.LOGDEBUG)
+                response.close()
+            time.sleep(backoff_delay(attempt))
+
+    def _send(self, method, url, kwargs):
+        # Jediné místo, kde požadavek opravdu odchází (benchmark tools/bench ho přesměruje na lokální server)
+        return self.session.request(method, url, **kwargs)
+
+    def _hedged(self, method, url, delay, kwargs):
+        """Pošle požadavek ve vlákně volajícího; neodpoví-li do `delay` s, pošle z poolu druhý.
+
+        Vrací odpověď prvního požadavku. Když první selže (chyba spojení,
+        timeout, RETRY_STATUSES) a druhý už byl odeslán, vrátí jeho odpověď.
+        """
+        primary_done = threading.Event()
+        hedge = self._get_executor().submit(self._send_hedge, primary_done, delay, method, url, kwargs)
+        try:
+            response = self._send(method, url, kwargs)
+        except requests.exceptions.RequestException:
+            primary_done.set()
+            fallback = self._hedge_result(hedge)
+            if fallback is None:
+                raise
+            return fallback
+        primary_done.set()
+        if response.status_code in RETRY_STATUSES:
+            fallback = self._hedge_result(hedge)
+            if fallback is not None:
+                response.close()
+                return fallback
+        # Pozdější zajišťovací odpověď se po doběhnutí jen zavře
+        hedge.add_done_callback(_close_quietly)
+        return response
+
+    def _send_hedge(self, primary_done, delay, method, url, kwargs):
+        if primary_done.wait(delay):
+            return None
+        return self._send(method, url, kwargs)
+
+    @staticmethod
+    def _hedge_result(hedge):
+        """Použitelná odpověď zajišťovacího požadavku, nebo None (neodeslaný, chyba, 5xx)."""
+        if hedge.cancel():
+            return None
+        try:
+            response = hedge.result()
+        except requests.exceptions.RequestException:
+            return None
+        if response is not None and response.status_code in RETRY_STATUSES:
+            response.close()
+            return None
+        return response
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="kodicek-hedge")
+            return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Souběžné vyhodnocení "žebříčku" dotazů se zachováním priority.
+
+Žebříček je seznam dotazů seřazený od nejpřesnějšího po nejvolnější (viz
+`build_episode_queries` v kodicek.py). Sekvenčně se zkouší jeden po druhém,
+dokud některý nevrátí použitelný výsledek. `resolve_ladder` posílá dotazy
+souběžně v okně o velikosti `max_workers`, ale vítěze vybírá stále podle
+pořadí v žebříčku: výsledek dotazu i se použije jen tehdy, když všechny
+dotazy před ním skončily bez úspěchu. Jakmile je vítěz známý, čekající
+dotazy se zruší.
+"""
+DEFAULT_MAX_WORKERS = 4
+
+
+def resolve_ladder(items, worker, accept=bool, max_workers=DEFAULT_MAX_WORKERS, executor=None, prestarted=None):
+    """Vrátí (index, výsledek) prvního přijatého výsledku v pořadí žebříčku, jinak (None, None).
+
+    items       -- seřazený seznam vstupů (např. dotazů)
+    worker      -- funkce volaná pro každý vstup (běží ve vlákně)
+    accept      -- predikát nad výsledkem workeru
+    executor    -- volitelně sdílený ThreadPoolExecutor (jinak se vytvoří vlastní)
+    prestarted  -- {vstup: Future} pro dotazy spuštěné dopředu; nespouští se znovu
+    """
+    # concurrent.futures se načítá až tady, import kodicek.py ho nepotřebuje
+    from concurrent.futures import ThreadPoolExecutor, CancelledError
+    items = list(items)
+    if not items:
+        return None, None
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kodicek-ladder")
+    futures = dict(prestarted or {})
+    submitted = [futures.get(item) for item in items]
+    window = max(1, max_workers)
+
+    def fill(start):
+        for j in range(start, min(start + window, len(items))):
+            if submitted[j] is None:
+                submitted[j] = futures[items[j]] = executor.submit(worker, items[j])
+
+    winner = (None, None)
+    try:
+        for i in range(len(items)):
+            fill(i)
+            try:
+                result = submitted[i].result()
+            except CancelledError:
+                continue
+            except Exception:
+                # Chyba jednoho dotazu nesmí shodit celý žebříček – bereme ji jako neúspěch.
+                continue
+            if accept(result):
+                winner = (i, result)
+                break
+    finally:
+        for future in futures.values():
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False)
+    return winner
+
+
+# ----------------------------------------------------------------------
+# Krátká kontrola – pustí se jen pokud modul spustíš přímo (python -m resources.lib.ladder)
+# ----------------------------------------------------------------------
+if __name__ == "__main__":
+    import time
+
+    def worker(query):
+        if query == "chyba":
+            raise ValueError("dotaz selhal")
+        time.sleep(0.05)
+        return [] if query == "prazdny" else [query]
+
+    # Dotaz, který vyhodí výjimku, se počítá jako neúspěch a vyhraje další příčka
+    assert resolve_ladder(["chyba", "prazdny", "vitez", "pozdni"], worker) == (2, ["vitez"])
+    assert resolve_ladder(["chyba"], worker, max_workers=1) == (None, None)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=2) as shared:
+        assert resolve_ladder(["chyba", "vitez"], worker, executor=shared) == (1, ["vitez"])
+    print("resolve_ladder: OK")
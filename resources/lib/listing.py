@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Společné vykreslení výpisů (adresářů) pluginu.
+
+Pohledy (hledání, zdroje filmu a epizody, historie, sezóny, epizody i
+hlavní menu) popíšou položky jako prosté `Item` a `render()` z nich
+postaví ListItemy s `offscreen=True` (Kodi pro ně nedrží zámek GUI),
+odešle je jedním `addDirectoryItems`, zaregistruje metody řazení podle
+druhu výpisu a adresář ukončí. Přeřazení výpisu pak Kodi udělá samo,
+bez dalšího spuštění pluginu.
+"""
+import urllib.parse
+from collections import namedtuple
+
+import xbmcgui
+import xbmcplugin
+
+from resources.lib import metrics
+
+# folder=True je podadresář; playable=True u souborů, které se přehrají přes setResolvedUrl
+Item = namedtuple("Item", ("label", "url", "folder", "info", "art", "properties", "playable"), defaults=(True, None, None, None, False))
+
+# Metody řazení podle druhu výpisu; první je výchozí (UNSORTED = pořadí z pluginu, např. podle skóre)
+SORT_METHODS = {
+    "menu": (),
+    "files": (xbmcplugin.SORT_METHOD_UNSORTED, xbmcplugin.SORT_METHOD_LABEL_IGNORE_THE, xbmcplugin.SORT_METHOD_SIZE),
+    "titles": (xbmcplugin.SORT_METHOD_UNSORTED, xbmcplugin.SORT_METHOD_TITLE, xbmcplugin.SORT_METHOD_VIDEO_YEAR),
+    "seasons": (xbmcplugin.SORT_METHOD_UNSORTED, xbmcplugin.SORT_METHOD_TITLE),
+    "episodes": (xbmcplugin.SORT_METHOD_EPISODE, xbmcplugin.SORT_METHOD_TITLE, xbmcplugin.SORT_METHOD_VIDEO_RATING),
+    "history": (xbmcplugin.SORT_METHOD_UNSORTED, xbmcplugin.SORT_METHOD_LABEL_IGNORE_THE),
+}
+# "Další strana" zůstane při jakémkoli řazení na konci výpisu
+NEXT_PAGE_PROPERTIES = {"SpecialSort": "bottom"}
+
+
+def format_size(size_bytes):
+    """Velikost souboru pro popisek: 1.50 GB, 700.00 MB, 12 KB, 512 B."""
+    if size_bytes > 1024 ** 3:
+        return f"{size_bytes / 1024 ** 3:.2f} GB"
+    if size_bytes > 1024 ** 2:
+        return f"{size_bytes / 1024 ** 2:.2f} MB"
+    if size_bytes > 1024:
+        return f"{size_bytes / 1024:.0f} KB"
+    return f"{size_bytes} B"
+
+
+def build_url(base_url, params):
+    """URL akce pluginu; hodnoty se kódují jednou, stejně pro všechny pohledy (prázdné None se vynechají)."""
+    return f"{base_url}?{urllib.parse.urlencode([(k, v) for k, v in params.items() if v is not None])}"
+
+
+def next_page_item(label, url):
+    return Item(label, url, art={"icon": "DefaultFolder.png"}, properties=NEXT_PAGE_PROPERTIES)
+
+
+def list_item(item):
+    li = xbmcgui.ListItem(label=item.label, offscreen=True)
+    if item.art:
+        li.setArt(item.art)
+    if item.info:
+        li.setInfo("video", item.info)
+    properties = dict(item.properties or {})
+    if not item.folder:
+        properties["IsPlayable"] = "true" if item.playable else "false"
+    if properties:
+        li.setProperties(properties)
+    return li
+
+
+def render(handle, items, category=None, content=None, sort="menu", name="listing", cache_to_disc=True):
+    """Vykreslí celý výpis jednou dávkou a ukončí adresář; měří se jako span `render`/`name`."""
+    with metrics.span("render", name, items=len(items)):
+        if category:
+            xbmcplugin.setPluginCategory(handle, category)
+        if content:
+            xbmcplugin.setContent(handle, content)
+        batch = [(item.url, list_item(item), item.folder) for item in items]
+        xbmcplugin.addDirectoryItems(handle, batch, len(batch))
+        for method in SORT_METHODS[sort]:
+            xbmcplugin.addSortMethod(handle, method)
+        xbmcplugin.endOfDirectory(handle, succeeded=True, cacheToDisc=cache_to_disc)
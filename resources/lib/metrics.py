@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Lehké měření času akcí pluginu (spany) a jejich souhrn p50/p95.
+
+Span je jeden změřený úsek: celá akce routeru (`action`), odchozí HTTP
+požadavek (`http`, s hostem, endpointem, stavem a velikostí odpovědi),
+parsování odpovědi (`parse`), skórování (`score`), hledání na vedlejším
+hosteru (`hoster`) a stavění výpisu (`render`). Čítače (`incr`) sbírají zásahy a výpadky cache.
+
+Spany se drží v paměti a na konci spuštění se připíšou jedním zápisem do
+`metrics.jsonl` v profilu doplňku (jeden JSON na řádek). Soubor je
+rotující: po překročení `MAX_FILE_BYTES` se přesune na `metrics.jsonl.1`
+a začne se znovu, takže na disku je nejvýš dvojnásobek limitu.
+"""
+import json
+import math
+import os
+import re
+import threading
+import time
+
+METRICS_FILE = "metrics.jsonl"
+MAX_FILE_BYTES = 512 * 1024
+
+_records = []
+_counters = {}
+_lock = threading.Lock()
+_ID_RE = re.compile(r"\d+")
+
+
+def endpoint_name(endpoint):
+    """Endpoint bez čísel (tv/1399/season/2 -> tv/#/season/#), aby se spany daly seskupit."""
+    return _ID_RE.sub("#", endpoint.strip("/"))
+
+
+class Span(object):
+    """Měřený úsek; jako context manager, nebo ručně přes end() (bez přeodsazení kódu)."""
+
+    __slots__ = ("kind", "name", "attrs", "start")
+
+    def __init__(self, kind, name, **attrs):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+
+    def end(self, **attrs):
+        self.attrs.update(attrs)
+        record(self.kind, self.name, (time.perf_counter() - self.start) * 1000, **self.attrs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.end()
+        return False
+
+
+def span(kind, name, **attrs):
+    return Span(kind, name, **attrs)
+
+
+def record(kind, name, ms, **attrs):
+    item = {"t": int(time.time()), "kind": kind, "name": name, "ms": round(ms, 2)}
+    item.update(attrs)
+    with _lock:
+        _records.append(item)
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def flush(path):
+    """Připíše nasbírané spany (a čítače jako jeden záznam) do souboru; chyby zápisu ignoruje."""
+    with _lock:
+        records = list(_records)
+        if _counters:
+            records.append({"t": int(time.time()), "kind": "counters", "name": "run", "counters": dict(_counters)})
+        del _records[:]
+        _counters.clear()
+    if not records:
+        return
+    try:
+        if os.path.exists(path) and os.path.getsize(path) > MAX_FILE_BYTES:
+            os.replace(path, path + ".1")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+    except OSError:
+        pass
+
+
+def load(path):
+    """Záznamy ze souboru i jeho rotované kopie (starší napřed); poškozené řádky přeskočí."""
+    records = []
+    for name in (path + ".1", path):
+        try:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    return records
+
+
+def clear(path):
+    for name in (path, path + ".1"):
+        try:
+            os.remove(name)
+        except OSError:
+            pass
+
+
+def percentile(values, p):
+    """Percentil metodou nejbližšího pořadí; values musí být seřazené."""
+    if not values:
+        return None
+    rank = math.ceil(p / 100.0 * len(values))
+    return values[max(0, min(len(values), rank) - 1)]
+
+
+def summarize(records):
+    """{(kind, name): {'count', 'p50', 'p95', 'errors'}} a součty čítačů."""
+    durations, errors, counters = {}, {}, {}
+    for item in records:
+        if item.get("kind") == "counters":
+            for name, value in (item.get("counters") or {}).items():
+                counters[name] = counters.get(name, 0) + value
+            continue
+        key = (item.get("kind"), item.get("name"))
+        durations.setdefault(key, []).append(item.get("ms", 0))
+        if item.get("error") or (item.get("status") or 0) >= 400:
+            errors[key] = errors.get(key, 0) + 1
+    summary = {}
+    for key, values in durations.items():
+        values.sort()
+        summary[key] = {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "errors": errors.get(key, 0)}
+    return summary, counters
+
+
+KIND_TITLES = (
+    ("action", "Akce"),
+    ("http", "HTTP požadavky"),
+    ("parse", "Parsování"),
+    ("score", "Skórování"),
+    ("hoster", "Hledání na vedlejších hosterech"),
+    ("render", "Vykreslení výpisu"),
+)
+
+
+def format_summary(records):
+    """Text pro textviewer: p50/p95 po akcích a endpointech, pak čítače cache."""
+    if not records:
+        return "Zatím nejsou žádná měření."
+    summary, counters = summarize(records)
+    lines = []
+    for kind, title in KIND_TITLES:
+        rows = sorted((name, stats) for (k, name), stats in summary.items() if k == kind)
+        if not rows:
+            continue
+        lines.append(f"[B]{title}[/B]  (počet, p50, p95 v ms)")
+        for name, stats in rows:
+            errors = f", chyb: {stats['errors']}" if stats["errors"] else ""
+            lines.append(f"  {name}: {stats['count']}×, p50 {stats['p50']:.1f}, p95 {stats['p95']:.1f}{errors}")
+        lines.append("")
+    if counters:
+        lines.append("[B]Čítače[/B]")
+        for name in sorted(counters):
+            lines.append(f"  {name}: {counters[name]}")
+    return "\n".join(lines)
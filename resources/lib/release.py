@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Rozbor názvů souborů (release names) z Webshare.
+
+Skórování filmů i filtr epizod dřív pro každý soubor znovu volaly
+`normalize_text()` a pak název procházely mnoha podřetězcovými testy a
+regexy. Tady se každý název rozebere jen jednou do kompaktního záznamu
+`ReleaseInfo` a záznamy se pamatují podle `ident` (Webshare ident je
+pro daný soubor neměnný), takže opakované dotazy ze žebříčku ani sloučené
+výsledky z více variant dotazu se nerozebírají znovu.
+"""
+import re
+
+_DIACRITICS = str.maketrans({
+    'á': 'a', 'č': 'c', 'ď': 'd', 'é': 'e', 'ě': 'e', 'í': 'i', 'ň': 'n',
+    'ó': 'o', 'ř': 'r', 'š': 's', 'ť': 't', 'ú': 'u', 'ů': 'u', 'ý': 'y',
+    'ž': 'z', 'ľ': 'l', 'ĺ': 'l', 'ŕ': 'r', 'ä': 'a', 'ô': 'o',
+    ' ': '.', '_': '.', '-': '.',
+})
+_NON_WORD_RE = re.compile(r'[^\w.]')
+_DOTS_RE = re.compile(r'\.+')
+
+YEAR_IN_NAME_RE = re.compile(r'(19|20)\d{2}')
+# S01E02, S1E2, S01.E02 / 01x02, 1x2 – s hranicemi slov, aby S1E10 nebylo S1E1
+EPISODE_CODE_RE = re.compile(r'\bs(\d{1,3})[e.](\d{1,3})\b|\b(\d{1,2})x(\d{1,3})\b')
+# Pořadí ve skupinách určuje prioritu (CZ > SK > EN)
+LANGUAGE_TAGS = (
+    ('cz', ('.cz', '.cze', '.cesky')),
+    ('sk', ('.sk', '.svk', '.slovensky')),
+    ('en', ('.en', '.eng', '.english')),
+)
+BAD_SOURCE_TAGS = (('cam', '.cam.'), ('ts', '.ts.'), ('tc', '.tc.'))
+VIDEO_EXTENSIONS = frozenset(('mkv', 'mp4', 'avi', 'mov', 'wmv', 'flv', 'ts'))
+
+
+def normalize_text(text):
+    if not text: return ""
+    text = text.lower().translate(_DIACRITICS)
+    text = _NON_WORD_RE.sub('', text) # Keep alphanumeric, underscore, and dot
+    text = _DOTS_RE.sub('.', text)   # Replace multiple dots with a single dot
+    return text.strip('.')
+
+
+class ReleaseInfo(object):
+    """Předzpracovaný název souboru."""
+    __slots__ = ('normalized', 'year', 'episodes', 'resolution', 'language', 'bad_source', 'extension')
+
+    def __init__(self, name):
+        normalized = normalize_text(name)
+        self.normalized = normalized
+
+        match = YEAR_IN_NAME_RE.search(normalized)
+        self.year = int(match.group()) if match else None
+
+        episodes = set()
+        for m in EPISODE_CODE_RE.finditer(normalized):
+            if m.group(1) is not None:
+                episodes.add((int(m.group(1)), int(m.group(2))))
+            else:
+                episodes.add((int(m.group(3)), int(m.group(4))))
+        self.episodes = frozenset(episodes)
+
+        if '2160p' in normalized or '4k' in normalized: self.resolution = '2160p'
+        elif '1080p' in normalized: self.resolution = '1080p'
+        elif '720p' in normalized: self.resolution = '720p'
+        else: self.resolution = None
+
+        self.language = None
+        for language, tags in LANGUAGE_TAGS:
+            if any(tag in normalized for tag in tags):
+                self.language = language
+                break
+
+        self.bad_source = None
+        for source, tag in BAD_SOURCE_TAGS:
+            if tag in normalized:
+                self.bad_source = source
+                break
+
+        lowered = (name or '').lower()
+        self.extension = lowered.rsplit('.', 1)[1] if '.' in lowered else ''
+
+    @property
+    def is_video(self):
+        return self.extension in VIDEO_EXTENSIONS
+
+    def has_episode(self, season, episode):
+        return (season, episode) in self.episodes
+
+
+_by_ident = {}
+MAX_MEMO = 5000
+
+
+def release_info(file_item):
+    """Vrátí ReleaseInfo pro soubor z Webshare (či jiného hosteru), zapamatovaný podle ident."""
+    ident = file_item.get('ident')
+    if ident and file_item.get('hoster'):
+        # Identy různých hosterů se mohou potkat
+        ident = f"{file_item['hoster']}:{ident}"
+    info = _by_ident.get(ident) if ident else None
+    if info is None:
+        info = ReleaseInfo(file_item.get('name', ''))
+        if ident:
+            if len(_by_ident) >= MAX_MEMO:
+                _by_ident.clear()
+            _by_ident[ident] = info
+    return info
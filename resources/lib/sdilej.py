@@ -2,11 +2,12 @@
 
 Tento modul přidává podporu hosteru Sdilej.cz do vašeho Kodi plug‑inu.
 Stačí:
-1. Přidat objekt `SdilejHoster` do seznamu hosterů (viz main.py).
+1. Zapnout Sdilej.cz v nastavení add‑onu (kodicek.py ho pak hledá souběžně
+   s Webshare, viz `get_secondary_hosters`).
 2. Vyplnit uživatelské jméno a heslo v nastavení add‑onu.
 
-Rozhraní je kompatibilní s třídou `BaseHoster`:
-    * search(query) -> list[dict]
+Rozhraní je kompatibilní s třídou `BaseHoster` (resources/lib/hosters.py):
+    * search(query) -> list[dict] – záznamy zdrojů (hosters.make_source)
     * get_stream(file_id) -> přímé URL k videu (HTTP/HTTPS)
 
 Poznámka: Sdilej.cz API není veřejně dokumentováno. Všechny endpointy
@@ -16,28 +17,52 @@ popř. cesty v methods.
 """
 from __future__ import annotations
 
+import json
 import logging
+import os
+import threading
 import time
 from typing import List, Dict
 
 import requests
 
+from resources.lib.hosters import BaseHoster, make_source
+from resources.lib.http_client import HttpClient
 
-class SdilejHoster:  # (BaseHoster): dědění od vaší společné třídy
+# Jen ASCII: hlavička se kóduje jako latin-1
+USER_AGENT = "KODICEK/1.0 (Kodi add-on)"
+# Platnost free ticketu a přímého odkazu, když ji API neuvede (v sekundách)
+TICKET_TTL = 5 * 60
+LINK_TTL = 60 * 60
+# Platnost tokenu, když ji login neuvede; token se přestane používat MARGIN sekund před vypršením
+TOKEN_TTL = 12 * 3600
+TOKEN_EXPIRY_MARGIN = 60
+
+
+class SdilejHoster(BaseHoster):
     """Resolver pro Sdilej.cz."""
 
+    name = "sdilej"
+    label = "Sdilej.cz"
     BASE_URL = "https://www.sdilej.cz"
     API_URL = f"{BASE_URL}/api"
 
-    def __init__(self, username: str | None = None, password: str | None = None, session: requests.Session | None = None):
+    def __init__(self, username: str | None = None, password: str | None = None, session: requests.Session | None = None, cache=None, token_path: str | None = None):
         self.username = username
         self.password = password
-        self.session = session or requests.Session()
+        # Token (s expirací) se ukládá do profilu doplňku a používá se i v dalších spuštěních pluginu
+        self.token_path = token_path
+        # Sdílená HTTP vrstva: pool, timeouty, opakování a jistič podle hostu
+        self.session = session or HttpClient()
+        # Tickety a odkazy přežijí mezi spuštěními pluginu jen s ResponseCache; jinak se drží v paměti
+        self.cache = cache
+        self._memo: Dict[str, tuple] = {}
         self._token: str | None = None
+        self._token_expires = 0.0
+        self._lock = threading.Lock()
 
-        if self.username and self.password:
-            self._login()
-        else:
+        # Přihlášení proběhne až při prvním skutečném požadavku (viz _get_token)
+        if not (self.username and self.password):
             logging.warning("SdilejHoster: není zadáno uživatelské jméno / heslo – dostupná jen pomalá (free) rychlost a limit 1 vlákno.")
 
     # ------------------------------------------------------------------
@@ -45,7 +70,7 @@ class SdilejHoster:  # (BaseHoster): dědění od vaší společné třídy
     # ------------------------------------------------------------------
     def search(self, query: str, page: int = 1, per_page: int = 60) -> List[Dict]:
         """Plnotextové hledání videí.
-        Vrací list slovníků: {title, size, id, url}.
+        Vrací list záznamů zdrojů: {hoster, ident, name, size, url}.
         """
         params = {
             "term": query,
@@ -53,47 +78,74 @@ class SdilejHoster:  # (BaseHoster): dědění od vaší společné třídy
             "perPage": per_page,
             "types": "video",  # filtrujeme jen video soubory
         }
-        r = self.session.get(f"{self.API_URL}/search", params=params, headers=self._headers(), timeout=10)
+        r = self._get("search", params)
         r.raise_for_status()
         data = r.json().get("data", [])
         results: List[Dict] = []
         for item in data:
-            results.append({
-                "title": item["name"],
-                "size": item["size"],
-                "id": item["id"],
-                "url": f"{self.BASE_URL}/{item['slug']}/{item['id']}",
-            })
+            results.append(make_source(
+                self.name,
+                item["id"],
+                item["name"],
+                item.get("size"),
+                url=f"{self.BASE_URL}/{item['slug']}/{item['id']}",
+            ))
         return results
 
-    def get_stream(self, file_id: str) -> str | None:
-        """Získá přímé (prémiové) URL k videu.
-        Pokud je add‑on přihlášen k prémiovému účtu, Sdilej vrátí 302 s Location
-        obsahujícím efektivní CDN link. Free účet obvykle vrací JSON s čekací
-        dobou; tu by bylo nutné obsloužit (viz _wait_ticket).
+    def get_stream(self, file_id: str, wait=None) -> str | None:
+        """Získá přímé URL k videu.
+        Prémiový účet dostane odkaz hned. Free účet dostane ticket s čekací
+        dobou (viz prepare); po ní se ticket smění za odkaz. Na zbytek čekání
+        se volá `wait(sekundy)` – vrátí-li False (uživatel zrušil), vrací se
+        None a ticket zůstane v cache pro další pokus. Bez `wait` se čeká
+        prostým time.sleep.
+        """
+        prepared = self.prepare(file_id)
+        if not isinstance(prepared, dict):
+            return prepared
+        remaining = prepared["ready_at"] - time.time()
+        if remaining > 0:
+            logging.info("SdilejHoster: čekám %.0f s na ticket…", remaining)
+            if wait is None:
+                time.sleep(remaining)
+            elif not wait(remaining):
+                logging.info("SdilejHoster: čekání na ticket pro %s zrušeno.", file_id)
+                return None
+        link = self._redeem_ticket(file_id, prepared["ticket"])
+        self._cache_delete(f"ticket:{file_id}")
+        if link:
+            self._cache_put(f"link:{file_id}", link, LINK_TTL)
+        return link
+
+    def prepare(self, file_id: str, timeout=None):
+        """První krok stahování: přímý odkaz (str), ticket ({ticket, ready_at}), nebo None.
+        Odkaz i ticket se pamatují po dobu platnosti, takže prepare() lze spustit
+        už při zobrazení zdrojů – čekací doba běží, zatímco uživatel vybírá.
         """
+        link = self._cache_get(f"link:{file_id}")
+        if link:
+            return link
+        ticket = self._cache_get(f"ticket:{file_id}")
+        if ticket:
+            return ticket
+
         # 1) požádáme o direct URL (download)
-        resp = self.session.get(
-            f"{self.API_URL}/file/download",
-            params={"id": file_id},
-            headers=self._headers(),
-            allow_redirects=False,
-            timeout=10,
-        )
+        resp = self._get("file/download", {"id": file_id}, allow_redirects=False, timeout=timeout)
 
         # Prémiový účet => 302 Found s Location
         if resp.status_code in (301, 302):
-            return resp.headers["Location"]
+            link = resp.headers["Location"]
+            self._cache_put(f"link:{file_id}", link, LINK_TTL)
+            return link
 
         # Free režim => JSON s ticketem a čekací dobou
         if resp.headers.get("Content-Type", "").startswith("application/json"):
             payload = resp.json()
-            wait = payload.get("wait", 0)
-            ticket = payload.get("ticket")
-            if ticket and wait:
-                logging.info("SdilejHoster: čekám %s s na ticket…", wait)
-                time.sleep(wait + 1)
-                return self._redeem_ticket(file_id, ticket)
+            if payload.get("ticket"):
+                ticket = {"ticket": payload["ticket"], "ready_at": time.time() + payload.get("wait", 0) + 1}
+                self._cache_put(f"ticket:{file_id}", ticket, payload.get("valid") or TICKET_TTL)
+                logging.info("SdilejHoster: ticket pro %s, čekací doba %s s", file_id, payload.get("wait", 0))
+                return ticket
 
         resp.raise_for_status()
         return None
@@ -101,33 +153,125 @@ class SdilejHoster:  # (BaseHoster): dědění od vaší společné třídy
     # ------------------------------------------------------------------
     # Interní pomocné funkce
     # ------------------------------------------------------------------
-    def _login(self) -> None:
+    def _get(self, path: str, params: dict, **kwargs):
+        """GET na API s tokenem; po 401 se jednou přihlásí znovu a požadavek zopakuje."""
+        for attempt in (1, 2):
+            token = self._get_token(kwargs.get("timeout"))
+            resp = self.session.get(f"{self.API_URL}/{path}", params=params, headers=self._headers(token), **kwargs)
+            if resp.status_code == 401 and token and attempt == 1:
+                logging.warning("SdilejHoster: token byl odmítnut, přihlašuji se znovu.")
+                resp.close()
+                self._invalidate(token)
+                continue
+            return resp
+
+    def _get_token(self, timeout=None) -> str | None:
+        """Platný token z paměti, z profilu, nebo po přihlášení; bez údajů None (free režim).
+        Zámek zajistí, že souběžná vlákna sdílí jediné přihlášení.
+        """
+        if not (self.username and self.password):
+            return None
+        with self._lock:
+            if not self._token or time.time() >= self._token_expires - TOKEN_EXPIRY_MARGIN:
+                if not self._load_token():
+                    self._login(timeout)
+            return self._token
+
+    def _invalidate(self, bad_token: str) -> None:
+        with self._lock:
+            # Jiné vlákno už mohlo token obnovit – zahodíme jen ten, který selhal
+            if self._token == bad_token:
+                self._token = None
+                self._token_expires = 0.0
+                self._store_token()
+
+    def _login(self, timeout=None) -> None:
         payload = {"username": self.username, "password": self.password}
-        r = self.session.post(f"{self.API_URL}/user/login", json=payload, timeout=10)
+        r = self.session.post(f"{self.API_URL}/user/login", json=payload, timeout=timeout)
         r.raise_for_status()
         data = r.json()
         self._token = data.get("token") or data.get("access_token")
         if not self._token:
             raise RuntimeError("SdilejHoster: nepodařilo se získat token – zkontroluj přihlašovací údaje.")
+        self._token_expires = time.time() + float(data.get("expires_in") or TOKEN_TTL)
+        self._store_token()
         logging.info("SdilejHoster: úspěšně přihlášen jako %s", self.username)
 
-    def _headers(self) -> dict:
+    def _load_token(self) -> bool:
+        if not self.token_path:
+            return False
+        try:
+            with open(self.token_path, encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return False
+        # Token jiného účtu (změněné údaje v nastavení) nebo těsně před vypršením se nepoužije
+        if stored.get("username") != self.username or time.time() >= stored.get("expires_at", 0) - TOKEN_EXPIRY_MARGIN:
+            return False
+        self._token = stored.get("token")
+        self._token_expires = stored["expires_at"]
+        return bool(self._token)
+
+    def _store_token(self) -> None:
+        """Zapíše aktuální token do profilu (atomicky); bez tokenu soubor smaže."""
+        if not self.token_path:
+            return
+        try:
+            if not self._token:
+                if os.path.exists(self.token_path):
+                    os.remove(self.token_path)
+                return
+            os.makedirs(os.path.dirname(self.token_path), exist_ok=True)
+            tmp_path = self.token_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"username": self.username, "token": self._token, "expires_at": self._token_expires}, f)
+            os.replace(tmp_path, self.token_path)
+        except OSError as e:
+            logging.warning("SdilejHoster: token se nepodařilo uložit: %s", e)
+
+    def stream_headers(self) -> dict:
+        return {"User-Agent": USER_AGENT}
+
+    def _headers(self, token: str | None = None) -> dict:
         hdrs = {
-            "User-Agent": "KODICEK/1.0 (Kodi add‑on)",
+            "User-Agent": USER_AGENT,
         }
-        if self._token:
-            hdrs["Authorization"] = f"Bearer {self._token}"
+        if token:
+            hdrs["Authorization"] = f"Bearer {token}"
         return hdrs
 
+    def _cache_get(self, key: str):
+        if self.cache is not None:
+            try:
+                entry = self.cache.get(f"{self.name}_{key}")
+            except Exception as e:
+                logging.warning("SdilejHoster: čtení cache selhalo (%s): %s", key, e)
+                return None
+            return entry.value if entry is not None and entry.fresh else None
+        value, expires_at = self._memo.get(key, (None, 0))
+        return value if time.time() < expires_at else None
+
+    def _cache_put(self, key: str, value, ttl: float) -> None:
+        if self.cache is not None:
+            try:
+                self.cache.put(f"{self.name}_{key}", value, ttl, namespace=self.name)
+            except Exception as e:
+                logging.warning("SdilejHoster: zápis do cache selhal (%s): %s", key, e)
+        else:
+            self._memo[key] = (value, time.time() + ttl)
+
+    def _cache_delete(self, key: str) -> None:
+        if self.cache is not None:
+            try:
+                self.cache.delete(f"{self.name}_{key}")
+            except Exception:
+                pass
+        else:
+            self._memo.pop(key, None)
+
     def _redeem_ticket(self, file_id: str, ticket: str) -> str | None:
         """Druhý krok free stahování – smění ticket za přímé URL."""
-        r2 = self.session.get(
-            f"{self.API_URL}/file/download",
-            params={"id": file_id, "ticket": ticket},
-            headers=self._headers(),
-            allow_redirects=False,
-            timeout=10,
-        )
+        r2 = self._get("file/download", {"id": file_id, "ticket": ticket}, allow_redirects=False)
         if r2.status_code in (301, 302):
             return r2.headers.get("Location")
         r2.raise_for_status()
@@ -150,6 +294,6 @@ if __name__ == "__main__":
     files = hoster.search(args.query)
     pprint.pprint(files[:5])
     if files:
-        first_id = files[0]["id"]
+        first_id = files[0]["ident"]
         url = hoster.get_stream(first_id)
         print("Stream URL:", url)
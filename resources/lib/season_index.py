@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Index dostupnosti epizod jedné sezóny na Webshare.
+
+Místo žebříčku až 20 dotazů pro každou epizodu se pro celou sezónu pošle
+jen pár širokých dotazů ("Seriál S01", "Seriál 1x") a vrácené soubory se
+roztřídí podle (sezóna, epizoda). Kód epizody z názvu vytahuje jediný
+zkompilovaný regex `EPISODE_CODE_RE` přes `release_info()`.
+
+Index je obyčejný slovník, aby šel uložit do cache (JSON):
+
+    {"episodes": {"1": [{"ident": .., "name": .., "size": ..}, ...], ...}}
+"""
+from resources.lib.release import normalize_text, release_info
+
+
+def season_queries(show_title, season):
+    show_title = " ".join(show_title.split())
+    return [f"{show_title} S{season:02d}", f"{show_title} {season}x"]
+
+
+def bucket_files(files, show_title, season, index=None):
+    """Roztřídí soubory do indexu podle epizody; do existujícího indexu jen přidává (bez duplicit ident)."""
+    index = index if index is not None else {"episodes": {}}
+    episodes = index.setdefault("episodes", {})
+    known = {f["ident"] for bucket in episodes.values() for f in bucket}
+    norm_show = normalize_text(show_title)
+    for file_item in files:
+        if file_item["ident"] in known:
+            continue
+        info = release_info(file_item)
+        if not info.is_video or norm_show not in info.normalized:
+            continue
+        for file_season, episode in info.episodes:
+            if file_season == season:
+                episodes.setdefault(str(episode), []).append(file_item)
+                known.add(file_item["ident"])
+    return index
+
+
+def episode_files(index, episode):
+    return (index or {}).get("episodes", {}).get(str(episode), [])
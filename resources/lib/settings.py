@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Neměnný snímek nastavení doplňku pro jedno spuštění pluginu.
+
+Každé `addon.getSetting*()` je volání do Kodi; dřív se některá nastavení
+četla opakovaně (např. `tmdb_skip_specials` pro každou sezónu). Snímek
+se načte jednou při prvním použití a dál se jen čte z paměti.
+
+Ve snímku jsou jen uživatelská nastavení. Stav, který plugin sám
+zapisuje (`token`, `ws_link_variant`), se dál čte přímo z doplňku.
+"""
+from collections import namedtuple
+
+import xbmc
+
+Settings = namedtuple("Settings", (
+    "ws_username",
+    "ws_password",
+    "tmdb_api_key",
+    "tmdb_skip_specials",
+    "ws_search_workers",
+    "ws_merge_movie_variants",
+    "ws_prefetch_links",
+    "ws_prefetch_next_episode",
+    "cache_size_mb",
+    "art_thumb_size",
+    "art_fanart_size",
+    "art_still_size",
+    "art_prewarm",
+    "metrics_enabled",
+    "verbose_logging",
+    "sdilej_enabled",
+    "sdilej_username",
+    "sdilej_password",
+))
+
+
+def _get_bool(addon, key, default):
+    try:
+        return addon.getSettingBool(key)
+    except TypeError:
+        xbmc.log(f"Kodíček: '{key}' setting missing or invalid type, defaulting to {default}.", level=xbmc.LOGWARNING)
+        return default
+
+
+def _get_int(addon, key, default):
+    try:
+        return int(addon.getSetting(key))
+    except ValueError:
+        return default
+
+
+def load_settings(addon):
+    return Settings(
+        ws_username=addon.getSetting("ws_username"),
+        ws_password=addon.getSetting("ws_password"),
+        tmdb_api_key=addon.getSetting("tmdb_api_key"),
+        tmdb_skip_specials=_get_bool(addon, "tmdb_skip_specials", True),
+        ws_search_workers=_get_int(addon, "ws_search_workers", None),
+        ws_merge_movie_variants=_get_bool(addon, "ws_merge_movie_variants", True),
+        ws_prefetch_links=_get_bool(addon, "ws_prefetch_links", True),
+        ws_prefetch_next_episode=_get_bool(addon, "ws_prefetch_next_episode", True),
+        cache_size_mb=_get_int(addon, "cache_size_mb", None),
+        art_thumb_size=addon.getSetting("art_thumb_size"),
+        art_fanart_size=addon.getSetting("art_fanart_size"),
+        art_still_size=addon.getSetting("art_still_size"),
+        art_prewarm=_get_bool(addon, "art_prewarm", True),
+        metrics_enabled=_get_bool(addon, "metrics_enabled", True),
+        verbose_logging=_get_bool(addon, "verbose_logging", False),
+        sdilej_enabled=_get_bool(addon, "sdilej_enabled", False),
+        sdilej_username=addon.getSetting("sdilej_username"),
+        sdilej_password=addon.getSetting("sdilej_password"),
+    )
@@ -1,40 +1,60 @@
 # -*- coding: utf-8 -*-
 
-# TODO: Ensure tmdb_get is imported or defined if it's not a global or built-in helper.
-# from kodicek import tmdb_get # Example: if tmdb_get is in kodicek.py
-# or from .utils import tmdb_get # Example: if it's in a utils.py in the same directory
+# tmdb_get_func předává volající (kodicek._tmdb_get_for_search_module) – modul sám na síť nesahá.
+
+# Jazyky v pořadí priority – dřívější jazyk má přednost u polí, která vyplňuje víc verzí
+SEARCH_LANGUAGES = ("cs-CZ", "en-US")
+
+
+def search_variants(query):
+    """Varianty dotazu: původní a alias " a " → " and " (u českých názvů anglických děl)."""
+    variants = [query]
+    alt_query = query.replace(" a ", " and ")
+    if alt_query != query:
+        variants.append(alt_query)
+    return variants
+
+
+def merge_results(result_lists):
+    """Sloučí výsledky podle (media_type, id) v pořadí priority.
+
+    Pořadí výsledků určuje první seznam, ve kterém se položka objevila;
+    prázdná pole (např. chybějící český popis) se doplní z dalších seznamů.
+    """
+    merged = {}
+    for results in result_lists:
+        for item in results or []:
+            key = (item.get("media_type"), item.get("id"))
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(item)
+                continue
+            for field, value in item.items():
+                if value and not existing.get(field):
+                    existing[field] = value
+    return list(merged.values())
+
 
 def search_tmdb(query, tmdb_get_func):
     """
-    Searches TMDB using multi search, with language fallback and fuzzy alias.
+    Searches TMDB using multi search in all languages and alias variants at once.
+
+    Všechny kombinace (varianta dotazu × jazyk) se posílají souběžně, takže
+    vyhledávání trvá jeden round trip i v nejhorším případě. Výsledky se
+    sloučí bez duplicit; české údaje mají přednost, chybějící doplní angličtina.
     """
-    langs = ["cs-CZ", "en-US"]  # ➋ Prioritize Czech, fallback to English
-    
-    for lang in langs:
+    from concurrent.futures import ThreadPoolExecutor
+    requests_to_send = [(variant, lang) for variant in search_variants(query) for lang in SEARCH_LANGUAGES]
+
+    def fetch(request):
+        variant, lang = request
         # ➊ multi search → we get both tv and movie results
-        params = {"query": query, "language": lang}
-        # Note: The original prompt mentioned include_language=en-US for the cs-CZ call.
-        # The pseudocode implements a loop. If 'cs-CZ' should also include 'en-US' results
-        # simultaneously (e.g. for missing fields), the tmdb_get call would need modification.
-        # Current implementation strictly tries 'cs-CZ' then 'en-US'.
-        if lang == "cs-CZ":
-            # If you want cs-CZ results to potentially include English titles/overviews when Czech is missing
-            # params["include_adult"] = False # Example, adjust as needed
-            # params["include_image_language"] = "cs,null" # Prioritize Czech images
-            pass # No specific include_language for the primary, as per pseudocode logic of separate calls
-
-        res = tmdb_get_func("/search/multi", params)
-        if res and res.get("results"):
-            return res["results"]
-            
-    # ➌ Last attempt with alias if the original query yielded no results in any language
-    alt_query = query.replace(" a ", " and ")
-    if alt_query != query:
-        # Recursive call with the alternative query
-        # Pass the tmdb_get_func along
-        return search_tmdb(alt_query, tmdb_get_func)
-        
-    return []
+        res = tmdb_get_func("/search/multi", {"query": variant, "language": lang})
+        return (res or {}).get("results") or []
+
+    with ThreadPoolExecutor(max_workers=len(requests_to_send), thread_name_prefix="kodicek-tmdb-search") as executor:
+        result_lists = list(executor.map(fetch, requests_to_send))
+    return merge_results(result_lists)
 
 if __name__ == '__main__':
     # Example usage (requires a mock or real tmdb_get function)
@@ -56,7 +76,7 @@ if __name__ == '__main__':
     results = search_tmdb("Test Show", mock_tmdb_get)
     print(f"Results: {results}\n")
 
-    print("Searching for 'NonExistent a Show' (will try alias):")
+    print("Searching for 'NonExistent a Show' (alias is searched at the same time):")
     results_alias = search_tmdb("NonExistent a Show", mock_tmdb_get)
     print(f"Results: {results_alias}\n")
 
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Proudové (streaming) parsování XML odpovědí Webshare API.
+
+`ET.fromstring(response.content)` drží v paměti celé tělo odpovědi i celý
+strom elementů. U velkých stránek vyhledávání to na slabých Android boxech
+dělá zbytečné paměťové špičky. `WebshareFileStream` čte tělo odpovědi
+postupně přes `ET.iterparse`, vrací záznamy `<file>` hned, jak dorazí,
+a zpracované elementy průběžně uvolňuje.
+
+Odpověď search API vypadá zhruba takto:
+
+    <response>
+        <status>OK</status>
+        <total>123</total>
+        <file><ident>..</ident><name>..</name><size>..</size>...</file>
+        ...
+    </response>
+"""
+from xml.etree import ElementTree as ET
+
+# Pole souboru, která plugin používá; ostatní potomky <file> ignorujeme.
+FILE_FIELDS = ("ident", "name", "size")
+
+
+class WebshareFileStream(object):
+    """Iterátor přes <file> záznamy v odpovědi; stav odpovědi je v atributech.
+
+    status, code, message a total se plní během iterace (v odpovědi jsou
+    před prvním <file>, takže jsou k dispozici i při předčasném ukončení).
+    """
+
+    def __init__(self, source):
+        # source je cokoli s metodou read() – typicky response.raw z requests
+        self.source = source
+        self.status = None
+        self.code = None
+        self.message = None
+        self.total = None
+
+    def __iter__(self):
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(self.source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            # Přímí potomci <response>
+            tag = elem.tag
+            if tag == "file":
+                record = {field: elem.findtext(field) for field in FILE_FIELDS}
+                try:
+                    record["size"] = int(record["size"] or 0)
+                except ValueError:
+                    record["size"] = 0
+                if record["ident"] and record["name"]:
+                    yield record
+            elif tag == "status":
+                self.status = elem.text
+            elif tag == "code":
+                self.code = elem.text
+            elif tag == "message":
+                self.message = elem.text
+            elif tag == "total":
+                try:
+                    self.total = int(elem.text or 0)
+                except ValueError:
+                    self.total = None
+            # Zpracované elementy zahodíme, ať strom nerosté s velikostí odpovědi
+            elem.clear()
+            root.remove(elem)
+
+    @property
+    def ok(self):
+        return self.status == "OK"
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""Teplý worker ve službě Kodíčku a jeho klient pro plugin.
+
+Kodi spouští `kodicek.py` pro každou otevřenou složku znovu: pokaždé se
+importuje `requests`, staví se nová session a TLS spojení na Webshare a
+TMDb se navazují od nuly. Služba (`service.py`) proto drží `WorkerServer`
+s jedním dlouho žijícím `HttpClient` (resources/lib/http_client.py), jehož
+pool spojení i stav jističů zůstávají mezi spuštěními pluginu.
+
+Plugin posílá HTTP požadavky přes `WorkerSession`, která má stejné
+rozhraní jako `requests.Session` (get/post/headers). Komunikace běží přes
+TCP na 127.0.0.1 (JSON s délkovou hlavičkou); port a náhodný klíč služba
+zveřejní ve vlastnosti okna Home. Když služba neběží nebo neodpovídá,
+`WorkerSession` tiše použije vlastní `HttpClient` v procesu pluginu.
+
+Proudové požadavky (`stream=True`, hledání na Webshare) jdou přes worker
+také: worker přečte tělo celé (stránka výsledků má desítky kB) a plugin ho
+pak parsuje postupně z paměti přes `WorkerResponse.raw` stejně jako
+`response.raw` z requests. Teplé spojení tak slouží i hlavní cestě pluginu.
+"""
+import base64
+import io
+import json
+import os
+import struct
+import threading
+
+import xbmc
+import xbmcgui
+
+# Vlastnost okna Home (10000) s adresou a klíčem běžícího workeru
+WORKER_PROPERTY = "kodicek.worker"
+CONNECT_TIMEOUT = 0.5
+# Rezerva nad timeoutem samotného HTTP požadavku
+IPC_TIMEOUT_MARGIN = 5
+# Bez explicitního timeoutu hlídá délku požadavku politika hostu ve workeru
+# (timeouty × pokusy + čekání mezi nimi); tohle je jen pojistka proti zaseknutí.
+IPC_DEFAULT_TIMEOUT = 60
+_HEADER = struct.Struct(">I")
+
+
+def _send_message(sock, message):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            raise ConnectionError("Worker connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv_message(sock):
+    (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, size).decode("utf-8"))
+
+
+class WorkerServer(object):
+    """Běží ve službě; vyřizuje HTTP požadavky pluginu přes sdílený HttpClient."""
+
+    def __init__(self, session):
+        self.session = session
+        self.secret = os.urandom(16).hex()
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        # socketserver potřebuje jen služba; plugin (klient) ho neimportuje
+        import socketserver
+        worker = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                worker.serve_connection(self.request)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="kodicek-worker")
+        self._thread.daemon = True
+        self._thread.start()
+        port = self._server.server_address[1]
+        xbmcgui.Window(10000).setProperty(WORKER_PROPERTY, json.dumps({"port": port, "secret": self.secret}))
+        xbmc.log(f"Kodíček worker: listening on 127.0.0.1:{port}", level=xbmc.LOGINFO)
+
+    def stop(self):
+        xbmcgui.Window(10000).clearProperty(WORKER_PROPERTY)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.session.close()
+
+    def serve_connection(self, sock):
+        while True:
+            try:
+                request = _recv_message(sock)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if request.get("secret") != self.secret:
+                return
+            _send_message(sock, self.dispatch(request))
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "http":
+            return self._http(request)
+        return {"ok": False, "error": f"Unknown op: {op}", "kind": "worker"}
+
+    def _http(self, request):
+        import requests
+        from resources.lib.http_client import CircuitOpenError
+        timeout = request.get("timeout")
+        try:
+            response = self.session.request(
+                request["method"], request["url"],
+                params=request.get("params"), data=request.get("data"), json=request.get("json"),
+                headers=request.get("headers"), idempotent=request.get("idempotent"),
+                allow_redirects=request.get("allow_redirects", True),
+                timeout=tuple(timeout) if isinstance(timeout, list) else timeout,
+            )
+        except CircuitOpenError as e:
+            return {"ok": False, "error": str(e), "kind": "circuit"}
+        except requests.exceptions.Timeout as e:
+            return {"ok": False, "error": str(e), "kind": "timeout"}
+        except requests.exceptions.RequestException as e:
+            return {"ok": False, "error": str(e), "kind": "connection"}
+        return {
+            "ok": True,
+            "status": response.status_code,
+            "reason": response.reason,
+            "url": response.url,
+            "headers": dict(response.headers),
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }
+
+
+class WorkerUnavailable(Exception):
+    """Worker neběží nebo spojení selhalo – volající přejde na lokální session."""
+
+
+class _Headers(dict):
+    """Hlavičky odpovědi s get() nezávislým na velikosti písmen (jako v requests)."""
+
+    def __init__(self, headers):
+        super(_Headers, self).__init__((k.lower(), v) for k, v in headers.items())
+
+    def get(self, key, default=None):
+        return super(_Headers, self).get(key.lower(), default)
+
+    def __getitem__(self, key):
+        return super(_Headers, self).__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super(_Headers, self).__contains__(key.lower())
+
+
+class WorkerResponse(object):
+    """Podmnožina rozhraní requests.Response, kterou plugin používá; `raw` čte tělo z paměti."""
+
+    def __init__(self, reply):
+        self.status_code = reply["status"]
+        self.reason = reply.get("reason") or ""
+        self.url = reply.get("url")
+        self.headers = _Headers(reply.get("headers") or {})
+        self.content = base64.b64decode(reply["body"])
+        self.raw = io.BytesIO(self.content)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+    def close(self):
+        self.raw.close()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error: {self.reason} for url: {self.url}", response=self)
+
+
+class WorkerSession(object):
+    """Náhrada requests.Session: požadavky posílá workeru, jinak je vyřídí sama.
+
+    Lokální session (a s ní import `requests`) se vytváří až ve chvíli,
+    kdy je opravdu potřeba.
+    """
+
+    def __init__(self, headers=None):
+        self.headers = dict(headers or {})
+        self._address = None
+        self._local = None
+        self._lock = threading.Lock()
+        self._worker_failed = False
+
+    def get(self, url, params=None, headers=None, timeout=None, stream=False, idempotent=None, allow_redirects=True):
+        return self.request("GET", url, params=params, headers=headers, timeout=timeout, stream=stream, idempotent=idempotent, allow_redirects=allow_redirects)
+
+    def post(self, url, data=None, json=None, headers=None, timeout=None, stream=False, idempotent=None, allow_redirects=True):
+        return self.request("POST", url, data=data, json=json, headers=headers, timeout=timeout, stream=stream, idempotent=idempotent, allow_redirects=allow_redirects)
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, timeout=None, stream=False, idempotent=None, allow_redirects=True):
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        extra = {"json": json, "allow_redirects": allow_redirects}
+        if not self._worker_failed:
+            try:
+                return self._via_worker(method, url, params, data, merged, timeout, idempotent, extra)
+            except WorkerUnavailable as e:
+                # Jednou selhaný worker v tomto spuštění už nezkoušíme
+                xbmc.log(f"Kodíček worker: unavailable ({e}), using in-process session.", level=xbmc.LOGDEBUG)
+                self._worker_failed = True
+        return self._local_session().request(method, url, params=params, data=data, headers=merged, timeout=timeout, stream=stream, idempotent=idempotent, **extra)
+
+    def close(self):
+        if self._local is not None:
+            self._local.close()
+
+    def _worker_address(self):
+        if self._address is None:
+            raw = xbmcgui.Window(10000).getProperty(WORKER_PROPERTY)
+            if not raw:
+                raise WorkerUnavailable("service not running")
+            try:
+                info = json.loads(raw)
+                self._address = (int(info["port"]), info["secret"])
+            except (ValueError, KeyError, TypeError):
+                raise WorkerUnavailable("invalid worker property")
+        return self._address
+
+    def _via_worker(self, method, url, params, data, headers, timeout, idempotent, extra=None):
+        import socket
+        port, secret = self._worker_address()
+        request = {"op": "http", "secret": secret, "method": method, "url": url, "params": params,
+                   "data": data, "headers": headers, "timeout": timeout, "idempotent": idempotent}
+        request.update(extra or {})
+        if timeout is None:
+            ipc_timeout = IPC_DEFAULT_TIMEOUT
+        else:
+            ipc_timeout = (sum(timeout) if isinstance(timeout, tuple) else timeout) + IPC_TIMEOUT_MARGIN
+        try:
+            sock = socket.create_connection(("127.0.0.1", port), timeout=CONNECT_TIMEOUT)
+        except OSError as e:
+            raise WorkerUnavailable(e)
+        with sock:
+            try:
+                sock.settimeout(ipc_timeout)
+                _send_message(sock, request)
+            except OSError as e:
+                # Neúplnou zprávu worker nezpracuje – lokální pokus požadavek nezdvojí
+                raise WorkerUnavailable(e)
+            try:
+                reply = _recv_message(sock)
+            except (OSError, ValueError) as e:
+                self._lost_after_send(method, idempotent, e)
+        if reply.get("ok"):
+            return WorkerResponse(reply)
+        import requests
+        if reply.get("kind") == "circuit":
+            from resources.lib.http_client import CircuitOpenError
+            raise CircuitOpenError(reply.get("error"))
+        if reply.get("kind") == "timeout":
+            raise requests.exceptions.Timeout(reply.get("error"))
+        if reply.get("kind") == "connection":
+            raise requests.exceptions.ConnectionError(reply.get("error"))
+        raise WorkerUnavailable(reply.get("error"))
+
+    def _lost_after_send(self, method, idempotent, error):
+        """Požadavek už odešel a worker ho možná vyřizuje dál: znovu ho smí poslat jen idempotentní volání."""
+        import socket
+        import requests
+        from resources.lib.http_client import IDEMPOTENT_METHODS
+        if idempotent or (idempotent is None and method.upper() in IDEMPOTENT_METHODS):
+            raise WorkerUnavailable(error)
+        # Neodpovídající worker v tomto spuštění už nepoužíváme, ale POST (např. login) neopakujeme
+        self._worker_failed = True
+        if isinstance(error, socket.timeout):
+            raise requests.exceptions.Timeout(f"Worker did not answer in time: {error}")
+        raise requests.exceptions.ConnectionError(f"Worker connection lost after the request was sent: {error}")
+
+    def _local_session(self):
+        with self._lock:
+            if self._local is None:
+                from resources.lib.http_client import HttpClient
+                self._local = HttpClient()
+            return self._local
@@ -1,67 +1,190 @@
+import json
+import queue
+import urllib.parse
+import threading
+import time
 import xbmc
 import xbmcgui
-import json
-import os
+from history import update_resume, update_resume_many
+
+# Vlastnost okna Home (10000), přes kterou akce "play" předá službě, co se právě přehrává
+PLAYING_PROPERTY = "kodicek.playing"
+# Jak často se v paměti aktualizuje pozice a jak často se zapisuje do history.db
+POSITION_POLL_INTERVAL = 5
+CHECKPOINT_INTERVAL = 30
+FLUSH_INTERVAL = 10
+# Starší předaná položka už nepatří k právě startujícímu přehrávání
+PLAYING_ITEM_MAX_AGE = 120
+# Po kolika sekundách přehrávání epizody se na pozadí připraví epizoda následující
+NEXT_EPISODE_PREFETCH_AFTER = 60
+PLUGIN_URL = "plugin://plugin.video.kodicek/"
+EPISODE_KEYS = ("tmdb_id", "season", "episode", "show_title", "show_year")
+
+def set_playing_item(item):
+    """Volá plugin těsně před setResolvedUrl – služba si podle toho spáruje přehrávání s historií."""
+    payload = dict(item, set_at=time.time())
+    xbmcgui.Window(10000).setProperty(PLAYING_PROPERTY, json.dumps(payload, ensure_ascii=False))
+
+def pop_playing_item():
+    window = xbmcgui.Window(10000)
+    raw = window.getProperty(PLAYING_PROPERTY)
+    window.clearProperty(PLAYING_PROPERTY)
+    if not raw:
+        return None
+    try:
+        item = json.loads(raw)
+    except ValueError:
+        return None
+    if time.time() - item.pop("set_at", 0) > PLAYING_ITEM_MAX_AGE:
+        return None
+    return item
+
+class CheckpointWriter(object):
+    """Write-behind fronta pozic přehrávání.
+
+    Hráčské callbacky jen vloží pozici do fronty; samostatné vlákno pozice
+    slučuje podle ident (stačí poslední) a zapisuje je dávkově jednou
+    transakcí, takže disk I/O nikdy neblokuje přehrávání.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="kodicek-checkpoints")
+        self._thread.daemon = True
+        self._stopping = False
 
-# HISTORY_PATH will be defined inside the method to avoid early xbmc.translatePath call issues.
+    def start(self):
+        self._thread.start()
+
+    def checkpoint(self, ident, position, finished=False):
+        self._queue.put((ident, position, finished))
+
+    def flush(self):
+        """Požádá o okamžitý zápis (neblokuje)."""
+        self._queue.put(None)
+
+    def stop(self, timeout=5):
+        self._stopping = True
+        self.flush()
+        self._thread.join(timeout)
+
+    def _run(self):
+        pending = {}
+        last_flush = time.time()
+        while True:
+            timeout = max(0.1, self.flush_interval - (time.time() - last_flush))
+            force = False
+            try:
+                entry = self._queue.get(timeout=timeout)
+                if entry is None:
+                    force = True
+                else:
+                    ident, position, finished = entry
+                    pending[ident] = (ident, position, finished)
+            except queue.Empty:
+                pass
+            if pending and (force or time.time() - last_flush >= self.flush_interval):
+                batch = list(pending.values())
+                pending.clear()
+                written = update_resume_many(batch)
+                xbmc.log(f"KodicekPlayer (resume_helper): Flushed {len(batch)} checkpoints, {written} history items updated.", xbmc.LOGDEBUG)
+            if force or not pending:
+                last_flush = time.time()
+            if self._stopping and self._queue.empty():
+                return
 
 class KodicekPlayer(xbmc.Player):
-    def __init__(self):
+    def __init__(self, writer=None):
         super(KodicekPlayer, self).__init__()
+        self.writer = writer
         self.current_file = None
+        self.current_item = None
+        self.last_position = 0
+        self.last_checkpoint = 0
+        self.next_episode_requested = False
 
     def onPlayBackStarted(self):
-        self.current_file = self.getPlayingFile()
-        
+        try:
+            self.current_file = self.getPlayingFile()
+        except RuntimeError:
+            self.current_file = None
+        # Položku předává akce "play"; přehrávání odjinud (knihovna, jiné doplňky) ignorujeme
+        self.current_item = pop_playing_item()
+        self.last_position = int((self.current_item or {}).get("resume_time") or 0)
+        self.last_checkpoint = time.time()
+        self.next_episode_requested = False
+
+    def onAVStarted(self):
+        if self.current_item is None and self.current_file is None:
+            self.onPlayBackStarted()
+
     def onPlayBackStopped(self):
         self.save_resume_time()
 
     def onPlayBackEnded(self):
         self.save_resume_time(finished=True)
 
+    def onPlayBackError(self):
+        self.save_resume_time()
+
+    def poll(self):
+        """Volá služba periodicky: drží v paměti aktuální pozici a občas ji pošle do fronty."""
+        if not self.current_item or not self.isPlaying():
+            return
+        try:
+            self.last_position = int(self.getTime())
+        except RuntimeError:
+            return
+        if self.writer and time.time() - self.last_checkpoint >= CHECKPOINT_INTERVAL:
+            self.writer.checkpoint(self.current_item.get("ident"), self.last_position)
+            self.last_checkpoint = time.time()
+        if not self.next_episode_requested and self.last_position >= NEXT_EPISODE_PREFETCH_AFTER:
+            self.next_episode_requested = True
+            self.request_next_episode_prefetch()
+
+    def request_next_episode_prefetch(self):
+        """U epizody spuštěné z play_episode nechá plugin na pozadí připravit tu následující."""
+        item = self.current_item
+        if not item.get("tmdb_id") or item.get("season") is None or item.get("episode") is None:
+            return
+        query = {key: item[key] for key in EPISODE_KEYS if item.get(key) is not None}
+        query["action"] = "prefetch_next_episode"
+        xbmc.log(f"KodicekPlayer (resume_helper): Requesting next episode prefetch after S{item['season']}E{item['episode']} ({item['tmdb_id']})", xbmc.LOGINFO)
+        xbmc.executebuiltin(f"RunPlugin({PLUGIN_URL}?{urllib.parse.urlencode(query)})")
+
     def save_resume_time(self, finished=False):
+        if self.current_item and self.current_item.get("ident"):
+            ident = self.current_item["ident"]
+            xbmc.log(f"KodicekPlayer (resume_helper): save_resume_time. ident: '{ident}', position: {self.last_position}, finished: {finished}", xbmc.LOGINFO)
+            if self.writer:
+                # Po zastavení už getTime() nefunguje – použijeme poslední známou pozici
+                self.writer.checkpoint(ident, self.last_position, finished)
+                self.writer.flush()
+            else:
+                update_resume(ident=ident, resume_time=self.last_position, finished=finished)
+            self.current_item = None
+            self.current_file = None
+            return
+
         if not self.current_file:
             xbmc.log("KodicekPlayer (resume_helper): No current_file, cannot save resume time.", xbmc.LOGDEBUG)
             return
-        
-        current_pos_float = self.getTime()
-        current_pos_int = int(current_pos_float)
-        xbmc.log(f"KodicekPlayer (resume_helper): save_resume_time. current_file: '{self.current_file}', current_pos_float: {current_pos_float}, current_pos_int: {current_pos_int}, finished: {finished}", xbmc.LOGINFO)
-        
-        HISTORY_PATH = xbmc.translatePath('special://profile/addon_data/plugin.video.kodicek/history.json')
-        
+
         try:
-            if os.path.exists(HISTORY_PATH):
-                with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
+            current_pos_int = int(self.getTime())
+        except RuntimeError:
+            current_pos_int = self.last_position
+        xbmc.log(f"KodicekPlayer (resume_helper): save_resume_time. current_file: '{self.current_file}', current_pos_int: {current_pos_int}, finished: {finished}", xbmc.LOGINFO)
+
+        # Indexované vyhledání podle file_path v history.db (žádné přepisování celého souboru);
+        # historie drží URL bez hlaviček za '|'
+        if update_resume(file_path=self.current_file.split('|', 1)[0], resume_time=current_pos_int, finished=finished):
+            if finished:
+                xbmc.log(f"KodicekPlayer (resume_helper): Marked as finished and removed resume_time for: {self.current_file}", xbmc.LOGINFO)
             else:
-                history = []
-            
-            # Ensure history is a list
-            if not isinstance(history, list):
-                xbmc.log(f"Kodicek resume save error: History is not a list. Found: {type(history)}", xbmc.LOGERROR)
-                history = []
-
-            item_found = False
-            for item in history:
-                if isinstance(item, dict) and item.get("file_path") == self.current_file:
-                    if finished:
-                        item.pop("resume_time", None)
-                        item["finished"] = True 
-                        xbmc.log(f"KodicekPlayer (resume_helper): Marked as finished and removed resume_time for: {self.current_file}", xbmc.LOGINFO)
-                    else:
-                        item["resume_time"] = current_pos_int # Use the already fetched int value
-                        item.pop("finished", None)
-                        xbmc.log(f"KodicekPlayer (resume_helper): Saved resume_time {current_pos_int} for: {self.current_file}", xbmc.LOGINFO)
-                    item_found = True
-                    break
-            
-            # If item not found, and we are saving (not finishing), it implies a new playback not yet in history.
-            # This case should ideally be handled when the item is first added to history.
-            # However, if current_file is playing and not in history, this logic won't update/add it.
+                xbmc.log(f"KodicekPlayer (resume_helper): Saved resume_time {current_pos_int} for: {self.current_file}", xbmc.LOGINFO)
+        else:
             # The current design assumes the item is already in history when playback starts.
-
-            with open(HISTORY_PATH, 'w', encoding='utf-8') as f:
-                json.dump(history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            xbmc.log(f"Kodicek resume save error: {e}", xbmc.LOGERROR)
+            xbmc.log(f"KodicekPlayer (resume_helper): No history item for: {self.current_file}", xbmc.LOGDEBUG)
+        self.current_file = None
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Služba Kodíčku – běží po celou dobu běhu Kodi.
+
+Drží teplý HTTP worker (viz resources/lib/worker.py) a KodicekPlayer,
+který průběžně ukládá pozici přehrávání položek spuštěných z pluginu
+(akce "play"). Pozice se čtou z přehrávače v krátkém
+intervalu jen do paměti a do history.db se zapisují dávkově přes
+write-behind frontu, takže přehrávání nikdy nečeká na disk a pozice
+přežije i pád Kodi.
+"""
+import xbmc
+from resume_helper import KodicekPlayer, CheckpointWriter, POSITION_POLL_INTERVAL
+from resources.lib.http_client import HttpClient
+from resources.lib.worker import WorkerServer
+
+def run():
+    monitor = xbmc.Monitor()
+    writer = CheckpointWriter()
+    writer.start()
+    player = KodicekPlayer(writer)
+    # Teplý worker: plugin přes něj posílá HTTP požadavky, pool spojení i jističe přežívají mezi spuštěními
+    worker = WorkerServer(HttpClient())
+    try:
+        worker.start()
+    except OSError as e:
+        xbmc.log(f"Kodíček service: worker failed to start: {e}", level=xbmc.LOGERROR)
+        worker = None
+    xbmc.log("Kodíček service: started.", level=xbmc.LOGINFO)
+    while not monitor.abortRequested():
+        player.poll()
+        if monitor.waitForAbort(POSITION_POLL_INTERVAL):
+            break
+    # Kodi končí – uložíme poslední známou pozici a dopíšeme frontu
+    if player.current_item:
+        player.save_resume_time()
+    writer.stop()
+    if worker:
+        worker.stop()
+    xbmc.log("Kodíček service: stopped.", level=xbmc.LOGINFO)
+
+if __name__ == "__main__":
+    run()
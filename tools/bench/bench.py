@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Offline benchmark Kodíčku: skriptované průchody pluginem proti falešným serverům.
+
+Bez Kodi, bez účtů a bez sítě. Každý krok průchodu (sessions.py) se
+spustí v novém procesu přes invoke.py se stuby modulů Kodi (stubs/) a
+HTTP vrstvou přesměrovanou na lokální FakeServer, který přehrává
+odpovědi z fixtures/ se zadaným zpožděním a chybovostí.
+
+Pro každý krok se hlásí doba akce (p50/p95), doba celého procesu včetně
+práce na pozadí, import kodicek.py, počet požadavků po službách a
+špičková paměť (RSS).
+
+Kontroluje také rozpočet importu kodicek.py (výchozí 30 ms, medián přes
+všechna spuštění) a že import nenatáhne těžké moduly; při porušení končí
+s návratovým kódem 1.
+
+Příklady (z kořene repozitáře):
+
+    python tools/bench/bench.py
+    python tools/bench/bench.py --session series --repeat 10 --latency webshare=120,tmdb=60
+    python tools/bench/bench.py --fail-rate webshare=0.2 --service --json before.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from xml.etree import ElementTree as ET
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(BENCH_DIR))
+sys.path[:0] = [os.path.join(BENCH_DIR, "stubs"), REPO_DIR, BENCH_DIR]
+
+from fake_server import FakeServer, GROUPS  # noqa: E402
+from sessions import SESSIONS, paramstring  # noqa: E402
+from resources.lib.metrics import percentile  # noqa: E402
+
+IMPORT_BUDGET_MS = 30
+BENCH_SETTINGS = {
+    "ws_username": "bench",
+    "ws_password": "bench",
+    "tmdb_api_key": "bench",
+}
+
+
+def default_settings():
+    """Výchozí hodnoty z resources/settings.xml (jako po čisté instalaci) + přihlašovací údaje."""
+    settings = {}
+    for node in ET.parse(os.path.join(REPO_DIR, "resources", "settings.xml")).iter("setting"):
+        if node.get("id") and node.get("type") != "action":
+            settings[node.get("id")] = node.get("default", "")
+    settings.update(BENCH_SETTINGS)
+    return settings
+
+
+def parse_groups(text, cast):
+    values = {}
+    for part in filter(None, (text or "").split(",")):
+        group, _, value = part.partition("=")
+        if group not in GROUPS:
+            raise SystemExit(f"Unknown group '{group}', expected one of: {', '.join(GROUPS)}")
+        values[group] = cast(value)
+    return values
+
+
+def start_service(port):
+    """Teplý worker jako ve službě Kodi; vrací (server, vlastnosti okna pro spuštění pluginu)."""
+    import xbmcgui
+    from fakenet import BenchHttpClient
+    from resources.lib.worker import WorkerServer
+    server = WorkerServer(BenchHttpClient(port))
+    server.start()
+    return server, xbmcgui.window_properties()
+
+
+def invoke(port, params, env):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, os.path.join(BENCH_DIR, "invoke.py"), str(port), params],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    process_ms = (time.perf_counter() - start) * 1000
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Plugin invocation failed ({params}):\n{proc.stderr.strip()}")
+    result = json.loads(lines[-1])
+    result["process_ms"] = process_ms
+    return result
+
+
+def run_session(name, steps, fake, env, results):
+    for step, params in steps:
+        before = fake.snapshot()
+        result = invoke(fake.port, paramstring(params), env)
+        after = fake.snapshot()
+        result["requests"] = {route: after[route] - before.get(route, 0) for route in after if after[route] != before.get(route, 0)}
+        results.setdefault((name, step), []).append(result)
+
+
+def group_requests(requests):
+    totals = dict.fromkeys(GROUPS, 0)
+    for route, count in requests.items():
+        group = route.split("/", 1)[0]
+        totals[group] = totals.get(group, 0) + count
+    return totals
+
+
+def report(results, repeat):
+    header = f"{'session/step':34} {'act p50':>8} {'act p95':>8} {'process':>8} {'import':>7} {'ws':>4} {'tmdb':>5} {'img':>4} {'RSS MB':>7} {'dlg':>4}"
+    print(header)
+    print("-" * len(header))
+    for (session, step), runs in results.items():
+        action = sorted(r["action_ms"] for r in runs)
+        process = sorted(r["process_ms"] for r in runs)
+        imports = sorted(r["import_ms"] for r in runs)
+        requests = group_requests({})
+        for r in runs:
+            for group, count in group_requests(r["requests"]).items():
+                requests[group] = requests.get(group, 0) + count
+        print(f"{session + '/' + step:34} {percentile(action, 50):8.1f} {percentile(action, 95):8.1f} "
+              f"{percentile(process, 50):8.1f} {percentile(imports, 50):7.1f} "
+              f"{requests['webshare'] / repeat:4.1f} {requests['tmdb'] / repeat:5.1f} {requests['images'] / repeat:4.1f} "
+              f"{max(r['peak_rss_kb'] for r in runs) / 1024:7.1f} {sum(len(r['dialogs']) for r in runs) / repeat:4.1f}")
+
+
+def check_import_budget(results, budget_ms):
+    runs = [r for step_runs in results.values() for r in step_runs]
+    imports = sorted(r["import_ms"] for r in runs)
+    heavy = sorted({name for r in runs for name in r["heavy_modules"]})
+    median = percentile(imports, 50)
+    ok = median <= budget_ms and not heavy
+    print(f"\nkodicek.py import: p50 {median:.1f} ms, p95 {percentile(imports, 95):.1f} ms (budget {budget_ms} ms)"
+          f"{', heavy modules loaded: ' + ', '.join(heavy) if heavy else ''} -> {'OK' if ok else 'FAIL'}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Kodíček benchmark")
+    parser.add_argument("--session", default=",".join(SESSIONS), help=f"comma separated: {', '.join(SESSIONS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", default="webshare=80,tmdb=40,images=20", help="ms per group, e.g. webshare=80,tmdb=40")
+    parser.add_argument("--fail-rate", default="", help="share of 503 responses per group, e.g. webshare=0.1")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warm", action="store_true", help="keep the profile (cache, token) between repeats")
+    parser.add_argument("--service", action="store_true", help="run the warm HTTP worker like the Kodi service does")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--json", help="write raw results to this file")
+    args = parser.parse_args(argv)
+
+    sessions = [name.strip() for name in args.session.split(",") if name.strip()]
+    unknown = [name for name in sessions if name not in SESSIONS]
+    if unknown:
+        parser.error(f"unknown session(s): {', '.join(unknown)}")
+
+    fake = FakeServer(parse_groups(args.latency, float), parse_groups(args.fail_rate, float), seed=args.seed).start()
+    service, window = (None, {})
+    if args.service:
+        service, window = start_service(fake.port)
+    env = dict(os.environ)
+    env["KODICEK_BENCH_SETTINGS"] = json.dumps(default_settings())
+    env["KODICEK_BENCH_WINDOW"] = json.dumps(window)
+
+    results = {}
+    profile = None
+    try:
+        for _ in range(args.repeat):
+            if profile is None or not args.warm:
+                if profile is not None:
+                    shutil.rmtree(profile, ignore_errors=True)
+                profile = tempfile.mkdtemp(prefix="kodicek-bench-")
+            env["KODICEK_BENCH_PROFILE"] = profile
+            for name in sessions:
+                run_session(name, SESSIONS[name], fake, env, results)
+    finally:
+        if profile is not None:
+            shutil.rmtree(profile, ignore_errors=True)
+        if service is not None:
+            service.stop()
+        fake.stop()
+
+    report(results, args.repeat)
+    ok = check_import_budget(results, args.import_budget_ms)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{"session": session, "step": step, "runs": runs} for (session, step), runs in results.items()], f, indent=1)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Lokální HTTP server, který přehrává nahrané odpovědi Webshare a TMDb.
+
+Jeden server obsluhuje všechny hosty podle cesty:
+
+    /api/<endpoint>/   Webshare API (POST, XML z fixtures/webshare/<endpoint>.xml)
+    /3/...             TMDb API (GET, JSON z fixtures/tmdb/)
+    /t/p/...           obrázky TMDb (malý statický obsah)
+
+Každé skupině lze nastavit zpoždění (latency) a podíl odpovědí 503
+(failure rate). Náhoda je se zadaným seedem, aby běhy šly porovnat.
+Server počítá požadavky po trasách (`counts`), benchmark tak vidí, kolik
+volání která akce stála, včetně těch z vláken na pozadí.
+"""
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+GROUPS = ("webshare", "tmdb", "images")
+
+TMDB_ROUTES = (
+    (re.compile(r"^/3/search/"), "search_multi.json"),
+    (re.compile(r"^/3/movie/\d+$"), "movie.json"),
+    (re.compile(r"^/3/tv/\d+$"), "tv.json"),
+    (re.compile(r"^/3/tv/\d+/season/\d+$"), "season.json"),
+    (re.compile(r"^/3/tv/\d+/season/\d+/episode/\d+$"), "episode.json"),
+)
+_ID_RE = re.compile(r"\d+")
+# Místo skutečného obrázku stačí pár kB dat
+IMAGE_BODY = b"\xff\xd8\xff\xe0" + b"\x00" * 4096
+
+
+class FakeServer(object):
+    def __init__(self, latency_ms=None, fail_rate=None, seed=1):
+        self.latency_ms = dict.fromkeys(GROUPS, 0)
+        self.latency_ms.update(latency_ms or {})
+        self.fail_rate = dict.fromkeys(GROUPS, 0.0)
+        self.fail_rate.update(fail_rate or {})
+        self.counts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._fixtures = {}
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self)
+
+            def do_POST(self):
+                fake.handle(self)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        thread = threading.Thread(target=self._server.serve_forever, name="bench-fake-server")
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def fixture(self, *parts):
+        path = os.path.join(FIXTURES_DIR, *parts)
+        if path not in self._fixtures:
+            with open(path, "rb") as f:
+                self._fixtures[path] = f.read()
+        return self._fixtures[path]
+
+    def route(self, path):
+        """(skupina, název trasy, tělo, content-type) pro cestu požadavku; tělo None = 404."""
+        if path.startswith("/api/"):
+            endpoint = path[len("/api/"):].strip("/")
+            try:
+                return "webshare", f"webshare/{endpoint}", self.fixture("webshare", f"{endpoint}.xml"), "text/xml; charset=UTF-8"
+            except OSError:
+                return "webshare", f"webshare/{endpoint}", None, "text/plain"
+        if path.startswith("/t/p/"):
+            return "images", "images", IMAGE_BODY, "image/jpeg"
+        if path.startswith("/3/"):
+            name = "tmdb/" + _ID_RE.sub("#", path[len("/3/"):])
+            for pattern, fixture in TMDB_ROUTES:
+                if pattern.match(path):
+                    return "tmdb", name, self.fixture("tmdb", fixture), "application/json;charset=utf-8"
+            return "tmdb", name, None, "application/json"
+        return "other", "other", None, "text/plain"
+
+    def handle(self, request):
+        length = int(request.headers.get("Content-Length") or 0)
+        if length:
+            request.rfile.read(length)
+        path = request.path.split("?", 1)[0]
+        group, name, body, content_type = self.route(path)
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+            fail = self._random.random() < self.fail_rate.get(group, 0.0)
+        delay = self.latency_ms.get(group, 0)
+        if delay:
+            time.sleep(delay / 1000.0)
+        if fail:
+            status, body, content_type = 503, b"Service Unavailable", "text/plain"
+        elif body is None:
+            status, body = 404, b"Not Found"
+        else:
+            status = 200
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
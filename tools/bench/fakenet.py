@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Přesměrování HTTP vrstvy pluginu na lokální FakeServer.
+
+`BenchHttpClient` je skutečný `HttpClient` z resources/lib/http_client.py
+(politiky hostů, opakování, hedging i jističe běží beze změny); jen těsně
+před odesláním se https://webshare.cz, api.themoviedb.org a
+image.tmdb.org přepíší na http://127.0.0.1:<port>.
+"""
+from resources.lib import http_client
+
+REAL_HOSTS = (
+    "https://webshare.cz/",
+    "https://api.themoviedb.org/",
+    "https://image.tmdb.org/",
+)
+
+
+class BenchHttpClient(http_client.HttpClient):
+    def __init__(self, port, *args, **kwargs):
+        super(BenchHttpClient, self).__init__(*args, **kwargs)
+        self.base = f"http://127.0.0.1:{port}/"
+
+    def _send(self, method, url, kwargs):
+        for prefix in REAL_HOSTS:
+            if url.startswith(prefix):
+                url = self.base + url[len(prefix):]
+                break
+        return super(BenchHttpClient, self)._send(method, url, kwargs)
+
+
+def install(port):
+    """Každý HttpClient vytvořený od teď (i lokální session ve WorkerSession) míří na FakeServer."""
+    def factory(*args, **kwargs):
+        return BenchHttpClient(port, *args, **kwargs)
+    http_client.HttpClient = factory
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Jedno spuštění pluginu v čistém procesu (jako v Kodi); výsledek jako JSON na stdout.
+
+Spouští ho bench.py: `python invoke.py <port> <paramstring>`. Prostředí
+(profil, nastavení, vlastnosti okna) předává bench.py přes proměnné
+KODICEK_BENCH_*. Měří se import kodicek.py (a zda při něm nenaskočily
+těžké moduly) a doba akce do návratu z routeru. Dobu celého procesu
+včetně vláken na pozadí (prefetch), na která interpreter při ukončení
+čeká, měří bench.py.
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(BENCH_DIR))
+# Moduly, které import kodicek.py nesmí natáhnout (viz odložené importy v kodicek.py)
+HEAVY_MODULES = ("requests", "sqlite3", "xml.etree.ElementTree", "concurrent.futures", "socketserver")
+
+
+def main():
+    port, params = int(sys.argv[1]), sys.argv[2]
+    sys.path[:0] = [os.path.join(BENCH_DIR, "stubs"), REPO_DIR, BENCH_DIR]
+    sys.argv = ["plugin://plugin.video.kodicek/", "1", "?" + params]
+    import xbmc
+    import xbmcgui
+    import xbmcplugin
+
+    start = time.perf_counter()
+    import kodicek
+    import_ms = (time.perf_counter() - start) * 1000
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    import fakenet
+    fakenet.install(port)
+
+    start = time.perf_counter()
+    kodicek.run(params)
+    action_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "action_ms": action_ms,
+        "heavy_modules": heavy,
+        "items": len(xbmcplugin.ITEMS),
+        "resolved": xbmcplugin.RESOLVED,
+        "dialogs": xbmcgui.DIALOGS,
+        "warnings": len(xbmc.WARNINGS),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Skriptované průchody pluginem: seznam kroků (název, parametry akce).
+
+Každý krok je jedno samostatné spuštění pluginu, jako když uživatel v Kodi
+otevře složku. Parametry odpovídají URL, které plugin sám generuje.
+"""
+from urllib.parse import urlencode
+
+MOVIE = [
+    ("main_menu", {}),
+    ("search", {"action": "search", "what": "Pelíšky"}),
+    ("movie_sources", {"action": "process_tmdb_selection", "tmdb_id": "10", "media_type": "movie", "title": "Pelíšky", "year": "1999"}),
+    ("play", {"action": "play", "ident": "mv0", "name": "Pelisky.1999.1080p.CZ.mkv"}),
+]
+
+SERIES = [
+    ("search", {"action": "search", "what": "Perníkový táta"}),
+    ("seasons", {"action": "show_seasons", "tmdb_id": "1396", "show_title": "Breaking Bad"}),
+    ("episodes", {"action": "show_episodes", "tmdb_id": "1396", "season_number": "1", "show_title": "Breaking Bad", "show_year": "2008"}),
+    ("episode_sources", {"action": "play_episode", "tmdb_id": "1396", "season_number": "1", "episode_number": "1", "show_title": "Breaking Bad", "episode_name_cs": "Epizoda 1", "show_year": "2008"}),
+    ("play", {"action": "play", "ident": "bb1010", "name": "Breaking.Bad.S01E01.1080p.CZ.mkv", "tmdb_id": "1396", "season": "1", "episode": "1", "show_title": "Breaking Bad", "show_year": "2008"}),
+    ("next_episode_sources", {"action": "play_episode", "tmdb_id": "1396", "season_number": "1", "episode_number": "2", "show_title": "Breaking Bad", "episode_name_cs": "Epizoda 2", "show_year": "2008"}),
+]
+
+WEBSHARE = [
+    ("ws_search", {"action": "ws_search", "what": "Breaking Bad"}),
+    ("ws_search_next", {"action": "ws_search", "what": "Breaking Bad", "offset": "50"}),
+    ("history", {"action": "history"}),
+]
+
+SESSIONS = {
+    "movie": MOVIE,
+    "series": SERIES,
+    "webshare": WEBSHARE,
+}
+
+
+def paramstring(params):
+    return urlencode(params)
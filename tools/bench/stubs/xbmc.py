@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Stub modulu xbmc pro benchmark mimo Kodi (tools/bench).
+
+Log se nevypisuje (zkresloval by měření); varování a chyby se počítají a
+invoke.py je vrátí ve výsledku. Proměnná KODICEK_BENCH_LOG=1 log vypíše
+na stderr.
+"""
+import os
+import sys
+
+LOGDEBUG, LOGINFO, LOGWARNING, LOGERROR, LOGFATAL = 0, 1, 2, 3, 4
+WARNINGS = []
+_ECHO = os.environ.get("KODICEK_BENCH_LOG") == "1"
+
+
+def log(msg, level=LOGDEBUG):
+    if level >= LOGWARNING:
+        WARNINGS.append(msg)
+    if _ECHO:
+        sys.stderr.write(f"[{level}] {msg}\n")
+
+
+def translatePath(path):
+    from xbmcvfs import translatePath as vfs_translate
+    return vfs_translate(path)
+
+
+def sleep(ms):
+    pass
+
+
+def executebuiltin(command, wait=False):
+    pass
+
+
+def getCondVisibility(condition):
+    return False
+
+
+class Monitor(object):
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return False
+
+
+class Player(object):
+    def isPlaying(self):
+        return False
+
+    def getTime(self):
+        return 0.0
+
+    def getTotalTime(self):
+        return 0.0
+
+    def getPlayingFile(self):
+        return ""
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Stub modulu xbmcaddon.
+
+Výchozí nastavení přichází v KODICEK_BENCH_SETTINGS (JSON). Zápisy
+(`setSetting`, např. token po přihlášení) se ukládají do settings.json
+v profilu, takže přežijí do dalšího spuštění pluginu jako v Kodi.
+"""
+import json
+import os
+
+from xbmcvfs import PROFILE_PREFIX
+
+
+def _settings_file():
+    return os.path.join(os.environ.get("KODICEK_BENCH_PROFILE", ""), "settings.json")
+
+
+def _load():
+    settings = json.loads(os.environ.get("KODICEK_BENCH_SETTINGS") or "{}")
+    try:
+        with open(_settings_file(), encoding="utf-8") as f:
+            settings.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return settings
+
+
+class Addon(object):
+    def __init__(self, id=None):
+        self._settings = _load()
+
+    def getSetting(self, key):
+        return str(self._settings.get(key, ""))
+
+    def getSettingBool(self, key):
+        value = self._settings.get(key)
+        if value is None:
+            raise TypeError(key)
+        return str(value).lower() == "true"
+
+    def getSettingInt(self, key):
+        return int(self._settings.get(key) or 0)
+
+    def setSetting(self, key, value):
+        self._settings[key] = value
+        stored = {}
+        try:
+            with open(_settings_file(), encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            pass
+        stored[key] = value
+        os.makedirs(os.path.dirname(_settings_file()), exist_ok=True)
+        with open(_settings_file(), "w", encoding="utf-8") as f:
+            json.dump(stored, f)
+
+    def getAddonInfo(self, key):
+        return {
+            "id": "plugin.video.kodicek",
+            "profile": PROFILE_PREFIX,
+            "path": os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")),
+            "version": "bench",
+            "name": "Kodíček",
+        }.get(key, "")
+
+    def getLocalizedString(self, string_id):
+        return str(string_id)
+
+    def openSettings(self):
+        pass
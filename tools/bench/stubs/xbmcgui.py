@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""Stub modulu xbmcgui.
+
+Dialogy nic nezobrazují, jen se počítají (DIALOGS). Vlastnosti okna Home
+se při startu načtou z KODICEK_BENCH_WINDOW (JSON) – tak se do spuštění
+pluginu předá adresa workeru běžícího v procesu benchmarku.
+"""
+import json
+import os
+
+NOTIFICATION_INFO = "info"
+NOTIFICATION_WARNING = "warning"
+NOTIFICATION_ERROR = "error"
+INPUT_ALPHANUM = 0
+
+DIALOGS = []
+_PROPERTIES = json.loads(os.environ.get("KODICEK_BENCH_WINDOW") or "{}")
+
+
+class ListItem(object):
+    def __init__(self, label="", label2="", path="", offscreen=False):
+        self.label = label
+        self.path = path
+        self.art = {}
+        self.info = {}
+        self.properties = {}
+
+    def setArt(self, art):
+        self.art.update(art)
+
+    def setInfo(self, type, info):
+        self.info.update(info)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def setProperties(self, properties):
+        self.properties.update(properties)
+
+    def setLabel(self, label):
+        self.label = label
+
+    def getLabel(self):
+        return self.label
+
+    def setPath(self, path):
+        self.path = path
+
+    def setMimeType(self, mimetype):
+        pass
+
+    def setContentLookup(self, enable):
+        pass
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        pass
+
+
+class Dialog(object):
+    def notification(self, heading, message, icon=None, time=5000, sound=True):
+        DIALOGS.append(("notification", message))
+
+    def ok(self, heading, message):
+        DIALOGS.append(("ok", message))
+        return True
+
+    def yesno(self, heading, message, *args, **kwargs):
+        DIALOGS.append(("yesno", message))
+        return False
+
+    def input(self, heading, defaultt="", type=INPUT_ALPHANUM, option=0, autoclose=0):
+        DIALOGS.append(("input", heading))
+        return ""
+
+    def select(self, heading, items, *args, **kwargs):
+        DIALOGS.append(("select", heading))
+        return -1
+
+    def textviewer(self, heading, text, usemono=False):
+        DIALOGS.append(("textviewer", heading))
+
+
+class Window(object):
+    def __init__(self, window_id=10000):
+        pass
+
+    def getProperty(self, key):
+        return _PROPERTIES.get(key, "")
+
+    def setProperty(self, key, value):
+        _PROPERTIES[key] = value
+
+    def clearProperty(self, key):
+        _PROPERTIES.pop(key, None)
+
+
+def window_properties():
+    return dict(_PROPERTIES)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Stub modulu xbmcplugin: položky výpisu se jen počítají (ITEMS, RESOLVED)."""
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_LABEL_IGNORE_THE = 2
+SORT_METHOD_DATE = 3
+SORT_METHOD_SIZE = 4
+SORT_METHOD_TITLE = 10
+SORT_METHOD_VIDEO_YEAR = 18
+SORT_METHOD_VIDEO_RATING = 19
+SORT_METHOD_EPISODE = 24
+SORT_METHOD_UNSORTED = 40
+
+ITEMS = []
+RESOLVED = []
+DIRECTORIES = []
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    ITEMS.append((url, listitem.label, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    ITEMS.extend((url, listitem.label, is_folder) for url, listitem, is_folder in items)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    DIRECTORIES.append(succeeded)
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    RESOLVED.append(succeeded)
+
+
+def setPluginCategory(handle, category):
+    pass
+
+
+def setContent(handle, content):
+    pass
+
+
+def addSortMethod(handle, sortMethod, labelMask="", label2Mask=""):
+    pass
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Stub modulu xbmcvfs: special://profile/ míří do KODICEK_BENCH_PROFILE."""
+import os
+
+PROFILE_PREFIX = "special://profile/addon_data/plugin.video.kodicek/"
+
+
+def translatePath(path):
+    profile = os.environ.get("KODICEK_BENCH_PROFILE", "")
+    if path.startswith(PROFILE_PREFIX):
+        return os.path.join(profile, path[len(PROFILE_PREFIX):])
+    return path
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+
+def delete(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False